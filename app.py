@@ -12,6 +12,11 @@ app.secret_key = 'your-secret-key-here-change-in-production'
 # Register the dashboard blueprint
 app.register_blueprint(dashboard_bp)
 
+# Hand the request thread's pooled DB connection back after each request
+@app.teardown_appcontext
+def release_db_connection(exception=None):
+    db.release_connection()
+
 # Serve product images
 @app.route('/products/<path:filename>')
 def serve_product_image(filename):
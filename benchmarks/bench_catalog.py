@@ -0,0 +1,127 @@
+# benchmarks/bench_catalog.py - Catalog build time for Database.get_all_products
+#
+# Usage: python benchmarks/bench_catalog.py [--products 10000] [--variants 30] [--legacy]
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from catalog import CATALOG_QUERY, build_catalog
+
+COLORS = ['Red', 'Blue', 'Black', 'White', 'Green', 'Yellow', 'Pink', 'Purple', 'Gray', 'Brown']
+SIZES = ['S', 'M', 'L', 'XL', 'XXL', 'XXXL']
+
+# Same row handling as get_all_products before the single-pass builder
+LEGACY_QUERY = CATALOG_QUERY.replace(
+    'JOIN product_variants pv ON p.id = pv.product_id AND pv.quantity > 0',
+    'LEFT JOIN product_variants pv ON p.id = pv.product_id'
+)
+
+
+def create_dataset(path, products, variants, categories):
+    conn = sqlite3.connect(path)
+    cursor = conn.cursor()
+    cursor.executescript('''
+        CREATE TABLE categories (id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL, arabic_name TEXT);
+        CREATE TABLE products (
+            id INTEGER PRIMARY KEY, category_id INTEGER NOT NULL, name TEXT NOT NULL, arabic_name TEXT,
+            price REAL NOT NULL, description TEXT, arabic_description TEXT, model_number TEXT,
+            is_active BOOLEAN DEFAULT 1
+        );
+        CREATE TABLE product_variants (
+            id INTEGER PRIMARY KEY, product_id INTEGER NOT NULL, color TEXT NOT NULL, color_arabic TEXT,
+            size TEXT NOT NULL, size_arabic TEXT, quantity INTEGER DEFAULT 0, image_path TEXT,
+            UNIQUE(product_id, color, size)
+        );
+    ''')
+    cursor.executemany('INSERT INTO categories (id, name, arabic_name) VALUES (?, ?, ?)',
+                       [(c, f'category_{c}', f'فئة {c}') for c in range(1, categories + 1)])
+    cursor.executemany('''
+        INSERT INTO products (id, category_id, name, arabic_name, price, description, arabic_description, model_number)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', [(p, p % categories + 1, f'Product {p}', f'منتج {p}', 1000.0 + p, 'desc', 'وصف', f'M{p:06d}')
+          for p in range(1, products + 1)])
+
+    combos = [(color, size) for color in COLORS for size in SIZES][:variants]
+    cursor.executemany('''
+        INSERT INTO product_variants (product_id, color, color_arabic, size, size_arabic, quantity, image_path)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', ((p, color, color, size, size, (p + i) % 7, None)
+          for p in range(1, products + 1) for i, (color, size) in enumerate(combos)))
+    conn.commit()
+    conn.close()
+
+
+def legacy_build(rows):
+    """The pre-optimisation algorithm: linear scan per row plus a filter pass"""
+    products_by_category = {}
+    for row in rows:
+        category = row['category_name']
+        product_id = row['product_id']
+        if category not in products_by_category:
+            products_by_category[category] = []
+        product = None
+        for p in products_by_category[category]:
+            if p['id'] == product_id:
+                product = p
+                break
+        if not product:
+            product = {'id': product_id, 'name': row['product_name'], 'variants': []}
+            products_by_category[category].append(product)
+        if row['variant_id'] and row['quantity'] > 0:
+            product['variants'].append({'id': row['variant_id'], 'quantity': row['quantity']})
+    for category in list(products_by_category.keys()):
+        products_by_category[category] = [p for p in products_by_category[category] if p['variants']]
+        if not products_by_category[category]:
+            del products_by_category[category]
+    return products_by_category
+
+
+def timed(label, func):
+    """Print wall time of one run, then peak Python memory of a second traced run"""
+    started = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - started
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<28} {elapsed * 1000:10.1f} ms   peak {peak / 1024 / 1024:8.1f} MB")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark catalog assembly')
+    parser.add_argument('--products', type=int, default=10000)
+    parser.add_argument('--variants', type=int, default=30)
+    parser.add_argument('--categories', type=int, default=20)
+    parser.add_argument('--legacy', action='store_true', help='also time the old O(rows x products) builder')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        create_dataset(path, args.products, args.variants, args.categories)
+        conn = sqlite3.connect(path)
+        print(f"📦 {args.products} products x {args.variants} variants in {args.categories} categories")
+
+        rows = timed('query (fetchall)', lambda: conn.execute(CATALOG_QUERY).fetchall())
+        catalog = timed('build_catalog (dicts)', lambda: build_catalog(rows))
+        timed('build_catalog (compact)', lambda: build_catalog(rows, compact=True))
+        timed('query + build (dicts)', lambda: build_catalog(conn.execute(CATALOG_QUERY)))
+
+        if args.legacy:
+            conn.row_factory = sqlite3.Row
+            legacy_rows = conn.execute(LEGACY_QUERY).fetchall()
+            legacy = timed('legacy builder', lambda: legacy_build(legacy_rows))
+            assert sum(map(len, legacy.values())) == sum(map(len, catalog.values()))
+
+        print(f"✅ {sum(map(len, catalog.values()))} available products")
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
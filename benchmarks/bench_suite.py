@@ -0,0 +1,435 @@
+# benchmarks/bench_suite.py - Database method and dashboard route timings at several data scales
+#
+# Usage: python benchmarks/bench_suite.py [--scales 1,10,100] [--repeat 5] [--seed 42]
+#                                         [--end-date YYYY-MM-DD] [--out bench_report.json]
+#                                         [--compare old_report.json] [--workdir DIR]
+#
+# For every scale a fresh store.db is generated (generate_dataset.py) in its
+# own child process, then each Database read method is timed --repeat times
+# with the read cache cleared before every call, followed by the write and
+# maintenance methods and the main dashboard routes through the Flask test
+# client (logged in as the default admin). The report is JSON with sorted keys,
+# so two reports from different commits diff line by line; --compare prints
+# the cases that got more than 20% slower or faster.
+import argparse
+import inspect
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+COMPARE_THRESHOLD = 0.20  # relative change reported by --compare
+COMPARE_MIN_MS = 1.0      # faster cases are mostly timer noise
+
+# (name, fn(db, s)): read-only, timed --repeat times with a cold read cache
+READ_CASES = [
+    ('get_schema_version', lambda db, s: db.get_schema_version()),
+    ('get_categories', lambda db, s: db.get_categories()),
+    ('get_size_options', lambda db, s: db.get_size_options()),
+    ('get_color_options', lambda db, s: db.get_color_options()),
+    ('get_all_products', lambda db, s: db.get_all_products()),
+    ('get_all_products[compact]', lambda db, s: db.get_all_products(compact=True)),
+    ('search_products', lambda db, s: db.search_products(s.query)),
+    ('search_products[arabic]', lambda db, s: db.search_products(s.arabic_query)),
+    ('get_product_by_id', lambda db, s: db.get_product_by_id(s.product_id)),
+    ('get_color_image', lambda db, s: db.get_color_image(s.product_id, s.color)),
+    ('check_inventory', lambda db, s: db.check_inventory(s.product_id, s.color, s.size)),
+    ('get_variant_id', lambda db, s: db.get_variant_id(s.product_id, s.color, s.size)),
+    ('get_available_variants', lambda db, s: db.get_available_variants(s.product_id)),
+    ('get_inventory_analytics', lambda db, s: db.get_inventory_analytics()),
+    ('get_order_by_id', lambda db, s: db.get_order_by_id(s.order_id)),
+    ('get_order_status', lambda db, s: db.get_order_status(s.order_id)),
+    ('get_orders[user]', lambda db, s: db.get_orders(user_id=s.telegram_id)),
+    ('get_orders[page]', lambda db, s: db.get_orders(limit=50)),
+    ('query_orders', lambda db, s: db.query_orders()),
+    ('query_orders[status]', lambda db, s: db.query_orders({'status': 'delivered'})),
+    ('query_orders[state]', lambda db, s: db.query_orders({'state': s.state})),
+    ('query_orders[dates]', lambda db, s: db.query_orders({'start_date': s.month_start, 'end_date': s.end_date})),
+    ('get_order_locations', lambda db, s: db.get_order_locations()),
+    ('get_order_stats', lambda db, s: db.get_order_stats()),
+    ('get_all_bot_users', lambda db, s: db.get_all_bot_users()),
+    ('get_bot_users_count', lambda db, s: db.get_bot_users_count()),
+    ('get_buyers_count', lambda db, s: db.get_buyers_count()),
+    ('get_customers_count', lambda db, s: db.get_customers_count()),
+    ('get_all_notification_users', lambda db, s: db.get_all_notification_users()),
+    ('get_all_customers', lambda db, s: db.get_all_customers()),
+    ('query_customers', lambda db, s: db.query_customers()),
+    ('get_all_customers_with_orders', lambda db, s: db.get_all_customers_with_orders()),
+    ('get_customer_orders_summary', lambda db, s: db.get_customer_orders_summary(s.telegram_id)),
+    ('get_sales_summary[month]', lambda db, s: db.get_sales_summary(s.month_start, s.end_date)),
+    ('get_sales_summary[365d]', lambda db, s: db.get_sales_summary(days=365)),
+    ('get_variant_sales', lambda db, s: db.get_variant_sales(days=30)),
+    ('get_sales_analytics', lambda db, s: db.get_sales_analytics(30)),
+    ('get_product_sales_data', lambda db, s: db.get_product_sales_data(s.product_id)),
+    ('get_products_performance', lambda db, s: db.get_products_performance()),
+    ('get_products_performance[variants]', lambda db, s: db.get_products_performance(include_variants=True)),
+    ('get_delivered_orders_by_date_range', lambda db, s: db.get_delivered_orders_by_date_range(s.month_start, s.end_date)),
+    ('get_delivered_revenue_by_date_range', lambda db, s: db.get_delivered_revenue_by_date_range(s.month_start, s.end_date)),
+    ('get_staff_activity_logs', lambda db, s: db.get_staff_activity_logs()),
+    ('get_staff_activity_logs[action]', lambda db, s: db.get_staff_activity_logs(action_type='order_status_update')),
+    ('get_staff_activity_stats', lambda db, s: db.get_staff_activity_stats(30)),
+    ('get_client_activity_logs', lambda db, s: db.get_client_activity_logs()),
+    ('get_client_activity_logs[user]', lambda db, s: db.get_client_activity_logs(telegram_id=s.telegram_id)),
+    ('get_client_activity_logs[year]', lambda db, s: db.get_client_activity_logs(start_date=s.year_start)),
+    ('get_client_activity_stats', lambda db, s: db.get_client_activity_stats(30)),
+    ('get_client_interests', lambda db, s: db.get_client_interests(s.telegram_id)),
+    ('get_client_interest_summary', lambda db, s: db.get_client_interest_summary(s.telegram_id)),
+    ('get_top_interests', lambda db, s: db.get_top_interests('cart_product')),
+    ('get_price_change_batches', lambda db, s: db.get_price_change_batches()),
+    ('preview_bulk_prices', lambda db, s: db.preview_bulk_prices(s.product_ids, 'percentage_increase', 10)),
+    ('get_all_users', lambda db, s: db.get_all_users()),
+    ('get_user_by_id', lambda db, s: db.get_user_by_id(1)),
+    ('authenticate_user', lambda db, s: db.authenticate_user('admin', 'admin123')),
+]
+
+# (name, fn(db, s, i)): writes, timed --repeat times; i picks a fresh target per run
+WRITE_CASES = [
+    ('add_category', lambda db, s, i: db.add_category(f'Bench Category {i}', f'فئة تجريبية {i}')),
+    ('add_product', lambda db, s, i: s.new_products.append(
+        db.add_product(f'Bench Category {i}', f'Bench Tee {i}', 25000.0, model_number=f'BENCH-{i:04d}',
+                       arabic_name=f'قميص تجريبي {i}'))),
+    ('add_product_variant', lambda db, s, i: db.add_product_variant(s.new_products[i], s.color, s.size, 10)),
+    ('upsert_variants', lambda db, s, i: db.upsert_variants(s.product_id, [
+        {'color': v['color'], 'size': v['size'], 'quantity': v['quantity'] + 1} for v in s.variants])),
+    ('update_product', lambda db, s, i: db.update_product(s.product_id, price=s.price + i)),
+    ('update_product_price', lambda db, s, i: db.update_product_price(s.product_id, s.price)),
+    ('update_variant_quantity', lambda db, s, i: db.update_variant_quantity(
+        s.product_id, s.color, s.size, 100 + i, 'benchmark')),
+    ('bulk_adjust_stock', lambda db, s, i: db.bulk_adjust_stock([
+        {'product_id': v['product_id'], 'color': v['color'], 'size': v['size'], 'operation': 'add', 'value': 1}
+        for v in s.stock_variants], 'benchmark')),
+    ('apply_bulk_prices', lambda db, s, i: s.price_batches.append(
+        db.apply_bulk_prices(s.product_ids, 'percentage_increase', 5))),
+    ('revert_price_batch', lambda db, s, i: db.revert_price_batch(s.price_batches[i]['batch_id'])),
+    ('create_order', lambda db, s, i: db.create_order(items=[dict(s.order_item)], **s.buyer)),
+    ('update_order_status', lambda db, s, i: db.update_order_status(s.open_orders[i], 'shipped')),
+    ('cancel_order', lambda db, s, i: db.cancel_order(s.cancel_orders[i])),
+    ('delete_order', lambda db, s, i: db.delete_order(s.old_orders[i])),
+    ('add_bot_user', lambda db, s, i: db.add_bot_user(990000000 + i, f'bench{i}', 'مستخدم', 'تجريبي')),
+    ('mark_user_as_buyer', lambda db, s, i: db.mark_user_as_buyer(990000000 + i)),
+    ('add_customer', lambda db, s, i: db.add_customer(990000000 + i, f'bench{i}', 'مستخدم', 'تجريبي', '07700000000')),
+    ('log_client_activity[x100+flush]', lambda db, s, i: (
+        [db.log_client_activity(s.telegram_id, 'view_product', 'عرض تفاصيل المنتج', 'product',
+                                s.product_id, 'Bench', '{"category": "Bench"}') for _ in range(100)],
+        db.flush_activity_logs())),
+    ('log_staff_activity[x100+flush]', lambda db, s, i: (
+        [db.log_staff_activity(1, 'product_update', 'تعديل منتج', 'product', s.product_id)
+         for _ in range(100)],
+        db.flush_activity_logs())),
+    ('create_user', lambda db, s, i: db.create_user(f'bench{i}', 'bench123', 'مستخدم تجريبي')),
+    ('update_user', lambda db, s, i: db.update_user(s.user_id(db, i), full_name=f'مستخدم {i}')),
+    ('change_user_password', lambda db, s, i: db.change_user_password(s.user_id(db, i), 'bench456')),
+    ('delete_user', lambda db, s, i: db.delete_user(s.user_id(db, i))),
+    ('delete_product_variant', lambda db, s, i: db.delete_product_variant(s.new_products[i], s.color, s.size)),
+    ('delete_product', lambda db, s, i: db.delete_product(s.new_products[i])),
+]
+
+# (name, fn(db, s)): whole-table rebuilds and jobs, timed once
+MAINTENANCE_CASES = [
+    ('rebuild_customer_aggregates', lambda db, s: db.rebuild_customer_aggregates()),
+    ('rebuild_sales_daily', lambda db, s: db.rebuild_sales_daily()),
+    ('rebuild_product_sales_summary', lambda db, s: db.rebuild_product_sales_summary()),
+    ('verify_product_sales_summary', lambda db, s: db.verify_product_sales_summary()),
+    ('rebuild_product_search_index', lambda db, s: db.rebuild_product_search_index()),
+    ('rebuild_client_profiles', lambda db, s: db.rebuild_client_profiles()),
+    ('backup_database', lambda db, s: db.backup_database(quick_check=True)),
+    ('archive_activity_logs', lambda db, s: db.archive_activity_logs()),
+]
+
+# (name, path(s)): dashboard pages and APIs, timed --repeat times
+ROUTE_CASES = [
+    ('index', lambda s: '/'),
+    ('all_orders', lambda s: '/all-orders'),
+    ('all_orders[delivered]', lambda s: '/all-orders?status=delivered'),
+    ('api_orders', lambda s: '/api/orders'),
+    ('api_order', lambda s: f'/api/order/{s.order_id}'),
+    ('api_stats', lambda s: '/api/stats'),
+    ('products', lambda s: '/products'),
+    ('search_products', lambda s: f'/search_products?q={s.query}'),
+    ('inventory', lambda s: '/inventory'),
+    ('api_low_stock', lambda s: '/api/inventory/low_stock'),
+    ('accounting', lambda s: f'/accounting?start_date={s.month_start}&end_date={s.end_date}'),
+    ('reports', lambda s: '/reports'),
+    ('customers', lambda s: '/customers'),
+    ('staff_logs', lambda s: '/staff-logs'),
+    ('client_logs', lambda s: '/client-logs'),
+    ('api_client_logs', lambda s: '/api/client-logs'),
+    ('api_top_interests', lambda s: '/api/client-interests/top'),
+    ('export_orders', lambda s: '/export_orders'),
+]
+
+# Public Database methods that are infrastructure rather than features
+NOT_TIMED = {
+    'migrate', 'get_connection', 'snapshot_reads', 'release_connection', 'close_connections',
+    'queue_write', 'flush_activity_logs', 'clear_cache', 'verify_password',
+    'get_pool_stats', 'get_cache_stats', 'get_writer_stats', 'get_snapshot_stats',
+    'get_backup_stats', 'get_query_stats', 'get_activity_archive_stats',
+}
+
+
+def summarize(durations, result=None) -> dict:
+    ordered = sorted(durations)
+    summary = {
+        'runs': len(ordered),
+        'median_ms': round(statistics.median(ordered) * 1000, 3),
+        'min_ms': round(ordered[0] * 1000, 3),
+        'max_ms': round(ordered[-1] * 1000, 3),
+        'p95_ms': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 3),
+    }
+    if isinstance(result, (list, tuple)):
+        summary['rows'] = len(result)
+    return summary
+
+
+def samples(db, end_date: str) -> SimpleNamespace:
+    """Ids and values the cases run against, picked from the generated data"""
+    conn = db.get_connection()
+    product_id, color, size = conn.execute('''
+        SELECT product_id, color, size FROM product_sales_summary ORDER BY total_sold DESC LIMIT 1
+    ''').fetchone()
+    product = conn.execute('SELECT name, price FROM products WHERE id = ?', (product_id,)).fetchone()
+    variants = [dict(zip(('product_id', 'color', 'size', 'quantity'), row)) for row in conn.execute(
+        'SELECT product_id, color, size, quantity FROM product_variants WHERE product_id = ?', (product_id,))]
+    stock_variants = [dict(zip(('product_id', 'color', 'size'), row)) for row in conn.execute(
+        'SELECT product_id, color, size FROM product_variants ORDER BY id LIMIT 20')]
+    stocked = conn.execute('SELECT product_id, color, size FROM product_variants ORDER BY quantity DESC LIMIT 1').fetchone()
+    stocked_product = conn.execute('SELECT name, price FROM products WHERE id = ?', (stocked[0],)).fetchone()
+    telegram_id = conn.execute('SELECT telegram_id FROM customers ORDER BY total_orders DESC, telegram_id LIMIT 1').fetchone()[0]
+    buyer = conn.execute('''
+        SELECT user_id, user_name, user_phone, user_address, user_state, user_region, username
+        FROM orders WHERE user_id = ? ORDER BY id DESC LIMIT 1
+    ''', (telegram_id,)).fetchone()
+    order_id = conn.execute('SELECT MAX(id) FROM orders').fetchone()[0]
+    state = conn.execute('SELECT user_state FROM orders GROUP BY 1 ORDER BY COUNT(*) DESC LIMIT 1').fetchone()[0]
+    end = datetime.strptime(end_date, '%Y-%m-%d')
+
+    def order_ids(sql):
+        return [row[0] for row in conn.execute(sql)]
+
+    def user_id(db, i):
+        return db.get_connection().execute('SELECT id FROM dashboard_users WHERE username = ?',
+                                           (f'bench{i}',)).fetchone()[0]
+
+    return SimpleNamespace(
+        product_id=product_id, color=color, size=size, price=product[1], variants=variants,
+        stock_variants=stock_variants,
+        product_ids=[row[0] for row in conn.execute('SELECT id FROM products ORDER BY id LIMIT 200')],
+        query=product[0].split()[0], arabic_query='قميص',
+        telegram_id=telegram_id, order_id=order_id, state=state,
+        end_date=end_date, month_start=(end - timedelta(days=30)).strftime('%Y-%m-%d'),
+        year_start=(end - timedelta(days=365)).strftime('%Y-%m-%d'),
+        buyer=dict(zip(('user_id', 'user_name', 'user_phone', 'user_address', 'user_state',
+                        'user_region', 'username'), buyer), total_amount=stocked_product[1]),
+        order_item={'product_id': stocked[0], 'name': stocked_product[0], 'price': stocked_product[1],
+                    'quantity': 1, 'color': stocked[1], 'size': stocked[2]},
+        open_orders=order_ids("SELECT id FROM orders WHERE status IN ('pending', 'confirmed') ORDER BY id DESC LIMIT 1000"),
+        cancel_orders=order_ids("SELECT id FROM orders WHERE status = 'shipped' ORDER BY id DESC LIMIT 1000"),
+        old_orders=order_ids("SELECT id FROM orders WHERE status IN ('pending', 'confirmed', 'shipped') ORDER BY id LIMIT 1000"),
+        new_products=[], price_batches=[], user_id=user_id,
+    )
+
+
+class Quiet:
+    """Keep the methods' progress prints out of the benchmark output"""
+
+    def __enter__(self):
+        self.stdout, sys.stdout = sys.stdout, open(os.devnull, 'w')
+
+    def __exit__(self, *exc):
+        sys.stdout.close()
+        sys.stdout = self.stdout
+
+
+def failed(result) -> bool:
+    """The methods report most failures as False or {'success': False}"""
+    return result is False or (isinstance(result, dict) and result.get('success') is False)
+
+
+def time_call(fn):
+    started = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - started, result
+
+
+def run_methods(db, s, repeat: int) -> dict:
+    results = {}
+    for name, case in READ_CASES:
+        db.clear_cache()
+        case(db, s)  # warm-up: page cache, report snapshot
+        durations = []
+        for _ in range(repeat):
+            db.clear_cache()
+            elapsed, result = time_call(lambda: case(db, s))
+            durations.append(elapsed)
+        results[name] = summarize(durations, result)
+
+    for name, case in WRITE_CASES:
+        durations, failures = [], 0
+        for i in range(repeat):
+            elapsed, result = time_call(lambda: case(db, s, i))
+            durations.append(elapsed)
+            failures += failed(result)
+        results[name] = summarize(durations)
+        if failures:
+            results[name]['failures'] = failures
+
+    for name, case in MAINTENANCE_CASES:
+        elapsed, result = time_call(lambda: case(db, s))
+        results[name] = summarize([elapsed])
+        if failed(result):
+            results[name]['failures'] = 1
+    return results
+
+
+def run_routes(s, repeat: int) -> dict:
+    try:
+        from app import app
+    except ImportError as e:
+        return {'skipped': f'dashboard not importable: {e}'}
+    from database import db
+
+    client = app.test_client()
+    client.post('/login', data={'username': 'admin', 'password': 'admin123'})
+    results = {}
+    for name, path in ROUTE_CASES:
+        url = path(s)
+        client.get(url)  # warm-up: templates, snapshot
+        durations = []
+        for _ in range(repeat):
+            db.clear_cache()
+            elapsed, response = time_call(lambda: client.get(url))
+            durations.append(elapsed)
+        results[name] = {**summarize(durations), 'status': response.status_code,
+                         'bytes': len(response.get_data())}
+    return results
+
+
+def run_scale(args):
+    """Child process: generate one dataset and time it"""
+    from generate_dataset import generate
+
+    end_date = args.end_date or datetime.now().strftime('%Y-%m-%d')
+    manifest = generate(args.workdir, args.run_scale, args.seed, end_date, force=True)
+    from database import Database, db
+    db.metrics.slow_query_ms = float('inf')  # timings go to the report, not the slow log
+
+    with Quiet():
+        s = samples(db, end_date)
+        methods = run_methods(db, s, args.repeat)
+        routes = run_routes(s, args.repeat)
+
+    timed = {name.split('[')[0] for name, _ in READ_CASES + WRITE_CASES + MAINTENANCE_CASES}
+    public = {name for name, member in inspect.getmembers(Database, inspect.isfunction)
+              if not name.startswith('_')}
+    report = {
+        'dataset': manifest,
+        'methods': methods,
+        'routes': routes,
+        'not_timed': sorted(public - timed - NOT_TIMED),
+        'top_statements': [
+            {key: item[key] for key in ('name', 'calls', 'total_ms', 'p95_ms', 'rows')}
+            for item in db.get_query_stats(10)['statements']
+        ],
+    }
+    with open(args.result, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False)
+    with Quiet():
+        db.close_connections()
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(old_path: str, new_report: dict):
+    with open(old_path, encoding='utf-8') as f:
+        old_report = json.load(f)
+    print(f"\nChanges over {COMPARE_THRESHOLD:.0%} (cases over {COMPARE_MIN_MS:g} ms) vs {old_path} ({old_report.get('commit')}):")
+    changed = 0
+    for scale, new in new_report['scales'].items():
+        old = old_report.get('scales', {}).get(scale)
+        if not old:
+            continue
+        for group in ('methods', 'routes'):
+            for name, timing in new.get(group, {}).items():
+                before = old.get(group, {}).get(name)
+                if not isinstance(timing, dict) or not isinstance(before, dict) or not before.get('median_ms'):
+                    continue
+                if max(timing['median_ms'], before['median_ms']) < COMPARE_MIN_MS:
+                    continue
+                ratio = timing['median_ms'] / before['median_ms']
+                if abs(ratio - 1) > COMPARE_THRESHOLD:
+                    changed += 1
+                    print(f"  {scale:>5}x {group:<8} {name:<40} {before['median_ms']:>10.2f} -> "
+                          f"{timing['median_ms']:>10.2f} ms  ({ratio:.2f}x)")
+    if not changed:
+        print("  none")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Database and dashboard benchmark suite')
+    parser.add_argument('--scales', default='1,10,100', help='comma separated dataset scales')
+    parser.add_argument('--repeat', type=int, default=5, help='timed runs per case')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--end-date', help='last day of the generated history (default: today)')
+    parser.add_argument('--out', default='bench_report.json')
+    parser.add_argument('--compare', help='earlier report to compare against')
+    parser.add_argument('--workdir', help='keep the generated databases here')
+    parser.add_argument('--run-scale', type=float, help=argparse.SUPPRESS)
+    parser.add_argument('--result', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_scale is not None:
+        return run_scale(args)
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='bench_suite_')
+    end_date = args.end_date or datetime.now().strftime('%Y-%m-%d')
+    report = {
+        'commit': git_commit(),
+        'generated_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'seed': args.seed,
+        'end_date': end_date,
+        'repeat': args.repeat,
+        'scales': {},
+    }
+    for scale in args.scales.split(','):
+        scale_dir = os.path.join(workdir, f'scale_{scale}')
+        result = os.path.join(workdir, f'scale_{scale}.json')
+        print(f"⏱️ Scale {scale}x in {scale_dir}")
+        started = time.perf_counter()
+        subprocess.run([sys.executable, os.path.abspath(__file__), '--run-scale', scale,
+                        '--workdir', scale_dir, '--result', result, '--repeat', str(args.repeat),
+                        '--seed', str(args.seed), '--end-date', end_date], check=True)
+        with open(result, encoding='utf-8') as f:
+            report['scales'][scale] = json.load(f)
+        methods = report['scales'][scale]['methods']
+        slowest = sorted(methods.items(), key=lambda item: item[1]['median_ms'], reverse=True)[:5]
+        print(f"   done in {time.perf_counter() - started:.0f}s; slowest: " +
+              ', '.join(f"{name} {timing['median_ms']:.1f} ms" for name, timing in slowest))
+
+    with open(args.out, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, sort_keys=True, ensure_ascii=False)
+    print(f"✅ Wrote {args.out}")
+    if args.compare:
+        compare(args.compare, report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+# benchmarks/check_product_sales.py - Consistency check for the product_sales_summary table
+#
+# Usage: python benchmarks/check_product_sales.py [--db store.db] [--repair]
+#
+# Recomputes per-variant sales from order_items / orders and compares them
+# with the trigger-maintained product_sales_summary. Exits with status 1 when
+# any variant has drifted (after repairing it with --repair).
+import argparse
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--db', default=os.path.join(ROOT, 'store.db'), help='database to check')
+    parser.add_argument('--repair', action='store_true', help='rebuild the summary when it has drifted')
+    args = parser.parse_args()
+
+    from database import Database
+
+    db = Database(os.path.abspath(args.db))
+    drift = db.verify_product_sales_summary()
+
+    for row in drift:
+        print(f"❌ product {row['product_id']} ({row['color'] or '-'}, {row['size'] or '-'}): "
+              f"sold {row['stored_sold']} vs {row['expected_sold']}, "
+              f"revenue {row['stored_revenue']} vs {row['expected_revenue']}, "
+              f"last sale {row['stored_last_sale']} vs {row['expected_last_sale']}")
+
+    if not drift:
+        print("✅ product_sales_summary matches order history")
+        return 0
+
+    print(f"❌ {len(drift)} variant(s) out of sync")
+    if args.repair:
+        db.rebuild_product_sales_summary()
+        remaining = db.verify_product_sales_summary()
+        print(f"🔧 Rebuilt summary, {len(remaining)} variant(s) still out of sync")
+    return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,243 @@
+# benchmarks/check_query_plans.py - EXPLAIN QUERY PLAN over every SQL statement in database.py
+#
+# Usage: python benchmarks/check_query_plans.py [--db path] [--verbose]
+#
+# Collects the SQL passed to execute()/executemany() in database.py (plus
+# the catalog queries and the statements in every trigger body), runs
+# EXPLAIN QUERY PLAN for each against a freshly migrated schema (or --db) and
+# exits with status 1 when a statement does a full-table SCAN of a large
+# table that is not listed in ALLOWED_SCANS.
+import argparse
+import ast
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Tables that grow with traffic; scanning any of these is a finding
+LARGE_TABLES = {
+    'orders', 'order_items', 'products', 'product_variants', 'inventory_history',
+    'customers', 'bot_users', 'client_activity_logs', 'staff_activity_logs',
+}
+
+# (function, table) pairs that read the whole table on purpose
+ALLOWED_SCANS = {
+    ('get_all_products', 'p'): 'catalog lists every active product',
+    ('get_all_products', 'pv'): 'catalog walks the in-stock partial index',
+    ('query_orders', 'orders'): 'unfiltered keyset page walks the rowid with LIMIT; totals cover the filtered set',
+    ('get_order_stats', 'orders'): 'dashboard stat cards: one aggregate pass over all orders',
+    ('query_customers', 'c'): 'first keyset page walks idx_customers_spent with LIMIT',
+    ('query_customers', 'customers'): 'page stats aggregate every customer',
+    ('get_inventory_analytics', 'p'): 'stock report aggregates every product',
+    ('get_inventory_analytics', 'pv'): 'stock report aggregates every variant',
+    ('get_inventory_analytics', 'product_variants'): 'stock report aggregates every variant',
+    ('get_all_bot_users', 'bot_users'): 'broadcast targets every user',
+    ('get_all_notification_users', 'bot_users'): 'notifications target every user',
+    ('get_all_notification_users', 'customers'): 'notifications target every user',
+    ('get_all_customers', 'customers'): 'customer list page',
+    ('get_all_customers', 'c'): 'customer list page',
+    ('get_all_customers_with_orders', 'c'): 'customer list page',
+    ('get_products_performance', 'p'): 'report covers every product',
+    ('verify_product_sales_summary', 'oi'): 'consistency check re-aggregates all order history',
+    ('get_order_locations', 'orders'): 'distinct filter values (covering index)',
+    ('get_bot_users_count', 'bot_users'): 'COUNT(*)',
+    ('get_buyers_count', 'bot_users'): 'COUNT(*)',
+    ('get_customers_count', 'customers'): 'COUNT(*)',
+    ('get_staff_activity_stats', 'staff_activity_logs'): 'stats over the whole window',
+    ('get_client_activity_stats', 'client_activity_logs'): 'stats over the whole window',
+    ('get_all_users', 'dashboard_users'): 'dashboard users list',
+    ('trg_products_fts_category_update', 'products'): 'rare admin rename reindexes the category',
+}
+
+# f-string FROM clauses that name a table chosen at run time (the hot table,
+# or a UNION ALL with its archive partitions)
+DYNAMIC_SOURCES = {
+    'get_staff_activity_logs': 'staff_activity_logs',
+    'get_staff_activity_stats': 'staff_activity_logs',
+    'get_client_activity_logs': 'client_activity_logs',
+    'get_client_activity_stats': 'client_activity_logs',
+}
+
+SQL_START = re.compile(r'^\s*(SELECT|INSERT|UPDATE|DELETE|WITH|REPLACE)\b', re.IGNORECASE)
+EXECUTE_METHODS = {'execute', 'executemany'}
+# NEW.col / OLD.col in a trigger body; bound as parameters to explain it
+TRIGGER_ROW = re.compile(r'\b(?:NEW|OLD)\.\w+')
+
+
+def _sql_text(node):
+    """Literal SQL of an execute() argument; f-string fields become a marker"""
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return node.value, False
+    if isinstance(node, ast.JoinedStr):
+        parts = []
+        for value in node.values:
+            if isinstance(value, ast.Constant):
+                parts.append(value.value)
+            else:
+                parts.append('\x00')
+        return ''.join(parts), True
+    return None, False
+
+
+def collect_statements(path):
+    """[(function, line, sql, dynamic)] for every execute() in the module"""
+    tree = ast.parse(open(path, encoding='utf-8').read())
+    statements = []
+
+    class Visitor(ast.NodeVisitor):
+        def __init__(self):
+            self.function = '<module>'
+
+        def visit_FunctionDef(self, node):
+            outer, self.function = self.function, node.name
+            self.generic_visit(node)
+            self.function = outer
+
+        def visit_Call(self, node):
+            if (isinstance(node.func, ast.Attribute) and node.func.attr in EXECUTE_METHODS
+                    and node.args):
+                sql, dynamic = _sql_text(node.args[0])
+                if sql and SQL_START.match(sql):
+                    statements.append((self.function, node.lineno, sql, dynamic))
+            self.generic_visit(node)
+
+    Visitor().visit(tree)
+    return statements
+
+
+def collect_trigger_statements(conn):
+    """[(trigger, 0, sql, False)] for every statement in every trigger body"""
+    statements = []
+    for name, sql in conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'trigger' ORDER BY name"):
+        body = sql[re.search(r'\bBEGIN\b', sql, re.IGNORECASE).end():sql.rstrip().rfind('END')]
+        pending = ''
+        for part in body.split(';'):
+            pending += part + ';'
+            if sqlite3.complete_statement(pending):
+                if pending.strip(' \t\n;'):
+                    statements.append((name, 0, TRIGGER_ROW.sub('?', pending.strip()), False))
+                pending = ''
+    return statements
+
+
+def _expand_dynamic(sql, function=None):
+    """Best-effort concrete SQL for an f-string (dynamic FROM/WHERE/SET/IN lists)"""
+    if function in DYNAMIC_SOURCES:
+        sql = re.sub(r'FROM\s+\x00', 'FROM ' + DYNAMIC_SOURCES[function], sql)
+    sql = re.sub(r'IN \(VALUES \x00\)', 'IN (VALUES (?, ?, ?))', sql)
+    sql = re.sub(r'IN \(\x00\)', 'IN (?)', sql)
+    sql = re.sub(r'IN\s+\x00', 'IN (1, 2)', sql)
+    sql = re.sub(r'=\s*\x00', '= 1', sql)
+    sql = re.sub(r'WHERE\s+\x00', 'WHERE 1', sql)
+    sql = re.sub(r'AND\s+\x00', 'AND 1', sql)
+    sql = re.sub(r'SET\s+\x00', 'SET id = id', sql)
+    sql = re.sub(r'BY\s+\x00', 'BY id', sql)
+    sql = re.sub(r'\(\x00\)', '(1)', sql)
+    sql = re.sub(r',\s*\x00', ', 1', sql)
+    return sql.replace('\x00', '')
+
+
+def explain(conn, sql):
+    params = [None] * sql.count('?')
+    return [row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql, params).fetchall()]
+
+
+def scanned_tables(plan):
+    """Tables (or aliases) read with a full SCAN, including full index scans"""
+    tables = []
+    for detail in plan:
+        match = re.match(r'SCAN (?:TABLE )?(\w+)', detail)
+        if match:
+            tables.append((match.group(1), detail))
+    return tables
+
+
+def _alias_targets(sql):
+    """{alias: table} for FROM/JOIN clauses"""
+    aliases = {}
+    for table, alias in re.findall(r'(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?', sql, re.IGNORECASE):
+        aliases[table] = table
+        if alias and alias.upper() not in {'ON', 'WHERE', 'JOIN', 'LEFT', 'INNER', 'GROUP',
+                                           'ORDER', 'LIMIT', 'USING', 'SET', 'AND'}:
+            aliases[alias] = table
+    return aliases
+
+
+def check(conn, statements, verbose=False):
+    findings = []
+    errors = []
+    for function, line, sql, dynamic in statements:
+        concrete = _expand_dynamic(sql, function) if dynamic else sql
+        try:
+            plan = explain(conn, concrete)
+        except sqlite3.Error as e:
+            errors.append((function, line, str(e)))
+            continue
+
+        aliases = _alias_targets(concrete)
+        for name, detail in scanned_tables(plan):
+            table = aliases.get(name, name)
+            if table not in LARGE_TABLES:
+                continue
+            if (function, name) in ALLOWED_SCANS or (function, table) in ALLOWED_SCANS:
+                if verbose:
+                    print(f"   allowed  {function}:{line}  {detail}")
+                continue
+            findings.append((function, line, detail))
+
+        if verbose:
+            print(f"{function}:{line}")
+            for detail in plan:
+                print(f"      {detail}")
+    return findings, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--db', help='database to check (default: freshly migrated temp schema)')
+    parser.add_argument('--verbose', action='store_true', help='print every plan')
+    args = parser.parse_args()
+
+    if args.db:
+        db_path = args.db
+    else:
+        workdir = tempfile.mkdtemp(prefix='query_plans_')
+        # database.py opens store.db in the working directory on import
+        os.chdir(workdir)
+        stdout, sys.stdout = sys.stdout, open(os.devnull, 'w')
+        try:
+            from database import Database
+            db_path = os.path.join(workdir, 'plans.db')
+            Database(db_path).close_connections()
+        finally:
+            sys.stdout.close()
+            sys.stdout = stdout
+
+    from catalog import CATALOG_QUERY, catalog_query_for
+    statements = collect_statements(os.path.join(ROOT, 'database.py'))
+    statements.append(('get_all_products', 0, CATALOG_QUERY, False))
+    statements.append(('get_products_by_ids', 0, catalog_query_for(2), False))
+
+    conn = sqlite3.connect(db_path)
+    triggers = collect_trigger_statements(conn)
+    findings, errors = check(conn, statements + triggers, verbose=args.verbose)
+    conn.close()
+
+    print(f"🔍 Checked {len(statements)} statements from database.py and {len(triggers)} from triggers")
+    for function, line, message in errors:
+        print(f"⚠️  {function}:{line} could not be explained: {message}")
+    for function, line, detail in findings:
+        print(f"❌ {function}:{line}  {detail}")
+    if findings:
+        print(f"❌ {len(findings)} full-table scan(s) of large tables")
+        return 1
+    print("✅ No unexpected full-table scans")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,633 @@
+# benchmarks/generate_dataset.py - Deterministic synthetic store.db at production scale
+#
+# Usage: python benchmarks/generate_dataset.py --dir /tmp/store_10x [--scale 10] [--seed 42]
+#                                              [--end-date 2026-10-01] [--force]
+#
+# Creates <dir>/store.db with the current schema (Database migrations) and
+# fills it with categories, products, variants, bot users, orders with items,
+# inventory history and client / staff activity logs. Text is Arabic where the
+# bot and dashboard write Arabic, states and regions come from
+# config.STATES_AND_REGIONS, and order statuses depend on the order's age.
+# Rows are inserted in chronological order, so ids grow with created_at as in
+# production, and every trigger-maintained table (customers, sales_daily,
+# product_sales_summary, client_profiles, products_fts) is filled by its
+# triggers. The same seed, scale and end date always give the same data.
+import argparse
+import bisect
+import hashlib
+import itertools
+import json
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Row counts at --scale 1. variants_per_product never scales; categories and
+# staff_users grow with the square root of the scale.
+BASE_VOLUMES = {
+    'categories': 12,
+    'products': 250,
+    'variants_per_product': 10,
+    'bot_users': 2000,
+    'orders': 1500,
+    'client_activity': 25000,
+    'staff_users': 6,
+    'staff_activity': 1500,
+}
+FIXED_VOLUMES = {'variants_per_product'}
+SQRT_VOLUMES = {'categories', 'staff_users'}
+
+HISTORY_DAYS = 365
+BUYER_SHARE = 0.35              # bot users who ever order
+BATCH_ROWS = 10000              # rows per executemany / commit
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Baghdad-evening-heavy traffic, by hour of day (UTC+3 shifted to UTC)
+HOUR_WEIGHTS = [6, 5, 4, 3, 2, 2, 2, 3, 4, 5, 6, 7, 8, 9, 10, 10, 11, 12, 13, 14, 13, 11, 9, 7]
+
+CATEGORIES = [
+    ('Men Shirts', 'قمصان رجالية'), ('Women Dresses', 'فساتين نسائية'), ('Abayas', 'عبايات'),
+    ('Jeans', 'جينز'), ('Jackets', 'جاكيتات'), ('Kids', 'ملابس أطفال'),
+    ('Sportswear', 'ملابس رياضية'), ('Shoes', 'أحذية'), ('Bags', 'حقائب'),
+    ('Accessories', 'إكسسوارات'), ('Sleepwear', 'ملابس نوم'), ('Traditional', 'أزياء تراثية'),
+]
+PRODUCT_TYPES = [
+    ('Shirt', 'قميص'), ('Trousers', 'بنطلون'), ('Dress', 'فستان'), ('Jacket', 'جاكيت'),
+    ('Skirt', 'تنورة'), ('Blouse', 'بلوزة'), ('Abaya', 'عباءة'), ('Coat', 'معطف'),
+    ('Hoodie', 'هودي'), ('Jeans', 'جينز'),
+]
+STYLES = [
+    ('Classic', 'كلاسيكي'), ('Modern', 'عصري'), ('Cotton', 'قطني'), ('Summer', 'صيفي'),
+    ('Winter', 'شتوي'), ('Sport', 'رياضي'), ('Luxury', 'فاخر'), ('Elegant', 'أنيق'),
+]
+DESCRIPTIONS = [
+    'خامة ممتازة ومريحة للاستخدام اليومي',
+    'تصميم أنيق يناسب جميع المناسبات',
+    'قماش قطني ١٠٠٪ بجودة عالية',
+    'متوفر بعدة ألوان ومقاسات',
+    'قَصّة عصرية وخياطة متينة',
+]
+FIRST_NAMES = ['محمد', 'أحمد', 'علي', 'حسين', 'فاطمة', 'زينب', 'مريم', 'سارة', 'عمر', 'يوسف',
+               'نور', 'حسن', 'رقية', 'كرار', 'مصطفى', 'آية', 'إسراء', 'عبدالله', 'هدى', 'ياسر']
+LAST_NAMES = ['الجبوري', 'العبيدي', 'التميمي', 'الربيعي', 'الدليمي', 'الخفاجي', 'الساعدي',
+              'الموسوي', 'الحسيني', 'الزبيدي', 'الشمري', 'الكعبي']
+ORDER_NOTES = ['يرجى الاتصال قبل التوصيل', 'التوصيل بعد الساعة ٥ مساءً', 'هدية، بدون فاتورة']
+
+# (status, weight) by order age: fresh orders are still open, old ones settled
+STATUS_BY_AGE = (
+    (2, (('pending', 60), ('confirmed', 30), ('shipped', 10))),
+    (7, (('pending', 10), ('confirmed', 20), ('shipped', 35), ('delivered', 30), ('cancelled', 5))),
+    (None, (('delivered', 88), ('cancelled', 12))),
+)
+# Client events besides bot_start (one per user) and order_placed (one per order)
+CLIENT_EVENT_WEIGHTS = (
+    ('view_product', 30), ('view_category', 20), ('browse_products', 18),
+    ('add_to_cart', 14), ('view_cart', 10), ('search', 8),
+)
+STAFF_ACTION_WEIGHTS = (
+    ('login', 20), ('order_status_update', 40), ('inventory_update', 15),
+    ('product_update', 12), ('product_add', 5), ('logout', 8),
+)
+
+
+def scaled_volumes(scale: float, overrides: dict = None) -> dict:
+    volumes = {}
+    for name, base in BASE_VOLUMES.items():
+        if name in FIXED_VOLUMES:
+            volumes[name] = base
+        elif name in SQRT_VOLUMES:
+            volumes[name] = max(1, round(base * scale ** 0.5))
+        else:
+            volumes[name] = max(1, round(base * scale))
+    volumes.update(overrides or {})
+    return volumes
+
+
+def zipf_cum_weights(n: int, exponent: float = 1.0) -> list:
+    """Cumulative weights for rng.choices: item i is chosen ~1/(i+1)^exponent"""
+    total, cum = 0.0, []
+    for i in range(n):
+        total += 1.0 / (i + 1) ** exponent
+        cum.append(total)
+    return cum
+
+
+def daily_counts(total: int, days: int = HISTORY_DAYS) -> list:
+    """total spread over days (oldest first), growing 3x from the first day to the last"""
+    weights = [1 + 2 * day / (days - 1) for day in range(days)]
+    scale = total / sum(weights)
+    counts = [int(w * scale) for w in weights]
+    for day in range(total - sum(counts)):
+        counts[-1 - day % days] += 1
+    return counts
+
+
+def day_times(rng: random.Random, day: datetime, count: int) -> list:
+    """count sorted timestamps within day, following HOUR_WEIGHTS"""
+    hours = rng.choices(range(24), weights=HOUR_WEIGHTS, k=count)
+    seconds = sorted(hour * 3600 + rng.randrange(3600) for hour in hours)
+    return [(day + timedelta(seconds=s)).strftime(TIMESTAMP_FORMAT) for s in seconds]
+
+
+def weighted(rng: random.Random, pairs) -> str:
+    values, weights = zip(*pairs)
+    return rng.choices(values, weights=weights)[0]
+
+
+def password_hash(rng: random.Random, password: str) -> str:
+    # Same format as Database._hash_password, with a seeded salt
+    salt = '%032x' % rng.getrandbits(128)
+    return f"{salt}${hashlib.sha256((salt + password).encode()).hexdigest()}"
+
+
+class GrowingPool:
+    """Items that can be picked once they exist (created_at <= moment),
+    with Zipf popularity over a random ranking, so the newest items are not
+    automatically the most or the least popular"""
+
+    def __init__(self, rng: random.Random, items, created_at, exponent: float = 1.0):
+        self.items = sorted(items, key=created_at)
+        self.times = [created_at(item) for item in self.items]
+        ranks = list(range(len(self.items)))
+        rng.shuffle(ranks)
+        self.cum_weights = list(itertools.accumulate(1.0 / (rank + 1) ** exponent for rank in ranks))
+
+    def pick(self, rng: random.Random, moment: str):
+        available = bisect.bisect_right(self.times, moment)
+        if not available:
+            return None
+        point = rng.random() * self.cum_weights[available - 1]
+        return self.items[bisect.bisect_right(self.cum_weights, point, 0, available - 1)]
+
+
+def order_status(rng: random.Random, age_days: float) -> str:
+    for max_age, pairs in STATUS_BY_AGE:
+        if max_age is None or age_days < max_age:
+            return weighted(rng, pairs)
+
+
+class DatasetGenerator:
+    """Fills an empty, migrated store.db; see the module header"""
+
+    def __init__(self, conn: sqlite3.Connection, volumes: dict, seed: int, end_date: datetime,
+                 states_and_regions: dict):
+        self.conn = conn
+        self.volumes = volumes
+        self.rng = random.Random(seed)
+        self.first_day = end_date - timedelta(days=HISTORY_DAYS - 1)
+        self.end_date = end_date
+        self.states = list(states_and_regions.items())
+        self.colors = conn.execute('SELECT color_code, arabic_name FROM color_options ORDER BY display_order').fetchall()
+        self.sizes = conn.execute('SELECT size_code, arabic_name FROM size_options ORDER BY display_order').fetchall()
+
+    def days(self):
+        for offset in range(HISTORY_DAYS):
+            yield self.first_day + timedelta(days=offset)
+
+    def insert(self, sql: str, rows):
+        """executemany in BATCH_ROWS chunks, each in its own transaction"""
+        count, batch = 0, []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= BATCH_ROWS:
+                self.conn.executemany(sql, batch)
+                self.conn.commit()
+                count += len(batch)
+                batch = []
+        if batch:
+            self.conn.executemany(sql, batch)
+            self.conn.commit()
+            count += len(batch)
+        return count
+
+    def generate(self) -> dict:
+        counts = {}
+        steps = [
+            ('categories', self.categories), ('products', self.products),
+            ('variants', self.variants), ('bot_users', self.bot_users),
+            ('orders', self.orders), ('inventory_history', self.inventory_history),
+            ('client_activity_logs', self.client_activity), ('staff_activity_logs', self.staff_activity),
+        ]
+        for name, step in steps:
+            started = time.perf_counter()
+            counts[name] = step()
+            print(f"  {name:<22} {counts[name]:>10,} rows  {time.perf_counter() - started:7.1f}s")
+        self.finish()
+        return counts
+
+    def categories(self):
+        self.category_rows = []
+        for i in range(self.volumes['categories']):
+            name, arabic = CATEGORIES[i % len(CATEGORIES)]
+            if i >= len(CATEGORIES):
+                name, arabic = f'{name} {i // len(CATEGORIES) + 1}', f'{arabic} {i // len(CATEGORIES) + 1}'
+            self.category_rows.append((i + 1, name, arabic))
+        created = self.first_day.strftime(TIMESTAMP_FORMAT)
+        return self.insert('INSERT INTO categories (id, name, arabic_name, created_at) VALUES (?, ?, ?, ?)',
+                           [row + (created,) for row in self.category_rows])
+
+    def products(self):
+        rng = self.rng
+        category_weights = zipf_cum_weights(len(self.category_rows), 0.6)
+        self.product_rows = []
+        for product_id in range(1, self.volumes['products'] + 1):
+            (type_name, type_arabic), (style, style_arabic) = rng.choice(PRODUCT_TYPES), rng.choice(STYLES)
+            category_id = rng.choices(self.category_rows, cum_weights=category_weights)[0][0]
+            created = self.first_day - timedelta(days=rng.randrange(30)) + timedelta(
+                days=HISTORY_DAYS * rng.random() ** 2)
+            self.product_rows.append((
+                product_id, category_id, f'{style} {type_name} {product_id}',
+                f'{type_arabic} {style_arabic} {product_id}',
+                float(rng.randrange(40, 380) * 250),  # 10,000 - 95,000 IQD in steps of 250
+                rng.choice(DESCRIPTIONS), rng.choice(DESCRIPTIONS),
+                f'{type_name[:3].upper()}-{product_id:06d}',
+                int(rng.random() < 0.95),
+                min(created, self.end_date).strftime(TIMESTAMP_FORMAT),
+            ))
+        self.product_rows.sort(key=lambda row: row[-1])
+        return self.insert('''
+            INSERT INTO products (id, category_id, name, arabic_name, price, description,
+                                  arabic_description, model_number, is_active, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (row + (row[-1],) for row in self.product_rows))
+
+    def variants(self):
+        rng = self.rng
+        combos = [(color, size) for color in self.colors for size in self.sizes]
+        self.variant_rows = []  # (variant_id, product_id, color, size, created_at)
+        variant_id = 0
+        for product in sorted(self.product_rows):
+            for (color, color_arabic), (size, size_arabic) in rng.sample(
+                    combos, min(self.volumes['variants_per_product'], len(combos))):
+                variant_id += 1
+                self.variant_rows.append((variant_id, product[0], color, color_arabic, size, size_arabic,
+                                          product[-1]))
+        # Quantities are set by inventory_history() once the sales are known
+        return self.insert('''
+            INSERT INTO product_variants (id, product_id, color, color_arabic, size, size_arabic,
+                                          quantity, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, 0, ?, ?)
+        ''', (row + (row[-1],) for row in self.variant_rows))
+
+    def bot_users(self):
+        rng = self.rng
+        self.users = []  # (telegram_id, username, first_name, last_name, created_at)
+        count = self.volumes['bot_users']
+        day_list = list(self.days())
+        day_weights = []
+        for day in range(HISTORY_DAYS):
+            day_weights.append((day_weights[-1] if day_weights else 0) + 1 + 2 * day / HISTORY_DAYS)
+        for i in range(count):
+            telegram_id = 700000000 + i * 13 + rng.randrange(13)
+            first_name = rng.choice(FIRST_NAMES)
+            last_name = rng.choice(LAST_NAMES) if rng.random() < 0.7 else None
+            username = f'user{telegram_id % 1000000}' if rng.random() < 0.6 else None
+            joined = rng.choices(day_list, cum_weights=day_weights)[0]
+            created = day_times(rng, joined, 1)[0]
+            self.users.append((telegram_id, username, first_name, last_name, created))
+        self.users.sort(key=lambda user: user[-1])
+
+        # Buyers keep one name, phone and address; a few buy again and again
+        buyer_count = max(1, int(count * BUYER_SHARE))
+        state_weights = zipf_cum_weights(len(self.states), 1.1)
+        region_weights = {state: zipf_cum_weights(len(regions), 0.8) for state, regions in self.states}
+        self.buyers = []
+        for user in rng.sample(self.users, buyer_count):
+            state, regions = rng.choices(self.states, cum_weights=state_weights)[0]
+            region = rng.choices(regions, cum_weights=region_weights[state])[0] if regions else ''
+            self.buyers.append({
+                'telegram_id': user[0], 'username': user[1], 'joined': user[4],
+                'name': f"{user[2]} {user[3] or rng.choice(LAST_NAMES)}",
+                'phone': f'07{rng.choice("3579")}{rng.randrange(10 ** 8):08d}',
+                'state': state, 'region': region,
+                'address': f'{region} - شارع {rng.randrange(1, 120)} - دار {rng.randrange(1, 400)}',
+            })
+        buyer_ids = {buyer['telegram_id']: buyer for buyer in self.buyers}
+        return self.insert('''
+            INSERT INTO bot_users (telegram_id, username, first_name, last_name, phone,
+                                   has_placed_order, created_at, last_active)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', ((u[0], u[1], u[2], u[3], buyer_ids[u[0]]['phone'] if u[0] in buyer_ids else None,
+               int(u[0] in buyer_ids), u[4], u[4]) for u in self.users))
+
+    def orders(self):
+        rng = self.rng
+        products = {row[0]: row for row in self.product_rows}
+        variants_by_product = {}
+        for row in self.variant_rows:
+            variants_by_product.setdefault(row[1], []).append(row)
+        listed = GrowingPool(rng, [row for row in self.product_rows if row[8]], lambda row: row[-1], 0.9)
+        buyers = GrowingPool(rng, self.buyers, lambda buyer: buyer['joined'], 0.7)
+
+        order_rows, item_rows = [], []
+        self.items_per_order = {}
+        self.sales = []  # (created_at, product_id, variant_id, quantity, order_id, cancelled)
+        order_id = 0
+        for day, count in zip(self.days(), daily_counts(self.volumes['orders'])):
+            age = (self.end_date - day).days
+            for created in day_times(rng, day, count):
+                buyer = buyers.pick(rng, created)
+                if buyer is None or listed.pick(rng, created) is None:
+                    continue
+                order_id += 1
+                status = order_status(rng, age + rng.random())
+                picked = {}
+                for _ in range(rng.choices((1, 2, 3, 4), weights=(55, 28, 12, 5))[0]):
+                    product = listed.pick(rng, created)
+                    variant = rng.choice(variants_by_product[product[0]])
+                    picked[variant[0]] = (variant, rng.choices((1, 2, 3), weights=(80, 15, 5))[0])
+                total = 0.0
+                self.items_per_order[order_id] = len(picked)
+                for variant, quantity in picked.values():
+                    product = products[variant[1]]
+                    total += product[4] * quantity
+                    item_rows.append((order_id, product[0], variant[0], product[2], product[4], quantity,
+                                      variant[2], variant[4]))
+                    self.sales.append((created, product[0], variant[0], quantity, order_id,
+                                       status == 'cancelled'))
+                updated = created if status == 'pending' else (
+                    datetime.strptime(created, TIMESTAMP_FORMAT) + timedelta(hours=rng.randrange(2, 72))
+                ).strftime(TIMESTAMP_FORMAT)
+                order_rows.append((order_id, buyer['telegram_id'], buyer['name'], buyer['phone'],
+                                   buyer['address'], buyer['state'], buyer['region'], buyer['username'],
+                                   total, status, created, min(updated, self.end_date.strftime('%Y-%m-%d 23:59:59')),
+                                   rng.choice(ORDER_NOTES) if rng.random() < 0.1 else None))
+        self.order_rows = order_rows
+        count = self.insert('''
+            INSERT INTO orders (id, user_id, user_name, user_phone, user_address, user_state, user_region,
+                                username, total_amount, status, order_date, status_update, notes)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', order_rows)
+        self.insert('''
+            INSERT INTO order_items (order_id, product_id, variant_id, product_name, price, quantity, color, size)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', item_rows)
+        return count
+
+    def inventory_history(self):
+        """Initial stock, sales, cancellation restocks and adjustments per variant,
+        replayed in time order so old/new quantities chain up to the final stock"""
+        rng = self.rng
+        events = []  # (created_at, product_id, variant_id, change_type, amount, reason)
+        for created, product_id, variant_id, quantity, order_id, cancelled in self.sales:
+            events.append((created, product_id, variant_id, 'sale', -quantity, f'Order #{order_id}'))
+            if cancelled:
+                restocked = (datetime.strptime(created, TIMESTAMP_FORMAT) + timedelta(days=1)
+                             ).strftime(TIMESTAMP_FORMAT)
+                events.append((restocked, product_id, variant_id, 'restock', quantity,
+                               f'Order #{order_id} cancellation'))
+        for variant in self.variant_rows:
+            if rng.random() < 0.3:
+                moment = datetime.strptime(variant[-1], TIMESTAMP_FORMAT) + timedelta(
+                    days=rng.randrange(1, HISTORY_DAYS))
+                if moment <= self.end_date:
+                    events.append((moment.strftime(TIMESTAMP_FORMAT), variant[1], variant[0], 'adjustment',
+                                   rng.choice((-2, -1, 1, 2, 3)), 'جرد دوري'))
+
+        # Final stock: mostly healthy, some low, some sold out. The opening
+        # stock is whatever leads there, raised so stock never goes negative.
+        events.sort()
+        net, low = {}, {}
+        for event in events:
+            net[event[2]] = net.get(event[2], 0) + event[4]
+            low[event[2]] = min(low.get(event[2], 0), net[event[2]])
+        final = {}
+        for variant in self.variant_rows:
+            roll = rng.random()
+            target = 0 if roll < 0.1 else rng.randint(1, 5) if roll < 0.25 else rng.randint(6, 60)
+            initial = max(target - net.get(variant[0], 0), -low.get(variant[0], 0))
+            final[variant[0]] = initial + net.get(variant[0], 0)
+            events.append((variant[-1], variant[1], variant[0], 'restock', initial, 'المخزون الافتتاحي'))
+
+        events.sort(key=lambda event: (event[0], event[3] != 'restock'))
+        stock = {}
+        rows = []
+        for created, product_id, variant_id, change_type, amount, reason in events:
+            old = stock.get(variant_id, 0)
+            stock[variant_id] = old + amount
+            rows.append((product_id, variant_id, change_type, old, old + amount, amount, reason, created))
+        self.conn.executemany('UPDATE product_variants SET quantity = ? WHERE id = ?',
+                              [(quantity, variant_id) for variant_id, quantity in final.items()])
+        self.conn.commit()
+        return self.insert('''
+            INSERT INTO inventory_history (product_id, variant_id, change_type, old_quantity,
+                                           new_quantity, change_amount, reason, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', rows)
+
+    def client_activity(self):
+        rng = self.rng
+        users = {user[0]: user for user in self.users}
+        visitors = GrowingPool(rng, self.users, lambda user: user[4], 0.8)
+        categories = {row[0]: row for row in self.category_rows}
+        listed = GrowingPool(rng, [row for row in self.product_rows if row[8]], lambda row: row[-1], 0.9)
+        queries = [style for style, _ in STYLES] + [arabic for _, arabic in PRODUCT_TYPES]
+
+        # bot_start at sign-up and order_placed at checkout are fixed; the rest
+        # of the volume is browsing spread over the history
+        fixed = [(user[4], user[0], 'bot_start', 'بدء استخدام البوت', None, None, None,
+                  json.dumps({'username': user[1], 'first_name': user[2]}, ensure_ascii=False))
+                 for user in self.users]
+        fixed += [(order[10], order[1], 'order_placed', f'إنشاء طلب جديد #{order[0]}', 'order', order[0],
+                   f'Order #{order[0]}', json.dumps({'total_amount': order[8],
+                                              'items_count': self.items_per_order[order[0]]}))
+                  for order in self.order_rows]
+        fixed.sort()
+        browsing = max(0, self.volumes['client_activity'] - len(fixed))
+
+        def event(created):
+            user, product = visitors.pick(rng, created), listed.pick(rng, created)
+            if user is None or product is None:
+                return None
+            telegram_id = user[0]
+            activity = weighted(rng, CLIENT_EVENT_WEIGHTS)
+            category = categories[product[1]]
+            if activity == 'view_product':
+                return (created, telegram_id, activity, f'عرض تفاصيل المنتج: {product[2]}', 'product',
+                        product[0], product[2],
+                        json.dumps({'category': category[1], 'product_name': product[2]}))
+            if activity == 'view_category':
+                return (created, telegram_id, activity, f'عرض فئة: {category[2]}', 'category', None,
+                        category[1], json.dumps({'category_arabic': category[2],
+                                                 'products_count': rng.randrange(5, 60)}, ensure_ascii=False))
+            if activity == 'add_to_cart':
+                color, size = rng.choice(self.colors)[0], rng.choice(self.sizes)[0]
+                return (created, telegram_id, activity, f'إضافة منتج إلى السلة: {product[2]}', 'product',
+                        product[0], product[2], json.dumps({'size': size, 'color': color,
+                                                            'quantity': 1, 'category': category[1]}))
+            if activity == 'view_cart':
+                items = rng.randrange(0, 5)
+                return (created, telegram_id, activity, f'عرض السلة ({items} عنصر)', None, None, None,
+                        json.dumps({'cart_items_count': items}))
+            if activity == 'search':
+                query = rng.choice(queries)
+                return (created, telegram_id, activity, f'بحث عن: {query}', None, None, None,
+                        json.dumps({'query': query, 'results_count': rng.randrange(0, 30)}, ensure_ascii=False))
+            return (created, telegram_id, activity, 'تصفح المنتجات', None, None, None, None)
+
+        def rows():
+            fixed_index = 0
+            for day, count in zip(self.days(), daily_counts(browsing)):
+                day_events = [e for e in map(event, day_times(rng, day, count)) if e is not None]
+                day_end = (day + timedelta(days=1)).strftime(TIMESTAMP_FORMAT)
+                while fixed_index < len(fixed) and fixed[fixed_index][0] < day_end:
+                    day_events.append(fixed[fixed_index])
+                    fixed_index += 1
+                day_events.sort(key=lambda e: e[0])
+                for created, telegram_id, *rest in day_events:
+                    user = users[telegram_id]
+                    yield (telegram_id, user[1], user[2], user[3], *rest, created)
+            for created, telegram_id, *rest in fixed[fixed_index:]:
+                user = users[telegram_id]
+                yield (telegram_id, user[1], user[2], user[3], *rest, created)
+
+        return self.insert('''
+            INSERT INTO client_activity_logs (telegram_id, username, first_name, last_name, activity_type,
+                                              activity_description, target_type, target_id, target_name,
+                                              metadata, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', rows())
+
+    def staff_activity(self):
+        rng = self.rng
+        staff = [(1, 'admin', 'مدير النظام')]
+        for i in range(self.volumes['staff_users'] - 1):
+            username = f'staff{i + 1}'
+            full_name = f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}'
+            cursor = self.conn.execute('''
+                INSERT INTO dashboard_users (username, password_hash, role, permissions, full_name, created_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (username, password_hash(rng, 'staff123'), 'user', '{}', full_name,
+                  self.first_day.strftime(TIMESTAMP_FORMAT)))
+            staff.append((cursor.lastrowid, username, full_name))
+        self.conn.commit()
+
+        orders = self.order_rows
+        products = self.product_rows
+        statuses = ('confirmed', 'shipped', 'delivered', 'cancelled')
+
+        def rows():
+            for day, count in zip(self.days(), daily_counts(self.volumes['staff_activity'])):
+                for created in day_times(rng, day, count):
+                    user_id, username, full_name = rng.choice(staff)
+                    action = weighted(rng, STAFF_ACTION_WEIGHTS)
+                    target = (None, None, None, None, None)
+                    if action == 'order_status_update':
+                        order = rng.choice(orders)
+                        target = ('order', order[0], f'Order #{order[0]}', 'pending', rng.choice(statuses))
+                        description = f'تحديث حالة الطلب #{order[0]}'
+                    elif action in ('inventory_update', 'product_update', 'product_add'):
+                        product = rng.choice(products)
+                        old, new = rng.randrange(0, 40), rng.randrange(0, 40)
+                        target = ('product', product[0], product[3], str(old), str(new))
+                        description = {'inventory_update': 'تحديث المخزون', 'product_update': 'تعديل منتج',
+                                       'product_add': 'إضافة منتج'}[action] + f': {product[3]}'
+                    else:
+                        description = 'تسجيل دخول' if action == 'login' else 'تسجيل خروج'
+                    yield (user_id, username, full_name, action, description, *target,
+                           f'192.168.1.{rng.randrange(2, 250)}',
+                           'Mozilla/5.0 (Windows NT 10.0; Win64; x64) Chrome/128.0', created)
+
+        return self.insert('''
+            INSERT INTO staff_activity_logs (user_id, username, full_name, action_type, action_description,
+                                             target_type, target_id, target_name, old_value, new_value,
+                                             ip_address, user_agent, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', rows())
+
+    def finish(self):
+        """Columns production fills as a side effect of other writes, then statistics"""
+        conn = self.conn
+        conn.execute('''
+            UPDATE customers SET username = b.username, first_name = b.first_name,
+                                 last_name = b.last_name, phone = b.phone, created_at = b.created_at
+            FROM bot_users b
+            WHERE b.telegram_id = customers.telegram_id
+        ''')
+        conn.execute('UPDATE customers SET last_active = last_order_date')
+        # The default admin keeps admin123, with a seeded salt
+        conn.execute('UPDATE dashboard_users SET password_hash = ?, created_at = ? WHERE username = ?',
+                     (password_hash(self.rng, 'admin123'), self.first_day.strftime(TIMESTAMP_FORMAT), 'admin'))
+        conn.execute('''
+            UPDATE bot_users SET
+                total_interactions = (SELECT COUNT(*) FROM client_activity_logs l
+                                      WHERE l.telegram_id = bot_users.telegram_id),
+                last_active = COALESCE((SELECT MAX(created_at) FROM client_activity_logs l
+                                        WHERE l.telegram_id = bot_users.telegram_id), last_active)
+        ''')
+        conn.commit()
+        conn.execute('ANALYZE')
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+
+
+def generate(directory: str, scale: float = 1.0, seed: int = 42, end_date: str = None,
+             force: bool = False, overrides: dict = None) -> dict:
+    """Create <directory>/store.db and return a manifest of what was generated.
+
+    database.py opens store.db in the working directory on import, so this
+    changes into directory first; call it before anything imports database.
+    """
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, 'store.db')
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            if not force:
+                raise FileExistsError(f'{path} already exists (use --force to replace it)')
+            os.remove(path + suffix)
+    os.chdir(directory)
+    from config import STATES_AND_REGIONS
+    from database import db  # runs every migration on the new store.db
+
+    end = datetime.strptime(end_date, '%Y-%m-%d') if end_date else datetime.now(timezone.utc).replace(
+        tzinfo=None, hour=0, minute=0, second=0, microsecond=0)
+    volumes = scaled_volumes(scale, overrides)
+    print(f"🏗️ Generating {path} (scale {scale}, seed {seed}, history until {end:%Y-%m-%d})")
+    started = time.perf_counter()
+
+    conn = sqlite3.connect(path, timeout=30.0)
+    conn.execute('PRAGMA synchronous = OFF')
+    try:
+        counts = DatasetGenerator(conn, volumes, seed, end, STATES_AND_REGIONS).generate()
+    finally:
+        conn.close()
+    db.clear_cache()
+
+    manifest = {
+        'path': os.path.abspath(path),
+        'scale': scale,
+        'seed': seed,
+        'end_date': end.strftime('%Y-%m-%d'),
+        'volumes': volumes,
+        'rows': counts,
+        'bytes': os.path.getsize(path),
+        'seconds': round(time.perf_counter() - started, 1),
+    }
+    print(f"✅ Generated {manifest['bytes'] / 1048576:.1f} MB in {manifest['seconds']}s")
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a synthetic store.db')
+    parser.add_argument('--dir', required=True, help='directory for the new store.db')
+    parser.add_argument('--scale', type=float, default=1.0, help='multiplier for BASE_VOLUMES')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--end-date', help='last day of the history, YYYY-MM-DD (default: today, UTC)')
+    parser.add_argument('--force', action='store_true', help='replace an existing store.db')
+    args = parser.parse_args()
+
+    directory = os.path.abspath(args.dir)
+    manifest = generate(directory, args.scale, args.seed, args.end_date, args.force)
+    with open(os.path.join(directory, 'dataset.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    # Let the writer thread and log buffers shut down cleanly
+    from database import db
+    db.close_connections()
+
+
+if __name__ == '__main__':
+    main()
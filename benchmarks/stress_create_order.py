@@ -0,0 +1,91 @@
+# benchmarks/stress_create_order.py - Parallel checkout stress test for Database.create_order
+#
+# Usage: python benchmarks/stress_create_order.py [--checkouts 200] [--stock 50] [--quantity 1] [--writer]
+#
+# Fires N checkouts at one variant from N threads at once and verifies that
+# exactly floor(stock / quantity) succeed, stock never goes negative and the
+# order_items / inventory_history rows match. Exits with status 1 on oversell.
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--checkouts', type=int, default=200)
+    parser.add_argument('--stock', type=int, default=50)
+    parser.add_argument('--quantity', type=int, default=1)
+    parser.add_argument('--writer', action='store_true',
+                        help='submit through the group-commit write queue instead of direct calls')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='stress_orders_')
+    # database.py opens store.db in the working directory on import
+    os.chdir(workdir)
+    from database import Database
+
+    db = Database(os.path.join(workdir, 'stress.db'))
+    product_id = db.add_product('stress', 'Stress Tee', 1000.0)
+    db.add_product_variant(product_id, 'Black', 'M', quantity=args.stock)
+
+    item = {'product_id': product_id, 'name': 'Stress Tee', 'price': 1000.0,
+            'quantity': args.quantity, 'color': 'Black', 'size': 'M'}
+    results = [None] * args.checkouts
+    barrier = threading.Barrier(args.checkouts)
+
+    def checkout(index):
+        order = dict(user_id=100000 + index, user_name=f'Buyer {index}', user_phone='0900000000',
+                     user_address='-', user_state='-', user_region='-', username=f'buyer{index}',
+                     items=[dict(item)], total_amount=item['price'] * item['quantity'])
+        barrier.wait()
+        if args.writer:
+            results[index] = db.queue_write(db.create_order, **order).result()
+        else:
+            results[index] = db.create_order(**order)
+
+    # Keep the per-order prints out of the report
+    stdout, sys.stdout = sys.stdout, open(os.devnull, 'w')
+    started = time.perf_counter()
+    try:
+        threads = [threading.Thread(target=checkout, args=(i,)) for i in range(args.checkouts)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+    elapsed = time.perf_counter() - started
+
+    conn = db.get_connection()
+    remaining = conn.execute('SELECT quantity FROM product_variants WHERE product_id = ?',
+                             (product_id,)).fetchone()[0]
+    sold = conn.execute('SELECT COALESCE(SUM(quantity), 0) FROM order_items WHERE product_id = ?',
+                        (product_id,)).fetchone()[0]
+    history = conn.execute("SELECT COALESCE(-SUM(change_amount), 0) FROM inventory_history "
+                           "WHERE product_id = ? AND change_type = 'sale'", (product_id,)).fetchone()[0]
+
+    succeeded = sum(1 for result in results if result and result['success'])
+    expected = min(args.checkouts, args.stock // args.quantity)
+
+    print(f"checkouts:  {args.checkouts} ({'write queue' if args.writer else 'direct'}), "
+          f"{elapsed * 1000:.0f} ms")
+    print(f"succeeded:  {succeeded} (expected {expected})")
+    print(f"stock left: {remaining} (expected {args.stock - expected * args.quantity})")
+    print(f"sold:       {sold} in order_items, {history} in inventory_history")
+
+    ok = (succeeded == expected and remaining == args.stock - expected * args.quantity
+          and remaining >= 0 and sold == history == expected * args.quantity)
+    print('✅ no oversell' if ok else '❌ OVERSELL / MISMATCH')
+    db.close_connections()
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
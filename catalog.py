@@ -0,0 +1,166 @@
+# catalog.py - Product catalog assembly for Database.get_all_products
+from collections.abc import Mapping
+from typing import Dict, Iterable, List
+
+# Active products joined with their in-stock variants, one row per variant.
+# build_catalog() relies on this column order; {products} narrows the product set.
+_CATALOG_SQL = '''
+    SELECT
+        c.name as category_name,
+        c.arabic_name as category_arabic,
+        p.id as product_id,
+        p.name as product_name,
+        p.arabic_name as product_arabic,
+        p.price,
+        p.description,
+        p.arabic_description,
+        p.model_number,
+        pv.id as variant_id,
+        pv.color,
+        pv.color_arabic,
+        pv.size,
+        pv.size_arabic,
+        pv.quantity,
+        pv.image_path
+    FROM products p
+    JOIN categories c ON p.category_id = c.id
+    JOIN product_variants pv ON p.id = pv.product_id AND pv.quantity > 0
+    WHERE p.is_active = 1{products}
+    ORDER BY c.name, p.id, pv.color, pv.size
+'''
+CATALOG_QUERY = _CATALOG_SQL.format(products='')
+
+
+def catalog_query_for(count: int) -> str:
+    """CATALOG_QUERY for count product ids bound as parameters"""
+    return _CATALOG_SQL.format(products=f" AND p.id IN ({', '.join('?' * count)})")
+
+
+class _Record(Mapping):
+    """Compact record that also behaves like a read/write dict for its fields.
+
+    Templates and bot handlers use product['name'], product.get('variants')
+    and product.copy(); all of that keeps working while each record only
+    stores its __slots__ instead of a per-instance dict.
+    """
+    __slots__ = ()
+    _fields = ()
+
+    def __getitem__(self, key):
+        if key in self._field_set:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key not in self._field_set:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __iter__(self):
+        return iter(self._fields)
+
+    def __len__(self):
+        return len(self._fields)
+
+    def copy(self) -> Dict:
+        """Shallow copy as a plain dict (callers add keys such as 'category')"""
+        return {field: getattr(self, field) for field in self._fields}
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.copy()!r})"
+
+
+class VariantRecord(_Record):
+    __slots__ = ('id', 'color', 'color_arabic', 'size', 'size_arabic', 'quantity', 'image_path')
+    _fields = __slots__
+    _field_set = frozenset(__slots__)
+
+    def __init__(self, id, color, color_arabic, size, size_arabic, quantity, image_path):
+        self.id = id
+        self.color = color
+        self.color_arabic = color_arabic
+        self.size = size
+        self.size_arabic = size_arabic
+        self.quantity = quantity
+        self.image_path = image_path
+
+
+class ProductRecord(_Record):
+    __slots__ = ('id', 'name', 'arabic_name', 'price', 'description', 'arabic_description',
+                 'model_number', 'category_arabic', 'variants')
+    _fields = __slots__
+    _field_set = frozenset(__slots__)
+
+    def __init__(self, id, name, arabic_name, price, description, arabic_description,
+                 model_number, category_arabic, variants):
+        self.id = id
+        self.name = name
+        self.arabic_name = arabic_name
+        self.price = price
+        self.description = description
+        self.arabic_description = arabic_description
+        self.model_number = model_number
+        self.category_arabic = category_arabic
+        self.variants = variants
+
+
+def build_catalog(rows: Iterable, compact: bool = False) -> Dict[str, List]:
+    """Group CATALOG_QUERY rows into {category: [product, ...]} in one pass.
+
+    Products are looked up by id in a dict instead of scanning the category
+    list, and a product (and its category) is only added once it has an
+    in-stock variant, so no cleanup pass is needed afterwards.
+    compact=True returns ProductRecord/VariantRecord objects instead of dicts.
+    """
+    products_by_category = {}
+    products = {}
+
+    for (category, category_arabic, product_id, product_name, product_arabic, price,
+         description, arabic_description, model_number, variant_id, color, color_arabic,
+         size, size_arabic, quantity, image_path) in rows:
+
+        # ✅ Only variants with quantity > 0 are listed
+        if not variant_id or not quantity or quantity <= 0:
+            continue
+
+        if compact:
+            variant = VariantRecord(variant_id, color, color_arabic, size, size_arabic,
+                                    quantity, image_path)
+        else:
+            variant = {
+                'id': variant_id,
+                'color': color,
+                'color_arabic': color_arabic,
+                'size': size,
+                'size_arabic': size_arabic,
+                'quantity': quantity,
+                'image_path': image_path
+            }
+
+        product = products.get(product_id)
+        if product is None:
+            if compact:
+                product = ProductRecord(product_id, product_name, product_arabic, price,
+                                        description or '', arabic_description or '',
+                                        model_number or '', category_arabic, [])
+            else:
+                product = {
+                    'id': product_id,
+                    'name': product_name,
+                    'arabic_name': product_arabic,
+                    'price': price,
+                    'description': description or '',
+                    'arabic_description': arabic_description or '',
+                    'model_number': model_number or '',
+                    'category_arabic': category_arabic,
+                    'variants': []
+                }
+            products[product_id] = product
+            category_products = products_by_category.get(category)
+            if category_products is None:
+                category_products = products_by_category[category] = []
+            category_products.append(product)
+
+        product['variants'].append(variant)
+
+    return products_by_category
@@ -19,13 +19,16 @@ def accounting_page():
         start_date = request.args.get('start_date', datetime.now().replace(day=1).strftime('%Y-%m-%d'))
         end_date = request.args.get('end_date', datetime.now().strftime('%Y-%m-%d'))
         
-        # Get delivered orders for the date range
-        delivered_orders = db.get_delivered_orders_by_date_range(start_date, end_date)
-        total_revenue = db.get_delivered_revenue_by_date_range(start_date, end_date)
-        
-        # Calculate additional stats
-        total_orders = len(delivered_orders)
-        average_order_value = total_revenue / total_orders if total_orders > 0 else 0
+        # List and totals both read the report snapshot, so they agree
+        with db.snapshot_reads():
+            # Get delivered orders for the date range
+            delivered_orders = db.get_delivered_orders_by_date_range(start_date, end_date)
+            
+            # Totals come from the daily sales rollup
+            summary = db.get_sales_summary(start_date, end_date, ['delivered'])
+        total_revenue = summary['total_revenue']
+        total_orders = summary['total_orders']
+        average_order_value = summary['average_order_value'] or 0
         
         # Get accessible sidebar items
         sidebar_items = get_accessible_sidebar_items()
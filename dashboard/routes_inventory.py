@@ -247,53 +247,30 @@ def bulk_update_inventory():
         operation = request.form.get('operation', 'set')
         value = int(request.form.get('value', 0))
         
-        updated_count = 0
-        
+        # Format: "product_id:color:size"
+        ops = []
         for product_str in selected_products:
-            try:
-                # Format: "product_id:color:size"
-                parts = product_str.split(':')
-                if len(parts) == 3:
-                    product_id = int(parts[0])
-                    color = parts[1]
-                    size = parts[2]
-                    
-                    # Get current quantity
-                    product = db.get_product_by_id(product_id)
-                    if product:
-                        for variant in product.get('variants', []):
-                            if variant['color'] == color and variant['size'] == size:
-                                current_quantity = variant['quantity']
-                                
-                                if operation == 'set':
-                                    new_quantity = value
-                                elif operation == 'add':
-                                    new_quantity = current_quantity + value
-                                elif operation == 'subtract':
-                                    new_quantity = max(0, current_quantity - value)
-                                else:
-                                    new_quantity = current_quantity
-                                
-                                # Update in database
-                                product_name = product.get('name', 'Unknown')
-                                if db.update_variant_quantity(product_id, color, size, new_quantity, reason=f"Bulk {operation} by {session.get('username', 'unknown')}"):
-                                    # ✅ ENHANCED: Log bulk inventory update
-                                    db.log_staff_activity(
-                                        user_id=session.get('user_id'),
-                                        action_type='inventory_bulk_update',
-                                        action_description=f'تحديث جماعي للمخزون: {product_name} ({color}, {size}) - العملية: {operation} - من {current_quantity} إلى {new_quantity}',
-                                        target_type='product_variant',
-                                        target_id=product_id,
-                                        target_name=f"{product_name} - {color} - {size}",
-                                        old_value=f"Quantity: {current_quantity}, Operation: {operation}",
-                                        new_value=f"Quantity: {new_quantity}, Value: {value}",
-                                        ip_address=request.remote_addr,
-                                        user_agent=request.headers.get('User-Agent', '')
-                                    )
-                                    updated_count += 1
-            except Exception as e:
-                print(f"❌ Error updating product {product_str}: {e}")
-                continue
+            parts = product_str.split(':')
+            if len(parts) == 3 and parts[0].isdigit():
+                ops.append({
+                    'product_id': int(parts[0]),
+                    'color': parts[1],
+                    'size': parts[2],
+                    'operation': operation,
+                    'value': value
+                })
+            else:
+                print(f"❌ Error updating product {product_str}: invalid variant key")
+        
+        # ✅ One transaction for all variants, history and staff log rows
+        result = db.bulk_adjust_stock(
+            ops,
+            reason=f"Bulk {operation} by {session.get('username', 'unknown')}",
+            staff_user_id=session.get('user_id'),
+            ip_address=request.remote_addr,
+            user_agent=request.headers.get('User-Agent', '')
+        )
+        updated_count = result['updated_count']
         
         flash(f'تم تحديث {updated_count} منتج بنجاح', 'success')
         
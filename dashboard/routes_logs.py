@@ -100,11 +100,11 @@ def client_logs_page():
         # Get statistics
         stats = db.get_client_activity_stats(days=30)
         
-        # ✅ NEW: Get client interests if a specific client is selected
+        # ✅ NEW: Get client interests (all-time counters) if a specific client is selected
         client_interests = None
         if telegram_id:
             try:
-                client_interests = db.get_client_interests(telegram_id, days=90)
+                client_interests = db.get_client_interests(telegram_id)
             except Exception as e:
                 print(f"⚠️ Error getting client interests: {e}")
                 client_interests = None
@@ -284,4 +284,34 @@ def api_get_client_logs():
         
         return jsonify({"success": True, "logs": logs})
     except Exception as e:
-        return jsonify({"success": False, "error": str(e)}), 500
\ No newline at end of file
+        return jsonify({"success": False, "error": str(e)}), 500
+@dashboard_bp.route('/api/logs/archive', methods=['POST'])
+@login_required
+@admin_required
+def api_archive_logs():
+    """Move old activity logs to the monthly archive and compact expired months"""
+    try:
+        result = db.archive_activity_logs()
+        return jsonify({"success": True, **result, "archive": db.get_activity_archive_stats()})
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@dashboard_bp.route('/api/client-interests/top')
+@login_required
+@admin_required
+def api_top_client_interests():
+    """Most common client interests (colors, sizes, products, ...) across all clients"""
+    try:
+        dimension = request.args.get('dimension', 'cart_product')
+        limit = request.args.get('limit', 10, type=int)
+        return jsonify({"success": True, "dimension": dimension,
+                        "interests": db.get_top_interests(dimension, limit)})
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@dashboard_bp.route('/api/client-interests/rebuild', methods=['POST'])
+@login_required
+@admin_required
+def api_rebuild_client_profiles():
+    count = db.rebuild_client_profiles()
+    return jsonify({"success": True, "profiles": count})
@@ -5,7 +5,7 @@ from . import dashboard_bp
 from .utils import (
     login_required, admin_required, permission_required, 
     get_accessible_sidebar_items, has_permission, ARABIC_TEXTS,
-    load_products, load_orders, safe_get, get_inventory_analytics,
+    load_products, get_inventory_analytics,
     generate_stock_alerts, get_user_permissions
 )
 from database import db
@@ -15,22 +15,9 @@ from database import db
 @login_required
 def index():
     products_data = load_products()
-    orders_data = load_orders()
-    
-    orders_list = orders_data.get('orders', [])
-    if not isinstance(orders_list, list):
-        orders_list = []
     
     # Calculate stats (still needed for the stats cards)
-    total_orders = len(orders_list)
-    pending_orders = len([o for o in orders_list if str(safe_get(o, 'status', '')).lower() in ['معلق', 'pending']])
-    completed_orders = len([o for o in orders_list if str(safe_get(o, 'status', '')).lower() in ['مكتمل', 'completed', 'delivered', 'تم التوصيل', 'تم الشحن', 'shipped']])
-    
-    total_revenue = 0
-    for order in orders_list:
-        order_status = str(safe_get(order, 'status', '')).lower()
-        if order_status in ['مكتمل', 'completed', 'delivered', 'تم التوصيل', 'تم الشحن', 'shipped']:
-            total_revenue += float(safe_get(order, 'total_amount', 0))
+    order_stats = db.get_order_stats()
     
     # Inventory stats - UPDATED: Include new analytics
     inventory_analytics = get_inventory_analytics()
@@ -49,10 +36,10 @@ def index():
                          categories=products_data.get('categories', []),
                          # ✅ REMOVED: orders parameter - no longer passing orders to template
                          stats={
-                             'total_orders': total_orders,
-                             'pending_orders': pending_orders,
-                             'completed_orders': completed_orders,
-                             'total_revenue': total_revenue,
+                             'total_orders': order_stats['total_orders'],
+                             'pending_orders': order_stats['pending_orders'],
+                             'completed_orders': order_stats['completed_orders'],
+                             'total_revenue': order_stats['total_revenue'],
                              'total_products': inventory_analytics['total_products'],
                              'total_variants': inventory_analytics['total_variants'],
                              'low_stock_items': inventory_analytics['low_stock_items'],
@@ -177,4 +164,59 @@ def change_password():
 # Health check route
 @dashboard_bp.route('/health')
 def health_check():
-    return jsonify({"status": "healthy", "timestamp": datetime.now().isoformat()})
\ No newline at end of file
+    return jsonify({"status": "healthy", "timestamp": datetime.now().isoformat()})
+
+# Database connection pool statistics
+@dashboard_bp.route('/api/db/pool-stats')
+@login_required
+@admin_required
+def db_pool_stats():
+    return jsonify(db.get_pool_stats())
+
+# Read cache statistics (hits/misses per namespace)
+@dashboard_bp.route('/api/db/cache-stats')
+@login_required
+@admin_required
+def db_cache_stats():
+    return jsonify(db.get_cache_stats())
+
+# Write queue / group commit statistics
+@dashboard_bp.route('/api/db/writer-stats')
+@login_required
+@admin_required
+def db_writer_stats():
+    return jsonify(db.get_writer_stats())
+
+# Report snapshot statistics (age, refreshes)
+@dashboard_bp.route('/api/db/snapshot-stats')
+@login_required
+@admin_required
+def db_snapshot_stats():
+    return jsonify(db.get_snapshot_stats())
+
+# Online backups (db_backup): start one in the background, list them
+@dashboard_bp.route('/api/db/backup', methods=['POST'])
+@login_required
+@admin_required
+def db_backup():
+    try:
+        started = db.backup_database(background=True)
+        if not started:
+            return jsonify({"success": False, "error": "A backup is already running"}), 409
+        return jsonify({"success": True, "message": "Backup started"}), 202
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@dashboard_bp.route('/api/db/backups')
+@login_required
+@admin_required
+def db_backups():
+    return jsonify(db.get_backup_stats())
+
+# Per-method / per-statement timings and the slow-query log (db_metrics)
+@dashboard_bp.route('/api/db/query-stats')
+@login_required
+@admin_required
+def db_query_stats():
+    limit = request.args.get('limit', 20, type=int)
+    return jsonify(db.get_query_stats(limit))
@@ -11,22 +11,43 @@ from .utils import (
 )
 from database import db
 
+# Orders shown per page on the All Orders page
+ORDERS_PAGE_SIZE = 50
+
 # ✅ UPDATED: All orders route to pass permissions
 @dashboard_bp.route('/all-orders')
 @login_required
 @permission_required('view_orders')
 def all_orders_page():
-    orders_data = load_orders()
-    orders_list = orders_data.get('orders', [])
-    
     # Filter orders by all criteria
     status_filter = request.args.get('status', 'all')
     state_filter = request.args.get('state', 'all')
     region_filter = request.args.get('region', 'all')
     order_number_filter = request.args.get('order_number', '')  # ✅ NEW: Order number filter
+    cursor = request.args.get('cursor', type=int)
+    direction = 'newer' if request.args.get('direction') == 'newer' else 'older'
+    
+    filters = {
+        'status': status_filter,
+        'state': state_filter,
+        'region': region_filter,
+        'start_date': request.args.get('start_date', ''),
+        'end_date': request.args.get('end_date', '')
+    }
     
-    safe_orders = []
-    for order in orders_list:  # This now shows newest orders first
+    # Apply order number filter
+    if order_number_filter:
+        try:
+            filters['order_id'] = int(order_number_filter)
+        except ValueError:
+            # If order number is not valid, show no results
+            filters['order_id'] = 0
+    
+    # ✅ Filtering, pagination and stats run in SQL - only the current page is loaded
+    page = db.query_orders(filters, cursor=cursor, limit=ORDERS_PAGE_SIZE, direction=direction)
+    
+    filtered_orders = []
+    for order in page['orders']:  # This now shows newest orders first
         safe_order = {
             'id': safe_get(order, 'id', 0),
             'user_name': safe_get(order, 'user_name', 'غير معروف'),
@@ -39,41 +60,15 @@ def all_orders_page():
             'total_amount': safe_get(order, 'total_amount', 0),
             'items': safe_get(order, 'items', [])
         }
-        safe_orders.append(safe_order)
-    
-    # ✅ ENHANCED: Apply all filters
-    filtered_orders = safe_orders
-    
-    # Apply order number filter
-    if order_number_filter:
-        try:
-            order_id = int(order_number_filter)
-            filtered_orders = [order for order in filtered_orders if order['id'] == order_id]
-        except ValueError:
-            # If order number is not valid, show no results
-            filtered_orders = []
-    
-    # Apply status filter
-    if status_filter != 'all':
-        filtered_orders = [order for order in filtered_orders if order['status'].lower() == status_filter.lower()]
-    
-    # Apply state filter
-    if state_filter != 'all':
-        filtered_orders = [order for order in filtered_orders if order['user_state'] and order['user_state'].lower() == state_filter.lower()]
-    
-    # Apply region filter
-    if region_filter != 'all':
-        filtered_orders = [order for order in filtered_orders if order['user_region'] and order['user_region'].lower() == region_filter.lower()]
-    
-    # Calculate stats for all orders page
-    total_orders = len(filtered_orders)
-    pending_orders = len([o for o in filtered_orders if str(o.get('status', '')).lower() in ['معلق', 'pending']])
-    completed_orders = len([o for o in filtered_orders if str(o.get('status', '')).lower() in ['مكتمل', 'completed', 'delivered', 'تم التوصيل', 'تم الشحن', 'shipped']])
-    total_revenue = sum(order['total_amount'] for order in filtered_orders)
+        filtered_orders.append(safe_order)
     
     # Get unique states and regions for filters
-    states = sorted(list(set([order['user_state'] for order in safe_orders if order['user_state']])))
-    regions = sorted(list(set([order['user_region'] for order in safe_orders if order['user_region']])))
+    locations = db.get_order_locations()
+    states = locations['states']
+    regions = locations['regions']
+    
+    # Query args for the pagination links (everything except the cursor)
+    pagination_args = {key: value for key, value in request.args.items() if key not in ('cursor', 'direction')}
     
     # Get accessible sidebar items
     sidebar_items = get_accessible_sidebar_items()
@@ -83,12 +78,10 @@ def all_orders_page():
     
     return render_template('all_orders.html', 
                          orders=filtered_orders, 
-                         stats={
-                             'total_orders': total_orders,
-                             'pending_orders': pending_orders,
-                             'completed_orders': completed_orders,
-                             'total_revenue': total_revenue
-                         },
+                         stats=page['stats'],
+                         next_cursor=page['next_cursor'],
+                         prev_cursor=page['prev_cursor'],
+                         pagination_args=pagination_args,
                          current_filter=status_filter,
                          current_state=state_filter,
                          current_region=region_filter,
@@ -564,22 +557,10 @@ def api_orders():
 @dashboard_bp.route('/api/stats')
 @login_required
 def api_stats():
-    orders_data = load_orders()
     products_data = load_products()
     
-    orders_list = orders_data.get('orders', [])
-    
-    total_revenue = 0
-    for order in orders_list:
-        order_status = str(safe_get(order, 'status', '')).lower()
-        if order_status in ['مكتمل', 'completed', 'delivered', 'تم التوصيل', 'تم الشحن', 'shipped']:
-            total_revenue += float(safe_get(order, 'total_amount', 0))
-    
     stats = {
-        "total_orders": len(orders_list),
-        "pending_orders": len([o for o in orders_list if str(safe_get(o, 'status', '')).lower() in ['معلق', 'pending']]),
-        "completed_orders": len([o for o in orders_list if str(safe_get(o, 'status', '')).lower() in ['مكتمل', 'completed', 'delivered', 'تم التوصيل', 'تم الشحن', 'shipped']]),
-        "total_revenue": total_revenue,
+        **db.get_order_stats(),
         "total_products": sum(len(products) for products in products_data.get('products', {}).values()),
         "total_categories": len(products_data.get('categories', []))
     }
@@ -591,7 +572,9 @@ def api_stats():
 @permission_required('view_orders')
 def export_orders():
     try:
-        orders_data = load_orders()
+        # ✅ Full-table export reads the report snapshot, not the live database
+        with db.snapshot_reads():
+            orders_data = load_orders()
         orders_list = orders_data.get('orders', [])
         
         # Create DataFrame for export
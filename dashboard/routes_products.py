@@ -13,6 +13,10 @@ from .utils import (
     allowed_file
 )
 from database import db
+from pricing import DEFAULT_ROUNDING, PRICE_OPERATIONS, PRICE_ROUNDING
+
+# Ranked matches shown by the product search page
+SEARCH_RESULTS_LIMIT = 100
 
 @dashboard_bp.route('/products')
 @login_required
@@ -127,15 +131,21 @@ def get_products_by_category(category):
 @login_required
 @permission_required('manage_products')
 def update_bulk_prices():
-    """API endpoint to update prices in bulk"""
+    """API endpoint to update prices in bulk
+    
+    Send "preview": true for a dry run. Applied batches can be undone with
+    /api/revert_bulk_prices using the returned batch_id.
+    """
     try:
         data = request.get_json()
         product_ids = data.get('product_ids', [])
         operation = data.get('operation')
         value = data.get('value', 0)
         currency_rate = data.get('currency_rate', 1)
+        rounding = data.get('rounding', DEFAULT_ROUNDING)
+        preview = bool(data.get('preview', False))
         
-        print(f"🔄 Bulk price update: {len(product_ids)} products, operation: {operation}, value: {value}")
+        print(f"🔄 Bulk price update: {len(product_ids)} products, operation: {operation}, value: {value}, preview: {preview}")
         
         if not product_ids:
             return jsonify({
@@ -143,54 +153,49 @@ def update_bulk_prices():
                 'message': 'لم يتم اختيار أي منتجات'
             })
         
-        success_count = 0
-        errors = []
+        if operation not in PRICE_OPERATIONS or rounding not in PRICE_ROUNDING:
+            return jsonify({
+                'success': False,
+                'message': 'عملية تسعير غير صالحة'
+            })
         
-        for product_id in product_ids:
-            try:
-                # Get current product
-                product = db.get_product_by_id(product_id)
-                if not product:
-                    errors.append(f"المنتج {product_id} غير موجود")
-                    continue
-                
-                current_price = product['price']
-                new_price = current_price
-                
-                # Calculate new price based on operation
-                if operation == 'percentage_increase':
-                    new_price = current_price * (1 + value/100)
-                elif operation == 'percentage_decrease':
-                    new_price = current_price * (1 - value/100)
-                elif operation == 'set':
-                    new_price = value
-                elif operation == 'currency_conversion':
-                    new_price = current_price * currency_rate
-                
-                # Round to 2 decimal places
-                new_price = round(new_price, 2)
-                
-                # Update product price in database
-                success = db.update_product_price(product_id, new_price)
-                if success:
-                    success_count += 1
-                    print(f"✅ Updated product {product_id}: {current_price} → {new_price}")
-                else:
-                    errors.append(f"فشل في تحديث سعر المنتج {product_id}")
-                    
-            except Exception as e:
-                errors.append(f"خطأ في المنتج {product_id}: {str(e)}")
-                print(f"❌ Error updating product {product_id}: {e}")
+        if preview:
+            changes = db.preview_bulk_prices(product_ids, operation, value, currency_rate, rounding)
+            return jsonify({
+                'success': True,
+                'preview': True,
+                'changes': changes,
+                'count': len(changes)
+            })
         
-        message = f"تم تحديث أسعار {success_count} منتج بنجاح"
-        if errors:
-            message += f" مع {len(errors)} أخطاء"
+        result = db.apply_bulk_prices(product_ids, operation, value, currency_rate, rounding,
+                                      user_id=session.get('user_id'))
+        if not result['success']:
+            return jsonify({
+                'success': False,
+                'message': f"حدث خطأ في تحديث الأسعار: {result.get('message', '')}"
+            })
+        
+        db.log_staff_activity(
+            user_id=session.get('user_id'),
+            action_type='bulk_price_update',
+            action_description=f"تحديث أسعار {result['updated_count']} منتج ({operation}: {value})",
+            target_type='price_batch',
+            target_id=result['batch_id'],
+            ip_address=request.remote_addr,
+            user_agent=request.headers.get('User-Agent', '')
+        )
+        
+        message = f"تم تحديث أسعار {result['updated_count']} منتج بنجاح"
+        if result['missing_count']:
+            message += f" ({result['missing_count']} منتج غير موجود)"
         
         return jsonify({
             'success': True,
             'message': message,
-            'updated_count': success_count,
-            'errors': errors
+            'updated_count': result['updated_count'],
+            'batch_id': result['batch_id'],
+            'errors': []
         })
         
     except Exception as e:
@@ -200,6 +205,62 @@ def update_bulk_prices():
             'message': f'حدث خطأ في تحديث الأسعار: {str(e)}'
         })
 
+@dashboard_bp.route('/api/revert_bulk_prices', methods=['POST'])
+@login_required
+@permission_required('manage_products')
+def revert_bulk_prices():
+    """API endpoint to undo a bulk price batch"""
+    try:
+        data = request.get_json()
+        batch_id = data.get('batch_id')
+        if not batch_id:
+            return jsonify({
+                'success': False,
+                'message': 'لم يتم تحديد دفعة الأسعار'
+            })
+        
+        result = db.revert_price_batch(int(batch_id))
+        if not result['success']:
+            return jsonify(result)
+        
+        db.log_staff_activity(
+            user_id=session.get('user_id'),
+            action_type='bulk_price_revert',
+            action_description=f"التراجع عن تحديث الأسعار رقم {batch_id} ({result['reverted_count']} منتج)",
+            target_type='price_batch',
+            target_id=int(batch_id),
+            ip_address=request.remote_addr,
+            user_agent=request.headers.get('User-Agent', '')
+        )
+        
+        message = f"تمت استعادة أسعار {result['reverted_count']} منتج"
+        if result['skipped_count']:
+            message += f" (تم تخطي {result['skipped_count']} منتج تغير سعره لاحقاً)"
+        
+        return jsonify({
+            'success': True,
+            'message': message,
+            'reverted_count': result['reverted_count'],
+            'skipped_count': result['skipped_count']
+        })
+        
+    except Exception as e:
+        print(f"❌ Error reverting bulk prices: {e}")
+        return jsonify({
+            'success': False,
+            'message': f'حدث خطأ في التراجع عن الأسعار: {str(e)}'
+        })
+
+@dashboard_bp.route('/api/price_batches')
+@login_required
+@permission_required('manage_products')
+def price_batches():
+    """API endpoint listing recent bulk price batches"""
+    return jsonify({
+        'success': True,
+        'batches': db.get_price_change_batches(limit=request.args.get('limit', 20, type=int))
+    })
+
 # ✅ UPDATED: Add product route - Only for users with manage_products permission
 @dashboard_bp.route('/add-product')
 @login_required
@@ -248,6 +309,7 @@ def add_product_route():
         # Add variants - FIXED IMAGE PATH HANDLING
         variant_count = int(request.form.get('variant_count', 0))
         variants_added = 0
+        variant_rows = []
         
         for i in range(variant_count):
             color = request.form.get(f'color_{i}', '').strip()
@@ -293,12 +355,14 @@ def add_product_route():
                 except ValueError:
                     quantity = 0
                 
-                # Add variant to database with ONE IMAGE PER COLOR
-                variant_id = db.add_product_variant(product_id, color, size, quantity, image_path=image_path)
-                
-                if variant_id:
-                    variants_added += 1
-                    print(f"✅ Added variant: {color} - {size} - Qty: {quantity} - Image: {image_path}")
+                # ONE IMAGE PER COLOR
+                variant_rows.append({'color': color, 'size': size, 'quantity': quantity, 'image_path': image_path})
+        
+        # ✅ Write the whole variant matrix in one transaction
+        if variant_rows:
+            result = db.upsert_variants(product_id, variant_rows)
+            if result['success']:
+                variants_added = result['inserted']
         
         if variants_added > 0:
             # ✅ NEW: Log staff activity
@@ -393,22 +457,13 @@ def update_product_route():
         variant_count = int(request.form.get('variant_count', 0))
         print(f"🔄 Processing {variant_count} variants")
         
-        # Get current product data to preserve existing images
+        # Get current product data for the change log
         current_product = db.get_product_by_id(product_id)
         existing_variants = current_product.get('variants', [])
         
-        # Create a mapping of existing images by color
-        existing_images = {}
-        for variant in existing_variants:
-            if variant.get('image_path') and variant['image_path'] not in ['None', 'null', '']:
-                existing_images[variant['color']] = variant['image_path']
-        
-        # Delete all existing variants first
-        for variant in existing_variants:
-            db.delete_product_variant(product_id, variant['color'], variant['size'])
-        
-        # Add new variants - PRESERVE EXISTING IMAGES IF NO NEW IMAGE UPLOADED
+        # Collect the submitted variant matrix - EXISTING IMAGES ARE KEPT IF NO NEW IMAGE UPLOADED
         variants_added = 0
+        variant_rows = []
         for i in range(variant_count):
             color = request.form.get(f'color_{i}', '').strip()
             
@@ -420,7 +475,6 @@ def update_product_route():
             image_files = request.files.getlist(f'variant_images_{i}')
             
             # Check if new image was uploaded
-            new_image_uploaded = False
             for image_file in image_files:
                 if image_file and allowed_file(image_file.filename):
                     try:
@@ -444,17 +498,11 @@ def update_product_route():
                         # Store relative path for web access
                         image_path = f"{safe_category}/{safe_product}/{safe_color}/{filename}"
                         print(f"🖼️ Saved NEW image to: {image_path}")
-                        new_image_uploaded = True
                         break  # Only save one image per color
                     except Exception as e:
                         print(f"❌ Error saving new image: {e}")
                         continue
             
-            # If no new image uploaded, use existing image for this color
-            if not new_image_uploaded and color in existing_images:
-                image_path = existing_images[color]
-                print(f"🖼️ Preserving existing image for {color}: {image_path}")
-            
             # Add all sizes for this color
             for j, size in enumerate(['S', 'M', 'L', 'XL', 'XXL', 'XXXL']):
                 quantity_str = request.form.get(f'quantity_{i}_{j}', '0')
@@ -464,12 +512,14 @@ def update_product_route():
                 except ValueError:
                     quantity = 0
                 
-                # Add variant to database with preserved or new image
-                variant_id = db.add_product_variant(product_id, color, size, quantity, image_path=image_path)
-                
-                if variant_id:
-                    variants_added += 1
-                    print(f"✅ Added variant: {color} - {size} - Qty: {quantity} - Image: {image_path}")
+                # image_path None keeps the image already stored for this variant
+                variant_rows.append({'color': color, 'size': size, 'quantity': quantity, 'image_path': image_path})
+        
+        # ✅ Diff against the stored variants: only changed cells are written,
+        # so variant ids, inventory history and images survive the edit
+        result = db.upsert_variants(product_id, variant_rows, remove_missing=True)
+        if result['success']:
+            variants_added = sum(1 for row in variant_rows if row['quantity'] > 0)
         
         # ✅ ENHANCED: Log staff activity with detailed field changes
         if success:
@@ -640,23 +690,30 @@ def search_products():
         query = request.args.get('q', '').strip()
         category_filter = request.args.get('category', 'all')
         
-        products_data = load_products()
+        category = None if category_filter == 'all' else category_filter
         filtered_products = {}
         
-        for category, products in products_data.get('products', {}).items():
-            if category_filter != 'all' and category != category_filter:
-                continue
-                
-            category_products = []
-            for product in products:
-                # Search in product name, description, and model number
-                if (query.lower() in product.get('name', '').lower() or 
-                    query.lower() in product.get('description', '').lower() or 
-                    query.lower() in product.get('model_number', '').lower()):
-                    category_products.append(product)
-            
-            if category_products:
-                filtered_products[category] = category_products
+        if query:
+            # ✅ Ranked matches from the products_fts index, shown in rank order;
+            # only the matched products are loaded, not the whole catalog
+            ranked = db.search_products(query, category, limit=SEARCH_RESULTS_LIMIT)
+            matched = db.get_products_by_ids([match['id'] for match in ranked])
+            by_id = {
+                product['id']: (category_name, product)
+                for category_name, products in matched.items()
+                for product in products
+            }
+            for match in ranked:
+                if match['id'] in by_id:
+                    category_name, product = by_id[match['id']]
+                    filtered_products.setdefault(category_name, []).append(product)
+            categories = [row['name'] for row in db.get_categories()]
+        else:
+            products_data = load_products()
+            for category_name, products in products_data.get('products', {}).items():
+                if category is None or category_name == category:
+                    filtered_products[category_name] = products
+            categories = products_data.get('categories', [])
         
         # Get accessible sidebar items
         sidebar_items = get_accessible_sidebar_items()
@@ -666,7 +723,7 @@ def search_products():
         
         return render_template('products.html', 
                              products=filtered_products,
-                             categories=products_data.get('categories', []),
+                             categories=categories,
                              search_query=query,
                              selected_category=category_filter,
                              sidebar_items=sidebar_items,
@@ -5,7 +5,7 @@ import pandas as pd
 from datetime import datetime
 from . import dashboard_bp
 from .utils import (
-    login_required, permission_required, get_accessible_sidebar_items, 
+    login_required, permission_required, admin_required, get_accessible_sidebar_items, 
     ARABIC_TEXTS, get_sales_analytics, get_inventory_analytics
 )
 from database import db
@@ -48,6 +48,14 @@ def reports_page():
         flash('حدث خطأ في تحميل التقارير', 'error')
         return redirect(url_for('dashboard.index'))
 
+# Recompute the daily sales rollup from the order history
+@dashboard_bp.route('/api/reports/rebuild-sales-daily', methods=['POST'])
+@login_required
+@admin_required
+def rebuild_sales_daily():
+    rows = db.rebuild_sales_daily()
+    return jsonify({"success": True, "rows": rows})
+
 @dashboard_bp.route('/export/product_reports/excel')
 @login_required
 @permission_required('view_reports')
@@ -148,6 +148,34 @@ def api_delete_user():
         print(f"❌ Error deleting user: {e}")
         return jsonify({"success": False, "message": f"حدث خطأ: {str(e)}"})
 
+# Customers shown per page on the customers page
+CUSTOMERS_PAGE_SIZE = 50
+
+def _parse_customer_cursor(value):
+    """Parse a 'total_spent:telegram_id' page cursor, None if missing or invalid"""
+    try:
+        spent, telegram_id = value.rsplit(':', 1)
+        return (float(spent), int(telegram_id))
+    except (AttributeError, ValueError):
+        return None
+
+def _format_customer_cursor(cursor):
+    return f"{cursor[0]}:{cursor[1]}" if cursor else None
+
+def _customer_row(customer):
+    """Customer dict with display defaults for the customers page"""
+    return {
+        'telegram_id': customer['telegram_id'],
+        'username': customer.get('username') or 'غير متوفر',
+        'first_name': customer.get('first_name') or '',
+        'last_name': customer.get('last_name') or '',
+        'phone': customer.get('phone') or 'غير متوفر',
+        'total_orders': customer.get('total_orders') or 0,
+        'total_spent': customer.get('total_spent') or 0,
+        'last_order_date': customer.get('last_order_date') or 'لا توجد طلبات',
+        'created_at': customer.get('created_at', '')
+    }
+
 # Customer Management Routes
 @dashboard_bp.route('/customers')
 @login_required
@@ -155,32 +183,19 @@ def api_delete_user():
 def customers_page():
     """Customer management dashboard"""
     try:
-        # Get all customers and their order history
-        customers = db.get_all_customers()
-        orders = db.get_orders()
+        cursor = _parse_customer_cursor(request.args.get('cursor'))
+        direction = 'prev' if request.args.get('direction') == 'prev' else 'next'
         
-        # Enhance customer data with order information
-        enhanced_customers = []
-        for customer in customers:
-            customer_orders = [order for order in orders if order.get('user_id') == customer['telegram_id']]
-            total_orders = len(customer_orders)
-            total_spent = sum(order.get('total_amount', 0) for order in customer_orders)
-            last_order_date = max([order.get('order_date', '') for order in customer_orders]) if customer_orders else 'لا توجد طلبات'
-            
-            enhanced_customers.append({
-                'telegram_id': customer['telegram_id'],
-                'username': customer.get('username', 'غير متوفر'),
-                'first_name': customer.get('first_name', ''),
-                'last_name': customer.get('last_name', ''),
-                'phone': customer.get('phone', 'غير متوفر'),
-                'total_orders': total_orders,
-                'total_spent': total_spent,
-                'last_order_date': last_order_date,
-                'created_at': customer.get('created_at', '')
-            })
+        # ✅ Order totals are stored on the customers row - only the current page is loaded
+        page = db.query_customers(cursor=cursor, limit=CUSTOMERS_PAGE_SIZE, direction=direction)
+        
+        enhanced_customers = [_customer_row(customer) for customer in page['customers']]
         
-        # Sort by total spent (descending)
-        enhanced_customers.sort(key=lambda x: x['total_spent'], reverse=True)
+        # Top spenders for the side panel, independent of the current page
+        if cursor is None:
+            top_customers = enhanced_customers[:5]
+        else:
+            top_customers = [_customer_row(customer) for customer in db.query_customers(limit=5)['customers']]
         
         # Get accessible sidebar items
         sidebar_items = get_accessible_sidebar_items()
@@ -190,6 +205,10 @@ def customers_page():
         
         return render_template('customers.html',
                              customers=enhanced_customers,
+                             top_customers=top_customers,
+                             stats=page['stats'],
+                             next_cursor=_format_customer_cursor(page['next_cursor']),
+                             prev_cursor=_format_customer_cursor(page['prev_cursor']),
                              sidebar_items=sidebar_items,
                              user_role=session.get('role'),
                              user_permissions=user_permissions,  # ✅ ADD THIS
@@ -201,6 +220,14 @@ def customers_page():
         flash('حدث خطأ في تحميل بيانات العملاء', 'error')
         return redirect(url_for('dashboard.index'))
 
+# Recompute the stored customer order totals from the orders table
+@dashboard_bp.route('/api/customers/rebuild-aggregates', methods=['POST'])
+@login_required
+@admin_required
+def rebuild_customer_aggregates():
+    updated = db.rebuild_customer_aggregates()
+    return jsonify({"success": True, "updated": updated})
+
 @dashboard_bp.route('/export/customers/excel')
 @login_required
 @admin_required
@@ -208,23 +235,18 @@ def export_customers_excel():
     """Export customers to Excel - UPDATED TO INCLUDE PHONE NUMBERS"""
     try:
         customers = db.get_all_customers()
-        orders = db.get_orders()
         
         # Prepare data for export - INCLUDING PHONE NUMBERS
         data = []
         for customer in customers:
-            customer_orders = [order for order in orders if order.get('user_id') == customer['telegram_id']]
-            total_orders = len(customer_orders)
-            total_spent = sum(order.get('total_amount', 0) for order in customer_orders)
-            
             data.append({
                 'معرف التليجرام': customer['telegram_id'],
                 'اسم المستخدم': customer.get('username', 'غير متوفر'),
                 'الاسم الأول': customer.get('first_name', ''),
                 'الاسم الأخير': customer.get('last_name', ''),
                 'رقم الهاتف': customer.get('phone', 'غير متوفر'),  # ✅ ADDED PHONE NUMBER
-                'إجمالي الطلبات': total_orders,
-                'إجمالي الإنفاق': total_spent,
+                'إجمالي الطلبات': customer.get('total_orders') or 0,
+                'إجمالي الإنفاق': customer.get('total_spent') or 0,
                 'تاريخ التسجيل': customer.get('created_at', '')
             })
         
@@ -265,7 +287,6 @@ def export_customers_csv():
     """Export customers to CSV - UPDATED TO INCLUDE PHONE NUMBERS"""
     try:
         customers = db.get_all_customers()
-        orders = db.get_orders()
         
         # Create CSV in memory
         output = io.StringIO()
@@ -276,18 +297,14 @@ def export_customers_csv():
         
         # Write data - INCLUDING PHONE NUMBERS
         for customer in customers:
-            customer_orders = [order for order in orders if order.get('user_id') == customer['telegram_id']]
-            total_orders = len(customer_orders)
-            total_spent = sum(order.get('total_amount', 0) for order in customer_orders)
-            
             writer.writerow([
                 customer['telegram_id'],
                 customer.get('username', 'غير متوفر'),
                 customer.get('first_name', ''),
                 customer.get('last_name', ''),
                 customer.get('phone', 'غير متوفر'),  # ✅ ADDED PHONE NUMBER
-                total_orders,
-                total_spent,
+                customer.get('total_orders') or 0,
+                customer.get('total_spent') or 0,
                 customer.get('created_at', '')
             ])
         
@@ -1,7 +1,6 @@
 # dashboard/utils.py - Shared utility functions and helpers (FIXED)
 from flask import session, redirect, url_for, flash
 from functools import wraps
-from datetime import datetime, timedelta
 import os
 from werkzeug.utils import secure_filename
 import barcode
@@ -286,62 +285,28 @@ def get_inventory_analytics():
         }
 
 def get_sales_analytics():
-    """Get sales analytics for inventory optimization - FIXED: Proper 30-day calculation"""
+    """Get sales analytics for inventory optimization - last 30 days from the sales_daily rollup"""
     try:
-        orders_data = load_orders()
-        orders = orders_data.get('orders', [])
-        
-        # Last 30 days sales - FIXED: Use proper date comparison
-        thirty_days_ago = datetime.now() - timedelta(days=30)
-        recent_orders = []
-        
-        for order in orders:
-            try:
-                # Handle different date formats
-                order_date_str = order.get('order_date', '')
-                if not order_date_str:
-                    continue
-                    
-                # Try different date formats
-                for date_format in ['%Y-%m-%d', '%Y-%m-%d', '%d/%m/%Y']:
-                    try:
-                        order_date = datetime.strptime(order_date_str, date_format)
-                        break
-                    except ValueError:
-                        continue
-                else:
-                    # If no format works, skip this order
-                    continue
-                
-                if order_date > thirty_days_ago:
-                    recent_orders.append(order)
-            except Exception as e:
-                print(f"⚠️ Error processing order date: {e}")
-                continue
-        
-        print(f"📊 Found {len(recent_orders)} orders in last 30 days")
+        summary = db.get_sales_summary(days=30)
+        print(f"📊 Found {summary['total_orders']} orders in last 30 days")
         
         # Product sales analysis
         product_sales = {}
-        for order in recent_orders:
-            for item in order.get('items', []):
-                product_key = f"{item.get('name')}_{item.get('color', '')}_{item.get('size', '')}"
-                if product_key not in product_sales:
-                    product_sales[product_key] = {
-                        'name': item.get('name'),
-                        'color': item.get('color', ''),
-                        'size': item.get('size', ''),
-                        'total_sold': 0,
-                        'revenue': 0
-                    }
-                product_sales[product_key]['total_sold'] += item.get('quantity', 0)
-                product_sales[product_key]['revenue'] += item.get('price', 0) * item.get('quantity', 0)
-        
-        # Sort by most sold
-        top_selling = sorted(product_sales.values(), key=lambda x: x['total_sold'], reverse=True)[:10]
+        for row in db.get_variant_sales(30):
+            product_key = f"{row['name']}_{row['color']}_{row['size']}"
+            product_sales[product_key] = {
+                'name': row['name'],
+                'color': row['color'],
+                'size': row['size'],
+                'total_sold': row['total_sold'] or 0,
+                'revenue': row['total_revenue'] or 0
+            }
+        
+        # Already sorted by most sold
+        top_selling = list(product_sales.values())[:10]
         
         return {
-            'total_recent_orders': len(recent_orders),
+            'total_recent_orders': summary['total_orders'],
             'top_selling_products': top_selling,
             'product_sales': product_sales
         }
@@ -357,7 +322,6 @@ def generate_stock_alerts():
     """Generate stock alerts and recommendations - MODIFIED: Only show items with quantity > 0 and stock < 5, INCLUDES MODEL NUMBER"""
     try:
         products_data = load_products()
-        sales_analytics = get_sales_analytics()
         
         alerts = []
         recommendations = []
@@ -2,18 +2,84 @@
 import sqlite3
 import json
 import os
-from datetime import datetime
-from typing import List, Dict, Any, Optional
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import Future
+from typing import List, Dict, Any, Optional, Tuple
+import config
 from config import LOW_STOCK_THRESHOLD, CRITICAL_STOCK_THRESHOLD
+from db_pool import ConnectionPool
+from catalog import CATALOG_QUERY, build_catalog, catalog_query_for
+from db_archive import (
+    ARCHIVE_START_DELAY, DEFAULT_ARCHIVE_INTERVAL, DEFAULT_HOT_MONTHS, DEFAULT_RETENTION_MONTHS,
+    ActivityArchive
+)
+from db_backup import BackupManager
+from db_cache import ReadCache, cached, invalidates
+from db_logbuffer import ActivityLogBuffer, NameCache
+from db_metrics import QueryMetrics, instrumented
+from db_snapshot import ReportSnapshot, snapshot_read
+from db_writer import WriteQueue
+from migrations import (
+    CLIENT_PROFILE_SQL, PRODUCT_SEARCH_REFRESH_SQL, REBUILD_CUSTOMERS_SQL,
+    REBUILD_PRODUCT_SALES_SQL, SALES_DAILY_REBUILD_SQL, apply_migrations, schema_version
+)
+from pricing import DEFAULT_ROUNDING, price_expression
+from product_search import SEARCH_WEIGHTS, match_query
+from order_status import (
+    CANCELLED, PENDING, DELIVERED_CODES, FULFILLED_CODES, STATUS_FILTERS, codes_sql
+)
 import hashlib
 import secrets
 
+# Profile fields only: the order aggregates on the row are kept by the
+# triggers on orders (migration 5) and INSERT OR REPLACE would reset them
+CUSTOMER_UPSERT_SQL = '''
+    INSERT INTO customers (telegram_id, username, first_name, last_name, phone, last_active)
+    VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+    ON CONFLICT(telegram_id) DO UPDATE SET
+        username = excluded.username,
+        first_name = excluded.first_name,
+        last_name = excluded.last_name,
+        phone = excluded.phone,
+        last_active = excluded.last_active
+'''
+
+# Newest events shown in a client's activity timeline
+CLIENT_TIMELINE_LIMIT = 50
+# strftime('%w') -> day name, as the timeline used to report it
+WEEKDAY_NAMES = ['Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday']
+
+@instrumented
 class Database:
     def __init__(self, db_path='store.db'):
         self.db_path = db_path
+        # Every public method and every statement is timed (db_metrics)
+        self.metrics = QueryMetrics()
+        self.pool = ConnectionPool(db_path, on_connect=self.metrics.install)
+        self.cache = ReadCache()
+        self.writer = WriteQueue(self.pool)
+        # Activity logs are buffered and written in batches on the writer
+        self.client_logs = ActivityLogBuffer(self.writer, self._write_client_logs, 'client-logs')
+        self.staff_logs = ActivityLogBuffer(self.writer, self._write_staff_logs, 'staff-logs')
+        self.bot_user_names = NameCache()
+        self.staff_names = NameCache()
+        # Optional config.py settings; older config files keep the defaults
+        self.activity_archive = ActivityArchive(
+            db_path,
+            hot_months=getattr(config, 'ACTIVITY_LOG_HOT_MONTHS', DEFAULT_HOT_MONTHS),
+            retention_months=getattr(config, 'ACTIVITY_LOG_RETENTION_MONTHS', DEFAULT_RETENTION_MONTHS))
+        self._archiver = None
+        self._archiver_stop = threading.Event()
+        # Heavy report reads go to a periodically refreshed copy (db_snapshot)
+        self.snapshot = ReportSnapshot(db_path, on_connect=self.metrics.install)
+        self._snapshot_reads = threading.local()
+        self.backups = BackupManager(db_path, archive_path=self.activity_archive.archive_path)
         self._ensure_db_file()
-        self.init_db()
-        self.update_schema()  # ADD THIS LINE
+        self.migrate()
+        self.metrics.start_reporter()
+        self.start_activity_archiver(getattr(config, 'ACTIVITY_ARCHIVE_INTERVAL', DEFAULT_ARCHIVE_INTERVAL))
     
     def _ensure_db_file(self):
         """Ensure the database file exists"""
@@ -23,126 +89,6 @@ class Database:
         else:
             print(f"✅ Database file exists: {self.db_path}")
     
-    def update_schema(self):
-        """Update database schema to add location fields and bot_users table"""
-        with self.get_connection() as conn:
-            cursor = conn.cursor()
-            try:
-                # Check if user_state column exists
-                cursor.execute("PRAGMA table_info(orders)")
-                columns = [column[1] for column in cursor.fetchall()]
-                
-                if 'user_state' not in columns:
-                    print("🔄 Adding user_state column to orders table...")
-                    cursor.execute('ALTER TABLE orders ADD COLUMN user_state TEXT')
-                
-                if 'user_region' not in columns:
-                    print("🔄 Adding user_region column to orders table...")
-                    cursor.execute('ALTER TABLE orders ADD COLUMN user_region TEXT')
-                
-                # ✅ NEW: Create bot_users table for tracking ALL users
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS bot_users (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        telegram_id INTEGER UNIQUE NOT NULL,
-                        username TEXT,
-                        first_name TEXT,
-                        last_name TEXT,
-                        phone TEXT,
-                        total_interactions INTEGER DEFAULT 0,
-                        has_placed_order BOOLEAN DEFAULT 0,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        last_active TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                ''')
-                
-                # ✅ NEW: Create dashboard_users table for admin/user access
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS dashboard_users (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        username TEXT UNIQUE NOT NULL,
-                        password_hash TEXT NOT NULL,
-                        role TEXT NOT NULL DEFAULT "user",
-                        permissions TEXT,
-                        is_active BOOLEAN DEFAULT 1,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        last_login TIMESTAMP,
-                        full_name TEXT
-                    )
-                ''')
-                
-                # ✅ MIGRATE EXISTING CUSTOMERS TO BOT_USERS
-                print("🔄 Migrating existing customers to bot_users table...")
-                cursor.execute('''
-                    INSERT OR IGNORE INTO bot_users (telegram_id, username, first_name, last_name, has_placed_order)
-                    SELECT telegram_id, username, first_name, last_name, 1 
-                    FROM customers 
-                    WHERE telegram_id NOT IN (SELECT telegram_id FROM bot_users)
-                ''')
-                
-                migrated_count = cursor.rowcount
-                if migrated_count > 0:
-                    print(f"✅ Migrated {migrated_count} existing customers to bot_users")
-                
-                # ✅ CREATE DEFAULT ADMIN USER if no users exist
-                cursor.execute('SELECT COUNT(*) FROM dashboard_users')
-                if cursor.fetchone()[0] == 0:
-                    self._create_default_admin(cursor)
-                
-                # ✅ NEW: Create staff_activity_logs table for tracking staff activities
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS staff_activity_logs (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        user_id INTEGER NOT NULL,
-                        username TEXT,
-                        full_name TEXT,
-                        action_type TEXT NOT NULL,
-                        action_description TEXT NOT NULL,
-                        target_type TEXT,
-                        target_id INTEGER,
-                        target_name TEXT,
-                        old_value TEXT,
-                        new_value TEXT,
-                        ip_address TEXT,
-                        user_agent TEXT,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        FOREIGN KEY (user_id) REFERENCES dashboard_users (id)
-                    )
-                ''')
-                
-                # ✅ NEW: Create client_activity_logs table for tracking client/bot user activities
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS client_activity_logs (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        telegram_id INTEGER NOT NULL,
-                        username TEXT,
-                        first_name TEXT,
-                        last_name TEXT,
-                        activity_type TEXT NOT NULL,
-                        activity_description TEXT NOT NULL,
-                        target_type TEXT,
-                        target_id INTEGER,
-                        target_name TEXT,
-                        metadata TEXT,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        FOREIGN KEY (telegram_id) REFERENCES bot_users (telegram_id)
-                    )
-                ''')
-                
-                # Create indexes for better query performance
-                cursor.execute('CREATE INDEX IF NOT EXISTS idx_staff_logs_user_id ON staff_activity_logs(user_id)')
-                cursor.execute('CREATE INDEX IF NOT EXISTS idx_staff_logs_created_at ON staff_activity_logs(created_at)')
-                cursor.execute('CREATE INDEX IF NOT EXISTS idx_staff_logs_action_type ON staff_activity_logs(action_type)')
-                cursor.execute('CREATE INDEX IF NOT EXISTS idx_client_logs_telegram_id ON client_activity_logs(telegram_id)')
-                cursor.execute('CREATE INDEX IF NOT EXISTS idx_client_logs_created_at ON client_activity_logs(created_at)')
-                cursor.execute('CREATE INDEX IF NOT EXISTS idx_client_logs_activity_type ON client_activity_logs(activity_type)')
-                
-                conn.commit()
-                print("✅ Database schema updated successfully!")
-                
-            except Exception as e:
-                print(f"❌ Error updating schema: {e}")
-
     def _create_default_admin(self, cursor):
         """Create default admin user"""
         try:
@@ -180,197 +126,21 @@ class Database:
         except:
             return False
 
-    def init_db(self):
-        """Initialize database with enhanced inventory tracking AND LOCATION FIELDS"""
+    def migrate(self):
+        """Apply pending schema migrations (see migrations.py)"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                
-                # Enable foreign keys and WAL mode for better performance
-                cursor.execute('PRAGMA foreign_keys = ON')
-                cursor.execute('PRAGMA journal_mode = WAL')
-                
-                # Categories table
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS categories (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        name TEXT UNIQUE NOT NULL,
-                        arabic_name TEXT,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                ''')
-                
-                # Products table with enhanced fields
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS products (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        category_id INTEGER NOT NULL,
-                        name TEXT NOT NULL,
-                        arabic_name TEXT,
-                        price REAL NOT NULL,
-                        description TEXT,
-                        arabic_description TEXT,
-                        model_number TEXT UNIQUE,
-                        barcode_data TEXT,
-                        is_active BOOLEAN DEFAULT 1,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        FOREIGN KEY (category_id) REFERENCES categories (id)
-                    )
-                ''')
-                
-                # Product variants with inventory tracking
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS product_variants (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        product_id INTEGER NOT NULL,
-                        color TEXT NOT NULL,
-                        color_arabic TEXT,
-                        size TEXT NOT NULL,
-                        size_arabic TEXT,
-                        quantity INTEGER DEFAULT 0,
-                        min_stock_alert INTEGER DEFAULT 5,
-                        image_path TEXT,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        FOREIGN KEY (product_id) REFERENCES products (id),
-                        UNIQUE(product_id, color, size)
-                    )
-                ''')
-                
-                # Orders table with enhanced status tracking AND LOCATION FIELDS
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS orders (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        user_id INTEGER NOT NULL,
-                        user_name TEXT NOT NULL,
-                        user_phone TEXT NOT NULL,
-                        user_address TEXT NOT NULL,
-                        user_state TEXT,           -- NEW: State field
-                        user_region TEXT,          -- NEW: Region field
-                        username TEXT,
-                        total_amount REAL NOT NULL,
-                        status TEXT DEFAULT 'pending',
-                        order_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        status_update TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        notes TEXT,
-                        shipping_method TEXT
-                    )
-                ''')
-                
-                # Order items table
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS order_items (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        order_id INTEGER NOT NULL,
-                        product_id INTEGER NOT NULL,
-                        variant_id INTEGER,
-                        product_name TEXT NOT NULL,
-                        price REAL NOT NULL,
-                        quantity INTEGER NOT NULL,
-                        color TEXT,
-                        size TEXT,
-                        FOREIGN KEY (order_id) REFERENCES orders (id),
-                        FOREIGN KEY (product_id) REFERENCES products (id),
-                        FOREIGN KEY (variant_id) REFERENCES product_variants (id)
-                    )
-                ''')
-                
-                # Inventory history for tracking changes
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS inventory_history (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        product_id INTEGER NOT NULL,
-                        variant_id INTEGER,
-                        change_type TEXT NOT NULL, -- 'sale', 'restock', 'adjustment'
-                        old_quantity INTEGER,
-                        new_quantity INTEGER,
-                        change_amount INTEGER,
-                        reason TEXT,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        FOREIGN KEY (product_id) REFERENCES products (id),
-                        FOREIGN KEY (variant_id) REFERENCES product_variants (id)
-                    )
-                ''')
-                
-                # Customers table for notifications (existing - for buyers)
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS customers (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        telegram_id INTEGER UNIQUE NOT NULL,
-                        username TEXT,
-                        first_name TEXT,
-                        last_name TEXT,
-                        phone TEXT,
-                        total_orders INTEGER DEFAULT 0,
-                        total_spent REAL DEFAULT 0,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        last_active TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                ''')
-                
-                # ✅ NEW: Bot users table for ALL users (including non-buyers)
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS bot_users (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        telegram_id INTEGER UNIQUE NOT NULL,
-                        username TEXT,
-                        first_name TEXT,
-                        last_name TEXT,
-                        phone TEXT,
-                        total_interactions INTEGER DEFAULT 0,
-                        has_placed_order BOOLEAN DEFAULT 0,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        last_active TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                ''')
-                
-                # ✅ NEW: Dashboard users table for admin/user access
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS dashboard_users (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        username TEXT UNIQUE NOT NULL,
-                        password_hash TEXT NOT NULL,
-                        role TEXT NOT NULL DEFAULT "user",
-                        permissions TEXT,
-                        is_active BOOLEAN DEFAULT 1,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        last_login TIMESTAMP,
-                        full_name TEXT
-                    )
-                ''')
-                
-                # Predefined sizes and colors for consistency
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS size_options (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        size_code TEXT UNIQUE NOT NULL,
-                        arabic_name TEXT,
-                        display_order INTEGER DEFAULT 0
-                    )
-                ''')
-                
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS color_options (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        color_code TEXT UNIQUE NOT NULL,
-                        arabic_name TEXT,
-                        display_order INTEGER DEFAULT 0
-                    )
-                ''')
-                
-                # Insert default sizes and colors
-                self._insert_default_options(cursor)
-                
-                # Create default admin user
-                self._create_default_admin(cursor)
-                
-                conn.commit()
-                print("✅ Enhanced database with inventory and location tracking created successfully!")
-                
+            # Not wrapped in `with`: each migration commits on its own
+            applied = apply_migrations(self.get_connection(), self)
+            if applied:
+                print(f"✅ Database schema migrated to version {applied[-1]}")
         except Exception as e:
-            print(f"❌ Error creating database tables: {e}")
-    
+            print(f"❌ Error migrating database schema: {e}")
+
+    def get_schema_version(self) -> int:
+        """Current PRAGMA user_version of the database"""
+        with self.get_connection() as conn:
+            return schema_version(conn)
+
     def _insert_default_options(self, cursor):
         """Insert default size and color options"""
         # Default sizes
@@ -408,8 +178,218 @@ class Database:
         ''', colors)
     
     def get_connection(self):
-        """Get database connection"""
-        return sqlite3.connect(self.db_path)
+        """Get the calling thread's pooled database connection (or its
+        report snapshot connection inside snapshot_reads())"""
+        if self.reading_snapshot:
+            return self.snapshot.connection()
+        return self.pool.connection()
+
+    @contextmanager
+    def snapshot_reads(self):
+        """Serve this thread's reads from the report snapshot (read-only, up
+        to snapshot.max_age seconds old) for the duration of the block:
+
+            with db.snapshot_reads():
+                orders = db.get_orders()
+        """
+        state = self._snapshot_reads
+        state.depth = getattr(state, 'depth', 0) + 1
+        try:
+            yield
+        finally:
+            state.depth -= 1
+
+    @property
+    def reading_snapshot(self) -> bool:
+        """True inside snapshot_reads() on the calling thread"""
+        return getattr(self._snapshot_reads, 'depth', 0) > 0
+
+    def get_snapshot_stats(self) -> Dict:
+        """Get report snapshot statistics"""
+        return self.snapshot.stats()
+
+    def backup_database(self, background: bool = False, quick_check: bool = False):
+        """Take a verified online backup of the database and its activity log
+        archive, as one set (db_backup).
+
+        Returns the backup report, or with background=True whether a new
+        backup was started (False while one is still running).
+        """
+        self.flush_activity_logs()
+        if background:
+            return self.backups.backup_in_background(quick_check)
+        return self.backups.backup(quick_check)
+
+    def get_backup_stats(self) -> Dict:
+        """Backups on disk and the last backup's report"""
+        return self.backups.stats()
+
+    def get_query_stats(self, limit: int = 20) -> Dict:
+        """Slowest Database methods and SQL statements (calls, rows,
+        p50/p95/p99, lock wait) and the latest slow queries with plans"""
+        return self.metrics.stats(limit)
+
+    def release_connection(self):
+        """Return the calling thread's connection to the pool (e.g. at request teardown)"""
+        self.pool.release()
+
+    def close_connections(self):
+        """Commit queued writes and close every pooled connection"""
+        self.writer.shutdown()
+        self.metrics.stop_reporter()
+        self._archiver_stop.set()
+        self.pool.close_all()
+
+    def get_pool_stats(self) -> Dict:
+        """Get connection pool statistics"""
+        return self.pool.stats()
+
+    def queue_write(self, fn, *args, **kwargs) -> Future:
+        """Run a write method on the single writer thread (group commit).
+
+        Returns a Future with the method's result once its group committed:
+            db.queue_write(db.add_bot_user, telegram_id, username, ...)
+        """
+        return self.writer.submit(fn, *args, **kwargs)
+
+    def queue_write_nowait(self, fn, *args, **kwargs) -> Future:
+        """queue_write() that raises queue.Full instead of blocking (for the event loop)"""
+        return self.writer.submit_nowait(fn, *args, **kwargs)
+
+    def get_writer_stats(self) -> Dict:
+        """Get write queue / group commit statistics"""
+        return {
+            **self.writer.stats(),
+            'client_logs': {**self.client_logs.stats(), 'names': self.bot_user_names.stats()},
+            'staff_logs': {**self.staff_logs.stats(), 'names': self.staff_names.stats()},
+        }
+
+    def flush_activity_logs(self, timeout: float = None):
+        """Write buffered activity logs now and wait for them to commit"""
+        for future in (self.client_logs.flush(), self.staff_logs.flush()):
+            if future is not None:
+                future.result(timeout)
+
+    def archive_activity_logs(self) -> Dict:
+        """Move activity logs older than the hot window to the monthly archive
+        partitions and compact partitions past retention into activity_daily"""
+        self.flush_activity_logs()
+        moved = self.activity_archive.archive()
+        compacted = self.activity_archive.compact()
+        print(f"✅ Archived activity logs: moved {moved}, compacted {compacted}")
+        return {'moved': moved, 'compacted': compacted}
+
+    def start_activity_archiver(self, interval: float = DEFAULT_ARCHIVE_INTERVAL):
+        """Run archive_activity_logs() every interval seconds on a daemon thread
+        (first run ARCHIVE_START_DELAY after startup); interval <= 0 disables it"""
+        if interval <= 0 or self._archiver is not None:
+            return
+
+        def run():
+            delay = ARCHIVE_START_DELAY
+            while not self._archiver_stop.wait(delay):
+                delay = interval
+                try:
+                    self.archive_activity_logs()
+                except Exception as e:
+                    print(f"❌ Error archiving activity logs: {e}")
+
+        self._archiver = threading.Thread(target=run, name='activity-archive', daemon=True)
+        self._archiver.start()
+
+    def get_activity_archive_stats(self) -> Dict:
+        """Archive partitions and their row counts"""
+        return self.activity_archive.stats()
+
+    @contextmanager
+    def _activity_logs_source(self, table: str, start_date: str = None):
+        """(connection, FROM clause) for reading an activity log table.
+
+        Ranges inside the hot window read store.db through the pool; a
+        start_date before it opens an archive connection and reads the
+        UNION ALL of the hot table and the monthly partitions it reaches.
+        """
+        if not start_date or start_date[:10] >= self.activity_archive.hot_boundary():
+            with self.get_connection() as conn:
+                yield conn, table
+            return
+        conn = self.activity_archive.connect()
+        try:
+            yield conn, self.activity_archive.source_sql(conn, table, start_date)
+        finally:
+            conn.close()
+
+    def _activity_log_page(self, table: str, filters: List[Tuple[str, object]], limit: int, offset: int,
+                           start_date: str = None, end_date: str = None) -> List[Dict]:
+        """Newest-first page of an activity log table; filters are (condition, param) pairs.
+
+        A dated page reads the range's source (_activity_logs_source). Hot
+        rows are all newer than archived ones, so an undated page reads
+        store.db and only continues into the archive partitions when the hot
+        table runs out before offset + limit.
+        """
+        conditions = [f' AND {condition}' for condition, _ in filters]
+        params = [param for _, param in filters]
+        if start_date:
+            conditions.append(' AND created_at >= date(?)')
+            params.append(start_date)
+        if end_date:
+            conditions.append(" AND created_at < date(?, '+1 day')")
+            params.append(end_date)
+        where = 'WHERE 1=1' + ''.join(conditions)
+        page = 'SELECT * FROM {source} ' + where + ' ORDER BY created_at DESC LIMIT ? OFFSET ?'
+
+        with self._activity_logs_source(table, start_date) as (conn, source):
+            conn.row_factory = sqlite3.Row
+            cursor = conn.cursor()
+            cursor.execute(page.format(source=source), params + [limit, offset])
+            rows = [dict(row) for row in cursor.fetchall()]
+        if start_date or len(rows) >= limit:
+            return rows
+
+        conn = self.activity_archive.connect()
+        try:
+            archived = self.activity_archive.archived_sql(conn, table)
+            if archived is None:
+                return rows
+            conn.row_factory = sqlite3.Row
+            cursor = conn.cursor()
+            skip = 0
+            if not rows and offset:
+                cursor.execute(f'SELECT COUNT(*) FROM main.{table} ' + where, params)
+                skip = max(0, offset - cursor.fetchone()[0])
+            cursor.execute(page.format(source=archived), params + [limit - len(rows), skip])
+            rows += [dict(row) for row in cursor.fetchall()]
+        finally:
+            conn.close()
+        return rows
+
+    def _add_compacted_activity(self, cursor, table: str, type_key: str, days: int, stats: Dict) -> Dict:
+        """Add activity_daily's per-day counts (archive months compacted past
+        retention) inside the trailing window to total_activities and by_type"""
+        if self._rollup_since(days) >= self.activity_archive.retention_boundary():
+            return stats
+        cursor.execute('''
+            SELECT activity_type, SUM(events)
+            FROM activity_daily
+            WHERE log_table = ? AND day >= date('now', ?)
+            GROUP BY activity_type
+        ''', (table, f'-{days} days'))
+        counts = {row[type_key]: row['count'] for row in stats['by_type']}
+        for activity_type, events in cursor.fetchall():
+            counts[activity_type] = counts.get(activity_type, 0) + events
+            stats['total_activities'] += events
+        stats['by_type'] = [{type_key: activity_type, 'count': count} for activity_type, count
+                            in sorted(counts.items(), key=lambda item: item[1], reverse=True)]
+        return stats
+
+    def get_cache_stats(self) -> Dict:
+        """Get read cache hit/miss statistics"""
+        return self.cache.stats()
+
+    def clear_cache(self):
+        """Drop every cached read (e.g. after editing store.db by hand)"""
+        self.cache.clear()
 
     # ✅ NEW: User Authentication Methods
     def authenticate_user(self, username, password):
@@ -513,6 +493,7 @@ class Database:
                 cursor.execute(query, params)
                 
                 conn.commit()
+                self.staff_names.discard(user_id)
                 print(f"✅ Updated user {user_id}: username={username}, full_name={full_name}")
                 return True
             except Exception as e:
@@ -545,6 +526,7 @@ class Database:
             try:
                 cursor.execute('DELETE FROM dashboard_users WHERE id = ?', (user_id,))
                 conn.commit()
+                self.staff_names.discard(user_id)
                 print(f"✅ Deleted user {user_id}")
                 return True
             except Exception as e:
@@ -577,6 +559,7 @@ class Database:
                     VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP, COALESCE((SELECT total_interactions + 1 FROM bot_users WHERE telegram_id = ?), 1))
                 ''', (telegram_id, username, first_name, last_name, telegram_id))
                 conn.commit()
+                self.bot_user_names.put(telegram_id, (username or None, first_name or None, last_name or None))
                 print(f"✅ Registered bot user: {first_name} ({telegram_id})")
                 return True
             except Exception as e:
@@ -622,6 +605,13 @@ class Database:
             cursor.execute('SELECT COUNT(*) FROM bot_users WHERE has_placed_order = 1')
             return cursor.fetchone()[0]
 
+    def get_customers_count(self):
+        """Get count of registered customers (live database, no report snapshot)"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT COUNT(*) FROM customers')
+            return cursor.fetchone()[0]
+
     # ✅ FIXED: Customer management - now updates both tables properly
     def add_customer(self, telegram_id: int, username: str = None, first_name: str = None, last_name: str = None, phone: str = None):
         """Add or update customer (for buyers) - NOW ALSO UPDATES BOT_USERS WITH PHONE"""
@@ -629,11 +619,7 @@ class Database:
             cursor = conn.cursor()
             try:
                 # Add to customers table (existing functionality)
-                cursor.execute('''
-                    INSERT OR REPLACE INTO customers 
-                    (telegram_id, username, first_name, last_name, phone, last_active)
-                    VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
-                ''', (telegram_id, username, first_name, last_name, phone))
+                cursor.execute(CUSTOMER_UPSERT_SQL, (telegram_id, username, first_name, last_name, phone))
                 
                 # ✅ NEW: Also mark as buyer in bot_users table with phone
                 cursor.execute('''
@@ -668,6 +654,7 @@ class Database:
             return all_users
 
     # ✅ ADDED: Backward compatible method using only customers table
+    @snapshot_read
     def get_all_customers(self):
         """Get all customers from customers table (original method) - FIXED TO GET PHONE FROM ORDERS"""
         with self.get_connection() as conn:
@@ -697,7 +684,102 @@ class Database:
             
             return customers
 
+    def query_customers(self, cursor: tuple = None, limit: int = 50, direction: str = 'next') -> Dict:
+        """Get one page of customers ordered by total_spent DESC using keyset pagination
+
+        cursor: (total_spent, telegram_id) to page from - 'next' returns customers
+        ranked below it, 'prev' customers ranked above it.
+        Order totals come from the aggregate columns kept by the orders triggers.
+        """
+        with self.get_connection() as conn:
+            conn.row_factory = sqlite3.Row
+            db_cursor = conn.cursor()
+
+            where, params = '1=1', []
+            if cursor is not None:
+                where = '(c.total_spent, c.telegram_id) < (?, ?)' if direction == 'next' else '(c.total_spent, c.telegram_id) > (?, ?)'
+                params = [cursor[0], cursor[1]]
+            order_by = 'c.total_spent DESC, c.telegram_id DESC' if direction == 'next' else 'c.total_spent ASC, c.telegram_id ASC'
+
+            # Fetch one extra row to know whether another page exists
+            db_cursor.execute(f'''
+                SELECT
+                    c.*,
+                    (SELECT o.user_phone
+                     FROM orders o
+                     WHERE o.user_id = c.telegram_id
+                     ORDER BY o.order_date DESC
+                     LIMIT 1) as latest_phone
+                FROM customers c
+                WHERE {where}
+                ORDER BY {order_by}
+                LIMIT ?
+            ''', params + [limit + 1])
+            customers = [dict(row) for row in db_cursor.fetchall()]
+
+            has_more = len(customers) > limit
+            if direction != 'next' and not has_more:
+                # Paging back reached the top spenders - serve a full first page
+                return self.query_customers(None, limit, 'next')
+            customers = customers[:limit]
+            if direction != 'next':
+                customers.reverse()
+
+            for customer in customers:
+                if customer.get('latest_phone'):
+                    customer['phone'] = customer['latest_phone']
+
+            db_cursor.execute('''
+                SELECT
+                    COUNT(*) as total_customers,
+                    SUM(CASE WHEN total_orders > 0 THEN 1 ELSE 0 END) as active_customers,
+                    SUM(total_spent) as total_spent,
+                    MAX(total_spent) as top_spent
+                FROM customers
+            ''')
+            totals = dict(db_cursor.fetchone())
+
+            if direction == 'next':
+                has_next, has_prev = has_more, cursor is not None
+            else:
+                has_next, has_prev = bool(customers), has_more
+
+            def page_cursor(customer):
+                return (customer['total_spent'], customer['telegram_id'])
+
+            return {
+                'customers': customers,
+                'next_cursor': page_cursor(customers[-1]) if customers and has_next else None,
+                'prev_cursor': page_cursor(customers[0]) if customers and has_prev else None,
+                'stats': {
+                    'total_customers': totals['total_customers'] or 0,
+                    'active_customers': totals['active_customers'] or 0,
+                    'total_spent': totals['total_spent'] or 0,
+                    'top_spent': totals['top_spent'] or 0
+                }
+            }
+
+    def rebuild_customer_aggregates(self) -> int:
+        """Recompute every customer's total_orders, total_spent and last_order_date from orders
+
+        The triggers keep these current; this repairs drift (e.g. rows edited
+        with the triggers missing). Returns the number of customers updated.
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(REBUILD_CUSTOMERS_SQL)
+                updated = cursor.rowcount
+                conn.commit()
+                print(f"✅ Rebuilt order aggregates for {updated} customers")
+                return updated
+            except Exception as e:
+                conn.rollback()
+                print(f"❌ Error rebuilding customer aggregates: {e}")
+                return 0
+
     # Category methods
+    @invalidates('categories')
     def add_category(self, name: str, arabic_name: str = None) -> int:
         """Add a new category with Arabic name"""
         with self.get_connection() as conn:
@@ -721,6 +803,7 @@ class Database:
                 print(f"❌ Error adding category {name}: {e}")
                 return 0
     
+    @cached('categories')
     def get_categories(self) -> List[Dict]:
         """Get all categories"""
         with self.get_connection() as conn:
@@ -730,6 +813,7 @@ class Database:
             return [dict(row) for row in cursor.fetchall()]
 
     # Product methods
+    @invalidates('products', 'categories')
     def add_product(self, category_name: str, name: str, price: float, 
                    description: str = "", model_number: str = "",
                    arabic_name: str = None, arabic_description: str = None) -> int:
@@ -760,6 +844,7 @@ class Database:
                 print(f"❌ Error adding product {name}: {e}")
                 return 0
     
+    @invalidates('products')
     def add_product_variant(self, product_id: int, color: str, size: str, 
                            quantity: int = 0, color_arabic: str = None, 
                            size_arabic: str = None, image_path: str = None) -> int:
@@ -783,6 +868,92 @@ class Database:
                 print(f"❌ Error adding variant for product {product_id}: {e}")
                 return 0
 
+    @invalidates('products')
+    def upsert_variants(self, product_id: int, rows: List[Dict], remove_missing: bool = False) -> Dict:
+        """Write a product's whole (color, size) variant matrix in one transaction
+        
+        rows: [{'color', 'size', 'quantity', 'image_path'?, 'color_arabic'?, 'size_arabic'?}]
+        Only changed cells are touched: existing variants keep their ids (so
+        order items, inventory history and images stay linked), quantity
+        changes are recorded in inventory_history, and an image_path of None
+        keeps the stored image. remove_missing=True deletes cells not in rows.
+        """
+        result = {'success': False, 'inserted': 0, 'updated': 0, 'unchanged': 0, 'deleted': 0}
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute('''
+                    SELECT color, size, id, quantity, image_path, color_arabic, size_arabic
+                    FROM product_variants WHERE product_id = ?
+                ''', (product_id,))
+                existing = {(row[0], row[1]): row[2:] for row in cursor.fetchall()}
+                
+                inserts, updates, history = [], [], []
+                wanted = set()
+                for row in rows:
+                    color, size = row['color'], row['size']
+                    if (color, size) in wanted:
+                        continue
+                    wanted.add((color, size))
+                    quantity = int(row.get('quantity') or 0)
+                    image_path = row.get('image_path')
+                    color_arabic = row.get('color_arabic') or color
+                    size_arabic = row.get('size_arabic') or size
+                    
+                    current = existing.get((color, size))
+                    if current is None:
+                        inserts.append((product_id, color, color_arabic, size, size_arabic, quantity, image_path))
+                        continue
+                    
+                    variant_id, old_quantity, old_image, old_color_arabic, old_size_arabic = current
+                    new_image = image_path if image_path is not None else old_image
+                    if (quantity, new_image, color_arabic, size_arabic) == (old_quantity, old_image, old_color_arabic, old_size_arabic):
+                        result['unchanged'] += 1
+                        continue
+                    updates.append((quantity, new_image, color_arabic, size_arabic, variant_id))
+                    if quantity != old_quantity:
+                        history.append((product_id, variant_id, old_quantity, quantity,
+                                        quantity - (old_quantity or 0), 'product_edit'))
+                
+                if inserts:
+                    cursor.executemany('''
+                        INSERT INTO product_variants 
+                        (product_id, color, color_arabic, size, size_arabic, quantity, image_path)
+                        VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ''', inserts)
+                if updates:
+                    cursor.executemany('''
+                        UPDATE product_variants 
+                        SET quantity = ?, image_path = ?, color_arabic = ?, size_arabic = ?,
+                            updated_at = CURRENT_TIMESTAMP
+                        WHERE id = ?
+                    ''', updates)
+                if history:
+                    cursor.executemany('''
+                        INSERT INTO inventory_history 
+                        (product_id, variant_id, change_type, old_quantity, new_quantity, change_amount, reason)
+                        VALUES (?, ?, 'adjustment', ?, ?, ?, ?)
+                    ''', history)
+                
+                if remove_missing:
+                    stale = [(existing[key][0],) for key in existing if key not in wanted]
+                    if stale:
+                        cursor.executemany('DELETE FROM product_variants WHERE id = ?', stale)
+                    result['deleted'] = len(stale)
+                
+                conn.commit()
+                result.update(success=True, inserted=len(inserts), updated=len(updates))
+                print(f"✅ Upserted variants for product {product_id}: "
+                      f"{result['inserted']} new, {result['updated']} changed, "
+                      f"{result['unchanged']} unchanged, {result['deleted']} removed")
+                return result
+                
+            except Exception as e:
+                conn.rollback()
+                print(f"❌ Error upserting variants for product {product_id}: {e}")
+                return result
+
+    @invalidates('products')
     def update_product(self, product_id: int, name: str = None, price: float = None, 
                       description: str = None, model_number: str = None) -> bool:
         """Update product basic information"""
@@ -823,6 +994,7 @@ class Database:
                 print(f"❌ Error updating product: {e}")
                 return False
 
+    @invalidates('products')
     def delete_product_variant(self, product_id: int, color: str, size: str) -> bool:
         """Delete a specific product variant"""
         with self.get_connection() as conn:
@@ -841,6 +1013,7 @@ class Database:
                 print(f"❌ Error deleting variant: {e}")
                 return False
 
+    @invalidates('products')
     def update_product_price(self, product_id: int, new_price: float) -> bool:
         """Update product price"""
         with self.get_connection() as conn:
@@ -860,6 +1033,168 @@ class Database:
                 print(f"❌ Error updating product price: {e}")
                 return False
 
+    def preview_bulk_prices(self, product_ids: List[int], operation: str, value: float = 0,
+                            currency_rate: float = 1, rounding: str = DEFAULT_ROUNDING) -> List[Dict]:
+        """Dry run of apply_bulk_prices: old and new price per product, nothing is written"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            try:
+                expr, params = price_expression(operation, value, currency_rate, rounding)
+                cursor.execute(f'''
+                    SELECT id, name, arabic_name, price, {expr}
+                    FROM products
+                    WHERE id IN (SELECT value FROM json_each(?))
+                    ORDER BY id
+                ''', params + [json.dumps([int(pid) for pid in product_ids])])
+                
+                return [{
+                    'product_id': row[0],
+                    'name': row[1],
+                    'arabic_name': row[2],
+                    'old_price': row[3],
+                    'new_price': row[4]
+                } for row in cursor.fetchall()]
+                
+            except Exception as e:
+                print(f"❌ Error previewing bulk prices: {e}")
+                return []
+
+    @invalidates('products')
+    def apply_bulk_prices(self, product_ids: List[int], operation: str, value: float = 0,
+                          currency_rate: float = 1, rounding: str = DEFAULT_ROUNDING,
+                          user_id: int = None) -> Dict:
+        """Reprice many products in one transaction, keeping an undo snapshot
+        
+        The old and new prices are stored in price_change_items under a new
+        price_change_batches row; revert_price_batch(batch_id) undoes it.
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            try:
+                expr, params = price_expression(operation, value, currency_rate, rounding)
+                ids_json = json.dumps([int(pid) for pid in product_ids])
+                
+                if not conn.in_transaction:
+                    conn.execute('BEGIN IMMEDIATE')
+                
+                cursor.execute('''
+                    INSERT INTO price_change_batches (operation, value, rounding, created_by)
+                    VALUES (?, ?, ?, ?)
+                ''', (operation, params[0], rounding, user_id))
+                batch_id = cursor.lastrowid
+                
+                # ✅ Snapshot old prices and compute every new price in one statement
+                cursor.execute(f'''
+                    INSERT INTO price_change_items (batch_id, product_id, old_price, new_price)
+                    SELECT ?, id, price, {expr}
+                    FROM products
+                    WHERE id IN (SELECT value FROM json_each(?))
+                ''', [batch_id] + params + [ids_json])
+                updated_count = cursor.rowcount
+                
+                cursor.execute('''
+                    UPDATE products 
+                    SET price = i.new_price, updated_at = CURRENT_TIMESTAMP
+                    FROM price_change_items i
+                    WHERE i.batch_id = ? AND i.product_id = products.id
+                ''', (batch_id,))
+                
+                cursor.execute('UPDATE price_change_batches SET product_count = ? WHERE id = ?',
+                               (updated_count, batch_id))
+                
+                conn.commit()
+                print(f"✅ Bulk price batch {batch_id}: {operation} ({params[0]}, {rounding}) on {updated_count} products")
+                return {
+                    'success': True,
+                    'batch_id': batch_id,
+                    'updated_count': updated_count,
+                    'missing_count': len(set(product_ids)) - updated_count
+                }
+                
+            except Exception as e:
+                conn.rollback()
+                print(f"❌ Error applying bulk prices: {e}")
+                return {'success': False, 'message': str(e)}
+
+    @invalidates('products')
+    def revert_price_batch(self, batch_id: int) -> Dict:
+        """Restore the prices a bulk price batch replaced
+        
+        Products whose price was changed again after the batch are left alone
+        and counted as skipped.
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            try:
+                if not conn.in_transaction:
+                    conn.execute('BEGIN IMMEDIATE')
+                
+                cursor.execute('SELECT product_count, reverted_at FROM price_change_batches WHERE id = ?',
+                               (batch_id,))
+                batch = cursor.fetchone()
+                if not batch:
+                    conn.rollback()
+                    return {'success': False, 'message': 'دفعة الأسعار غير موجودة'}
+                if batch[1]:
+                    conn.rollback()
+                    return {'success': False, 'message': 'تم التراجع عن هذه الدفعة مسبقاً'}
+                
+                cursor.execute('''
+                    UPDATE products 
+                    SET price = i.old_price, updated_at = CURRENT_TIMESTAMP
+                    FROM price_change_items i
+                    WHERE i.batch_id = ? AND i.product_id = products.id
+                      AND products.price = i.new_price
+                ''', (batch_id,))
+                reverted_count = cursor.rowcount
+                
+                cursor.execute('UPDATE price_change_batches SET reverted_at = CURRENT_TIMESTAMP WHERE id = ?',
+                               (batch_id,))
+                
+                conn.commit()
+                print(f"✅ Reverted price batch {batch_id}: {reverted_count} products")
+                return {
+                    'success': True,
+                    'batch_id': batch_id,
+                    'reverted_count': reverted_count,
+                    'skipped_count': batch[0] - reverted_count
+                }
+                
+            except Exception as e:
+                conn.rollback()
+                print(f"❌ Error reverting price batch {batch_id}: {e}")
+                return {'success': False, 'message': str(e)}
+
+    def get_price_change_batches(self, limit: int = 20) -> List[Dict]:
+        """Most recent bulk price batches, newest first"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute('''
+                    SELECT b.id, b.operation, b.value, b.rounding, b.product_count,
+                           b.created_at, b.reverted_at, u.full_name
+                    FROM price_change_batches b
+                    LEFT JOIN dashboard_users u ON b.created_by = u.id
+                    ORDER BY b.id DESC
+                    LIMIT ?
+                ''', (limit,))
+                
+                return [{
+                    'batch_id': row[0],
+                    'operation': row[1],
+                    'value': row[2],
+                    'rounding': row[3],
+                    'product_count': row[4],
+                    'created_at': row[5],
+                    'reverted_at': row[6],
+                    'created_by': row[7]
+                } for row in cursor.fetchall()]
+                
+            except Exception as e:
+                print(f"❌ Error getting price change batches: {e}")
+                return []
+
+    @invalidates('products')
     def delete_product(self, product_id: int) -> bool:
         """Delete a product and its variants"""
         with self.get_connection() as conn:
@@ -878,6 +1213,7 @@ class Database:
                 print(f"❌ Error deleting product: {e}")
                 return False
 
+    @cached('orders')
     def get_order_by_id(self, order_id: int) -> Dict:
         """Get order by ID"""
         with self.get_connection() as conn:
@@ -898,6 +1234,7 @@ class Database:
             
             return order_dict
     
+    @cached('options')
     def get_size_options(self) -> List[Dict]:
         """Get all available size options"""
         with self.get_connection() as conn:
@@ -906,6 +1243,7 @@ class Database:
             cursor.execute('SELECT * FROM size_options ORDER BY display_order')
             return [dict(row) for row in cursor.fetchall()]
     
+    @cached('options')
     def get_color_options(self) -> List[Dict]:
         """Get all available color options"""
         with self.get_connection() as conn:
@@ -915,130 +1253,114 @@ class Database:
             return [dict(row) for row in cursor.fetchall()]
 
     # Product retrieval methods - ENHANCED WITH OUT-OF-STOCK FILTERING
-    def get_all_products(self) -> Dict[str, List[Dict]]:
-        """Get all products organized by category - ONLY AVAILABLE VARIANTS"""
+    def get_all_products(self, compact: bool = False) -> Dict[str, List[Dict]]:
+        """Get all products organized by category - ONLY AVAILABLE VARIANTS
+        
+        compact=True returns slot-based ProductRecord/VariantRecord objects
+        (dict-compatible) instead of plain dicts, for long-lived catalogs.
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(CATALOG_QUERY)
+            
+            # ✅ Single pass: products indexed by id, empty products/categories never added
+            return build_catalog(cursor, compact=compact)
+
+    def get_products_by_ids(self, product_ids: List[int]) -> Dict[str, List[Dict]]:
+        """Catalog entries for just these products, organized like get_all_products"""
+        if not product_ids:
+            return {}
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(catalog_query_for(len(product_ids)), list(product_ids))
+            return build_catalog(cursor)
+
+    @cached('products')
+    def search_products(self, query: str, category: str = None, limit: int = 20,
+                        active_only: bool = True) -> List[Dict]:
+        """Products matching every word of query (as a prefix), best first.
+
+        Uses the products_fts index (migration 11): name, Arabic name,
+        description, model number, category and variant colors, with Arabic
+        letter variants and diacritics folded (product_search.fold).
+        """
+        match = match_query(query)
+        if not match:
+            return []
+        with self.get_connection() as conn:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.cursor()
+            weights = ', '.join(str(weight) for weight in SEARCH_WEIGHTS)
+            sql = f'''
+                SELECT p.id, p.name, p.arabic_name, p.model_number, p.price, p.is_active,
+                       c.name as category, c.arabic_name as category_arabic,
+                       bm25(products_fts, {weights}) as rank
+                FROM products_fts
+                JOIN products p ON p.id = products_fts.rowid
+                LEFT JOIN categories c ON c.id = p.category_id
+                WHERE products_fts MATCH ?
+            '''
+            params = [match]
+            if category:
+                sql += ' AND c.name = ?'
+                params.append(category)
+            if active_only:
+                sql += ' AND p.is_active = 1'
+            sql += ' ORDER BY rank LIMIT ?'
+            params.append(limit)
+            cursor.execute(sql, params)
+            return [dict(row) for row in cursor.fetchall()]
+
+    def rebuild_product_search_index(self):
+        """Re-index every product in products_fts"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            for sql in PRODUCT_SEARCH_REFRESH_SQL:
+                cursor.execute(sql.format(ids='SELECT id FROM products'))
+            cursor.execute('SELECT COUNT(*) FROM products_fts')
+            count = cursor.fetchone()[0]
+            conn.commit()
+            print(f"✅ Re-indexed {count} products for search")
+            return count
+
+    @cached('products')
+    def get_product_by_id(self, product_id: int) -> Dict:
+        """Get single product by ID with variants - ONLY AVAILABLE VARIANTS"""
         with self.get_connection() as conn:
             conn.row_factory = sqlite3.Row
             cursor = conn.cursor()
             
             cursor.execute('''
                 SELECT 
-                    c.name as category_name,
-                    c.arabic_name as category_arabic,
-                    p.id as product_id,
-                    p.name as product_name,
-                    p.arabic_name as product_arabic,
-                    p.price,
-                    p.description,
-                    p.arabic_description,
-                    p.model_number,
+                    p.*,
                     pv.id as variant_id,
                     pv.color,
                     pv.color_arabic,
                     pv.size,
                     pv.size_arabic,
                     pv.quantity,
-                    pv.image_path
+                    pv.image_path,
+                    c.name as category_name,
+                    c.arabic_name as category_arabic
                 FROM products p
-                JOIN categories c ON p.category_id = c.id
                 LEFT JOIN product_variants pv ON p.id = pv.product_id
-                WHERE p.is_active = 1
-                ORDER BY c.name, p.id, pv.color, pv.size
-            ''')
+                LEFT JOIN categories c ON p.category_id = c.id
+                WHERE p.id = ? AND p.is_active = 1
+            ''', (product_id,))
             
             results = cursor.fetchall()
-            products_by_category = {}
+            if not results:
+                return None
+            
+            product = None
+            variants = []
             
             for row in results:
-                category = row['category_name']
-                product_id = row['product_id']
-                
-                if category not in products_by_category:
-                    products_by_category[category] = []
-                
-                # Find or create product
-                product = None
-                for p in products_by_category[category]:
-                    if p['id'] == product_id:
-                        product = p
-                        break
-                
                 if not product:
                     product = {
-                        'id': product_id,
-                        'name': row['product_name'],
-                        'arabic_name': row['product_arabic'],
-                        'price': row['price'],
-                        'description': row['description'] or '',
-                        'arabic_description': row['arabic_description'] or '',
-                        'model_number': row['model_number'] or '',
-                        'category_arabic': row['category_arabic'],
-                        'variants': []
-                    }
-                    products_by_category[category].append(product)
-                
-                # ✅ FIXED: Only add variants with quantity > 0
-                if row['variant_id'] and row['quantity'] > 0:
-                    variant = {
-                        'id': row['variant_id'],
-                        'color': row['color'],
-                        'color_arabic': row['color_arabic'],
-                        'size': row['size'],
-                        'size_arabic': row['size_arabic'],
-                        'quantity': row['quantity'],
-                        'image_path': row['image_path']
-                    }
-                    product['variants'].append(variant)
-            
-            # ✅ FIXED: Remove products that have no available variants (completely out of stock)
-            for category in list(products_by_category.keys()):
-                products_by_category[category] = [
-                    product for product in products_by_category[category] 
-                    if product.get('variants') and len(product['variants']) > 0
-                ]
-                # Remove empty categories
-                if len(products_by_category[category]) == 0:
-                    del products_by_category[category]
-            
-            return products_by_category
-
-    def get_product_by_id(self, product_id: int) -> Dict:
-        """Get single product by ID with variants - ONLY AVAILABLE VARIANTS"""
-        with self.get_connection() as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                SELECT 
-                    p.*,
-                    pv.id as variant_id,
-                    pv.color,
-                    pv.color_arabic,
-                    pv.size,
-                    pv.size_arabic,
-                    pv.quantity,
-                    pv.image_path,
-                    c.name as category_name,
-                    c.arabic_name as category_arabic
-                FROM products p
-                LEFT JOIN product_variants pv ON p.id = pv.product_id
-                LEFT JOIN categories c ON p.category_id = c.id
-                WHERE p.id = ? AND p.is_active = 1
-            ''', (product_id,))
-            
-            results = cursor.fetchall()
-            if not results:
-                return None
-            
-            product = None
-            variants = []
-            
-            for row in results:
-                if not product:
-                    product = {
-                        'id': row['id'],
-                        'name': row['name'],
-                        'arabic_name': row['arabic_name'],
+                        'id': row['id'],
+                        'name': row['name'],
+                        'arabic_name': row['arabic_name'],
                         'price': row['price'],
                         'description': row['description'],
                         'arabic_description': row['arabic_description'],
@@ -1063,6 +1385,7 @@ class Database:
             
             return product
 
+    @cached('products')
     def get_color_image(self, product_id: int, color: str) -> str:
         """Get the image path for a specific color"""
         with self.get_connection() as conn:
@@ -1077,6 +1400,16 @@ class Database:
             return result[0] if result else None
 
     # ✅ FIXED: Enhanced inventory validation
+    def _stock_error(self, color: str, size: str, current_stock, quantity: int) -> Optional[str]:
+        """Arabic error message if `quantity` cannot be taken from current_stock (None = variant missing)"""
+        if current_stock is None:
+            return f'المنتج غير متوفر باللون {color} والمقاس {size}'
+        if current_stock <= 0:
+            return f'المنتج غير متوفر حالياً باللون {color} والمقاس {size}'
+        if current_stock < quantity:
+            return f'الكمية المطلوبة ({quantity}) تتجاوز المخزون المتاح ({current_stock}) للون {color} والمقاس {size}'
+        return None
+
     def check_inventory(self, product_id: int, color: str, size: str, quantity: int = 1) -> Dict:
         """Check if requested inventory is available with detailed validation"""
         with self.get_connection() as conn:
@@ -1087,37 +1420,13 @@ class Database:
             ''', (product_id, color, size))
             
             result = cursor.fetchone()
-            
-            if not result:
-                return {
-                    'available': False,
-                    'message': f'المنتج غير متوفر باللون {color} والمقاس {size}',
-                    'current_stock': 0,
-                    'requested': quantity
-                }
-            
-            current_stock = result[0]
-            
-            if current_stock <= 0:
-                return {
-                    'available': False,
-                    'message': f'المنتج غير متوفر حالياً باللون {color} والمقاس {size}',
-                    'current_stock': current_stock,
-                    'requested': quantity
-                }
-            
-            if current_stock < quantity:
-                return {
-                    'available': False,
-                    'message': f'الكمية المطلوبة ({quantity}) تتجاوز المخزون المتاح ({current_stock}) للون {color} والمقاس {size}',
-                    'current_stock': current_stock,
-                    'requested': quantity
-                }
+            current_stock = result[0] if result else None
+            message = self._stock_error(color, size, current_stock, quantity)
             
             return {
-                'available': True,
-                'message': 'الكمية متاحة',
-                'current_stock': current_stock,
+                'available': message is None,
+                'message': message or 'الكمية متاحة',
+                'current_stock': current_stock or 0,
                 'requested': quantity
             }
 
@@ -1133,6 +1442,7 @@ class Database:
             result = cursor.fetchone()
             return result[0] if result else None
 
+    @invalidates('products')
     def update_variant_quantity(self, product_id: int, color: str, size: str, 
                                new_quantity: int, reason: str = "manual_update") -> bool:
         """Update quantity for a specific variant with history tracking"""
@@ -1177,44 +1487,191 @@ class Database:
                 print(f"❌ Error updating variant quantity: {e}")
                 return False
 
+    @invalidates('products')
+    def bulk_adjust_stock(self, ops: List[Dict], reason: str = "bulk_update",
+                          staff_user_id: int = None, ip_address: str = None,
+                          user_agent: str = None) -> Dict:
+        """Apply set/add/subtract to many variants in one transaction
+        
+        ops: [{'product_id', 'color', 'size', 'operation', 'value'}]
+        Every changed variant gets an inventory_history row and, when
+        staff_user_id is given, a staff activity log row. Returns
+        {'success', 'updated_count', 'results'} with one result per op.
+        """
+        results = []
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            try:
+                if not conn.in_transaction:
+                    conn.execute('BEGIN IMMEDIATE')
+                
+                # ✅ One lookup for every requested variant
+                keys = [[int(op['product_id']), op['color'], op['size']] for op in ops]
+                cursor.execute('''
+                    SELECT pv.product_id, pv.color, pv.size, pv.id, pv.quantity, p.name
+                    FROM json_each(?) j
+                    JOIN product_variants pv 
+                        ON pv.product_id = json_extract(j.value, '$[0]')
+                       AND pv.color = json_extract(j.value, '$[1]')
+                       AND pv.size = json_extract(j.value, '$[2]')
+                    JOIN products p ON p.id = pv.product_id
+                ''', (json.dumps(keys),))
+                variants = {(row[0], row[1], row[2]): list(row[3:]) for row in cursor.fetchall()}
+                
+                updates, history, logs = {}, [], []
+                for op, key in zip(ops, keys):
+                    key = tuple(key)
+                    operation = op.get('operation', 'set')
+                    value = int(op.get('value', 0))
+                    result = {'product_id': key[0], 'color': key[1], 'size': key[2], 'success': False}
+                    results.append(result)
+                    
+                    variant = variants.get(key)
+                    if variant is None:
+                        result['message'] = 'المتغير غير موجود'
+                        continue
+                    
+                    variant_id, old_quantity, product_name = variant
+                    if operation == 'set':
+                        new_quantity = value
+                    elif operation == 'add':
+                        new_quantity = old_quantity + value
+                    elif operation == 'subtract':
+                        new_quantity = max(0, old_quantity - value)
+                    else:
+                        result['message'] = f'عملية غير معروفة: {operation}'
+                        continue
+                    
+                    # Later ops on the same variant see this one's result
+                    variant[1] = new_quantity
+                    updates[variant_id] = new_quantity
+                    history.append((key[0], variant_id, old_quantity, new_quantity,
+                                    new_quantity - old_quantity, reason))
+                    logs.append((
+                        f'تحديث جماعي للمخزون: {product_name} ({key[1]}, {key[2]}) - العملية: {operation} - من {old_quantity} إلى {new_quantity}',
+                        key[0], f"{product_name} - {key[1]} - {key[2]}",
+                        f"Quantity: {old_quantity}, Operation: {operation}",
+                        f"Quantity: {new_quantity}, Value: {value}"
+                    ))
+                    result.update(success=True, old_quantity=old_quantity, new_quantity=new_quantity)
+                
+                cursor.executemany('''
+                    UPDATE product_variants 
+                    SET quantity = ?, updated_at = CURRENT_TIMESTAMP
+                    WHERE id = ?
+                ''', [(quantity, variant_id) for variant_id, quantity in updates.items()])
+                
+                cursor.executemany('''
+                    INSERT INTO inventory_history 
+                    (product_id, variant_id, change_type, old_quantity, new_quantity, change_amount, reason)
+                    VALUES (?, ?, 'adjustment', ?, ?, ?, ?)
+                ''', history)
+                
+                if staff_user_id and logs:
+                    cursor.execute('SELECT username, full_name FROM dashboard_users WHERE id = ?', (staff_user_id,))
+                    user = cursor.fetchone() or ('', '')
+                    cursor.executemany('''
+                        INSERT INTO staff_activity_logs 
+                        (user_id, username, full_name, action_type, action_description, 
+                         target_type, target_id, target_name, old_value, new_value, 
+                         ip_address, user_agent)
+                        VALUES (?, ?, ?, 'inventory_bulk_update', ?, 'product_variant', ?, ?, ?, ?, ?, ?)
+                    ''', [(staff_user_id, user[0], user[1]) + log + (ip_address, user_agent) for log in logs])
+                
+                conn.commit()
+                updated_count = len(history)
+                print(f"✅ Bulk stock adjustment: {updated_count}/{len(ops)} variants updated")
+                return {'success': True, 'updated_count': updated_count, 'results': results}
+                
+            except Exception as e:
+                conn.rollback()
+                print(f"❌ Error in bulk stock adjustment: {e}")
+                return {'success': False, 'updated_count': 0, 'message': str(e), 'results': []}
+
     # ✅ FIXED: Order creation with enhanced inventory validation AND LOCATION
+    @invalidates('products', 'orders')
     def create_order(self, user_id: int, user_name: str, user_phone: str, 
                     user_address: str, user_state: str, user_region: str,
                     username: str, items: List[Dict], 
                     total_amount: float, notes: str = None) -> Dict:
-        """Create a new order with comprehensive inventory validation AND LOCATION"""
-        with self.get_connection() as conn:
+        """Create a new order with comprehensive inventory validation AND LOCATION
+        
+        Stock is reserved atomically: one BEGIN IMMEDIATE transaction resolves
+        every variant of the cart in a single query, validates it, decrements
+        with `quantity >= ?` guards and rolls everything back if any of them
+        fails, so parallel checkouts can never oversell.
+        """
+        conn = self.get_connection()
+        with conn:
             cursor = conn.cursor()
             
             try:
                 print(f"🔄 Creating order for user: {user_name}, State: {user_state}, Region: {user_region}")
                 
+                # Take the write lock up front (the writer queue already holds it)
+                if not conn.in_transaction:
+                    cursor.execute('BEGIN IMMEDIATE')
+                
+                # ✅ Quantity requested per variant (color/size items only)
+                requested = {}
+                for item in items:
+                    if item.get('color') and item.get('size'):
+                        key = (item['product_id'], item['color'], item['size'])
+                        if key not in requested:
+                            requested[key] = {'name': item['name'], 'quantity': 0}
+                        requested[key]['quantity'] += item['quantity']
+                
+                # ✅ Resolve ids and stock for the whole cart in one query
+                variants = {}
+                if requested:
+                    placeholders = ', '.join(['(?, ?, ?)'] * len(requested))
+                    params = [value for key in requested for value in key]
+                    cursor.execute(f'''
+                        SELECT product_id, color, size, id, quantity FROM product_variants
+                        WHERE (product_id, color, size) IN (VALUES {placeholders})
+                    ''', params)
+                    variants = {(row[0], row[1], row[2]): (row[3], row[4]) for row in cursor.fetchall()}
+                
                 # ✅ Validate inventory for ALL items before processing
                 inventory_errors = []
-                for item in items:
-                    product_id = item['product_id']
-                    color = item.get('color')
-                    size = item.get('size')
-                    quantity = item['quantity']
-                    
-                    if color and size:  # Only validate variants with color/size
-                        inventory_check = self.check_inventory(product_id, color, size, quantity)
-                        if not inventory_check['available']:
-                            inventory_errors.append({
-                                'product': item['name'],
-                                'color': color,
-                                'size': size,
-                                'message': inventory_check['message']
-                            })
+                for key, request in requested.items():
+                    variant_id, current_stock = variants.get(key, (None, None))
+                    message = self._stock_error(key[1], key[2], current_stock, request['quantity'])
+                    if message:
+                        inventory_errors.append({
+                            'product': request['name'],
+                            'color': key[1],
+                            'size': key[2],
+                            'message': message
+                        })
                 
                 # If any inventory errors, return them without creating order
                 if inventory_errors:
+                    conn.rollback()
                     return {
                         'success': False,
                         'order_id': None,
                         'errors': inventory_errors
                     }
                 
+                # ✅ Conditional decrements: every guarded UPDATE must hit its row
+                decrements = [(request['quantity'], variants[key][0], request['quantity'])
+                              for key, request in requested.items()]
+                if decrements:
+                    cursor.executemany('''
+                        UPDATE product_variants 
+                        SET quantity = quantity - ?, updated_at = CURRENT_TIMESTAMP
+                        WHERE id = ? AND quantity >= ?
+                    ''', decrements)
+                    if cursor.rowcount != len(decrements):
+                        conn.rollback()
+                        print(f"❌ Stock changed while creating order for {user_name}, rolled back")
+                        return {
+                            'success': False,
+                            'order_id': None,
+                            'errors': [{'message': 'تغير المخزون أثناء تنفيذ الطلب، يرجى المحاولة مرة أخرى'}]
+                        }
+                
                 # Create order WITH LOCATION FIELDS - FIXED QUERY
                 cursor.execute('''
                     INSERT INTO orders 
@@ -1224,58 +1681,43 @@ class Database:
                 
                 order_id = cursor.lastrowid
                 
-                # Add order items and update inventory
+                # Add order items in one batch
+                order_items = []
                 for item in items:
-                    variant_id = None
-                    if item.get('color') and item.get('size'):
-                        variant_id = self.get_variant_id(item['product_id'], item.get('color'), item.get('size'))
-                    
-                    cursor.execute('''
-                        INSERT INTO order_items 
-                        (order_id, product_id, variant_id, product_name, price, quantity, color, size)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                    ''', (order_id, item['product_id'], variant_id, item['name'], 
-                          item['price'], item['quantity'], item.get('color'), item.get('size')))
-                    
-                    # Update inventory and record history
-                    if variant_id:
-                        # Get current quantity
-                        cursor.execute('SELECT quantity FROM product_variants WHERE id = ?', (variant_id,))
-                        result = cursor.fetchone()
-                        if result:
-                            current_qty = result[0]
-                            new_qty = current_qty - item['quantity']
-                            
-                            cursor.execute('''
-                                UPDATE product_variants 
-                                SET quantity = ?, updated_at = CURRENT_TIMESTAMP
-                                WHERE id = ? AND quantity >= ?
-                            ''', (new_qty, variant_id, item['quantity']))
-                            
-                            # Record inventory history for sale
-                            cursor.execute('''
-                                INSERT INTO inventory_history 
-                                (product_id, variant_id, change_type, old_quantity, new_quantity, change_amount, reason)
-                                VALUES (?, ?, 'sale', ?, ?, ?, ?)
-                            ''', (item['product_id'], variant_id, current_qty, new_qty, -item['quantity'], f'Order #{order_id}'))
+                    variant = variants.get((item['product_id'], item.get('color'), item.get('size')))
+                    order_items.append((order_id, item['product_id'], variant[0] if variant else None,
+                                        item['name'], item['price'], item['quantity'],
+                                        item.get('color'), item.get('size')))
+                cursor.executemany('''
+                    INSERT INTO order_items 
+                    (order_id, product_id, variant_id, product_name, price, quantity, color, size)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ''', order_items)
+                
+                # Record inventory history for the sale
+                history = []
+                for key, request in requested.items():
+                    variant_id, old_qty = variants[key]
+                    history.append((key[0], variant_id, old_qty, old_qty - request['quantity'],
+                                    -request['quantity'], f'Order #{order_id}'))
+                cursor.executemany('''
+                    INSERT INTO inventory_history 
+                    (product_id, variant_id, change_type, old_quantity, new_quantity, change_amount, reason)
+                    VALUES (?, ?, 'sale', ?, ?, ?, ?)
+                ''', history)
+                
+                first_name = user_name.split(' ')[0] if user_name else ''
+                last_name = ' '.join(user_name.split(' ')[1:]) if user_name and ' ' in user_name else ''
                 
                 # ✅ NEW: Mark user as buyer in bot_users table with phone number
                 cursor.execute('''
                     INSERT OR REPLACE INTO bot_users 
                     (telegram_id, username, first_name, last_name, phone, has_placed_order, last_active)
                     VALUES (?, ?, ?, ?, ?, 1, CURRENT_TIMESTAMP)
-                ''', (user_id, username, user_name.split(' ')[0] if user_name else '', 
-                      ' '.join(user_name.split(' ')[1:]) if user_name and ' ' in user_name else '', 
-                      user_phone))
+                ''', (user_id, username, first_name, last_name, user_phone))
                 
                 # ✅ NEW: Also update customers table with phone number
-                cursor.execute('''
-                    INSERT OR REPLACE INTO customers 
-                    (telegram_id, username, first_name, last_name, phone, last_active)
-                    VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
-                ''', (user_id, username, user_name.split(' ')[0] if user_name else '', 
-                      ' '.join(user_name.split(' ')[1:]) if user_name and ' ' in user_name else '', 
-                      user_phone))
+                cursor.execute(CUSTOMER_UPSERT_SQL, (user_id, username, first_name, last_name, user_phone))
                 
                 conn.commit()
                 print(f"✅ Created order: #{order_id} for user {user_name} in {user_state}, {user_region}")
@@ -1296,9 +1738,11 @@ class Database:
                     'errors': [{'message': f'خطأ في النظام: {str(e)}'}]
                 }
 
+    @invalidates('products', 'orders')
     def cancel_order(self, order_id: int) -> bool:
         """Cancel an order and RESTORE inventory quantities"""
         with self.get_connection() as conn:
+            conn.row_factory = sqlite3.Row
             cursor = conn.cursor()
             
             try:
@@ -1359,24 +1803,193 @@ class Database:
                 print(f"❌ Error cancelling order: {e}")
                 return False
 
-    def get_orders(self) -> List[Dict]:
-        """Get all orders with items - FIXED: Sort by ID DESC (newest first)"""
+    def _attach_order_items(self, cursor, orders: List[Dict]) -> List[Dict]:
+        """Attach 'items' to each order dict with batched IN-list queries instead of one query per order"""
+        items_by_order = {order['id']: [] for order in orders}
+        if not items_by_order:
+            return orders
+        
+        try:
+            batch_size = cursor.connection.getlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER)
+        except (AttributeError, sqlite3.Error):
+            batch_size = 999
+        
+        order_ids = list(items_by_order)
+        for start in range(0, len(order_ids), batch_size):
+            batch = order_ids[start:start + batch_size]
+            placeholders = ','.join('?' * len(batch))
+            cursor.execute(f'''
+                SELECT * FROM order_items WHERE order_id IN ({placeholders}) ORDER BY order_id, id
+            ''', batch)
+            for row in cursor.fetchall():
+                item = dict(row)
+                items_by_order[item['order_id']].append(item)
+        
+        for order in orders:
+            order['items'] = items_by_order[order['id']]
+        return orders
+
+    def get_orders(self, user_id: int = None, limit: int = None, offset: int = 0) -> List[Dict]:
+        """Get orders with items, newest first (optionally one user's orders / one page)"""
         with self.get_connection() as conn:
             conn.row_factory = sqlite3.Row
             cursor = conn.cursor()
             
+            query = 'SELECT * FROM orders'
+            params = []
+            if user_id is not None:
+                query += ' WHERE user_id = ?'
+                params.append(user_id)
+            
             # FIXED: Changed from order_date DESC to id DESC for proper newest-first sorting
-            cursor.execute('SELECT * FROM orders ORDER BY id DESC')
+            query += ' ORDER BY id DESC'
+            if limit is not None:
+                query += ' LIMIT ? OFFSET ?'
+                params.extend([limit, offset])
+            
+            cursor.execute(query, params)
             orders = [dict(row) for row in cursor.fetchall()]
             
-            # Get order items for each order
-            for order in orders:
-                cursor.execute('''
-                    SELECT * FROM order_items WHERE order_id = ?
-                ''', (order['id'],))
-                order['items'] = [dict(row) for row in cursor.fetchall()]
+            return self._attach_order_items(cursor, orders)
+
+    def _build_order_filters(self, filters: Dict) -> tuple:
+        """Translate an order filters dict into a WHERE clause and its parameters"""
+        conditions = []
+        params = []
+        filters = filters or {}
+        
+        if filters.get('order_id') is not None:
+            conditions.append('id = ?')
+            params.append(filters['order_id'])
+        if filters.get('user_id') is not None:
+            conditions.append('user_id = ?')
+            params.append(filters['user_id'])
+        if filters.get('status') and filters['status'] != 'all':
+            codes = STATUS_FILTERS.get(str(filters['status']).lower())
+            if codes:
+                conditions.append(f'status_code IN {codes_sql(codes)}')
+            else:
+                conditions.append('status = ? COLLATE NOCASE')
+                params.append(filters['status'])
+        if filters.get('state') and filters['state'] != 'all':
+            conditions.append('user_state = ? COLLATE NOCASE')
+            params.append(filters['state'])
+        if filters.get('region') and filters['region'] != 'all':
+            conditions.append('user_region = ? COLLATE NOCASE')
+            params.append(filters['region'])
+        # Compare the raw column so the order_date index stays usable
+        if filters.get('start_date'):
+            conditions.append('order_date >= date(?)')
+            params.append(filters['start_date'])
+        if filters.get('end_date'):
+            conditions.append("order_date < date(?, '+1 day')")
+            params.append(filters['end_date'])
+        
+        where = ' AND '.join(conditions) if conditions else '1=1'
+        return where, params
+
+    def query_orders(self, filters: Dict = None, cursor: int = None, limit: int = 50,
+                     direction: str = 'older', include_items: bool = True) -> Dict:
+        """Get one page of filtered orders (newest first) using keyset pagination on id
+        
+        filters: status, state, region, order_id, user_id, start_date, end_date
+        cursor: order id to page from - 'older' returns ids below it, 'newer' ids above it
+        """
+        where, params = self._build_order_filters(filters)
+        
+        with self.get_connection() as conn:
+            conn.row_factory = sqlite3.Row
+            db_cursor = conn.cursor()
+            
+            page_where = where
+            page_params = list(params)
+            if cursor is not None:
+                page_where += ' AND id < ?' if direction == 'older' else ' AND id > ?'
+                page_params.append(cursor)
+            
+            order_by = 'id DESC' if direction == 'older' else 'id ASC'
+            # Fetch one extra row to know whether another page exists
+            db_cursor.execute(f'''
+                SELECT * FROM orders WHERE {page_where} ORDER BY {order_by} LIMIT ?
+            ''', page_params + [limit + 1])
+            orders = [dict(row) for row in db_cursor.fetchall()]
+            
+            has_more = len(orders) > limit
+            if direction != 'older' and not has_more:
+                # Paging back reached the newest orders - serve a full first page
+                return self.query_orders(filters, None, limit, 'older', include_items)
+            orders = orders[:limit]
+            if direction != 'older':
+                orders.reverse()
+            
+            if include_items:
+                self._attach_order_items(db_cursor, orders)
+            
+            # Totals for the whole filtered set come from one aggregate query
+            db_cursor.execute(f'''
+                SELECT 
+                    COUNT(*) as total_orders,
+                    SUM(CASE WHEN status_code = {PENDING} THEN 1 ELSE 0 END) as pending_orders,
+                    SUM(CASE WHEN status_code IN {codes_sql(FULFILLED_CODES)} THEN 1 ELSE 0 END) as completed_orders,
+                    SUM(total_amount) as total_revenue
+                FROM orders WHERE {where}
+            ''', params)
+            totals = dict(db_cursor.fetchone())
+            
+            if direction == 'older':
+                has_older, has_newer = has_more, cursor is not None
+            else:
+                has_older, has_newer = bool(orders), has_more
             
-            return orders
+            return {
+                'orders': orders,
+                'next_cursor': orders[-1]['id'] if orders and has_older else None,
+                'prev_cursor': orders[0]['id'] if orders and has_newer else None,
+                'stats': {
+                    'total_orders': totals['total_orders'] or 0,
+                    'pending_orders': totals['pending_orders'] or 0,
+                    'completed_orders': totals['completed_orders'] or 0,
+                    'total_revenue': totals['total_revenue'] or 0
+                }
+            }
+
+    def get_order_locations(self) -> Dict[str, List[str]]:
+        """Get distinct order states and regions for filter dropdowns"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT DISTINCT user_state FROM orders 
+                WHERE user_state IS NOT NULL AND user_state != '' 
+                ORDER BY user_state
+            ''')
+            states = [row[0] for row in cursor.fetchall()]
+            cursor.execute('''
+                SELECT DISTINCT user_region FROM orders 
+                WHERE user_region IS NOT NULL AND user_region != '' 
+                ORDER BY user_region
+            ''')
+            regions = [row[0] for row in cursor.fetchall()]
+            return {'states': states, 'regions': regions}
+
+    def get_order_stats(self) -> Dict:
+        """Order counts and fulfilled revenue for the dashboard stat cards"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                SELECT 
+                    COUNT(*),
+                    SUM(CASE WHEN status_code = {PENDING} THEN 1 ELSE 0 END),
+                    SUM(CASE WHEN status_code IN {codes_sql(FULFILLED_CODES)} THEN 1 ELSE 0 END),
+                    SUM(CASE WHEN status_code IN {codes_sql(FULFILLED_CODES)} THEN total_amount ELSE 0 END)
+                FROM orders
+            ''')
+            total_orders, pending_orders, completed_orders, total_revenue = cursor.fetchone()
+            return {
+                'total_orders': total_orders or 0,
+                'pending_orders': pending_orders or 0,
+                'completed_orders': completed_orders or 0,
+                'total_revenue': total_revenue or 0
+            }
 
     def get_order_status(self, order_id: int) -> str:
         """Get current status of an order"""
@@ -1386,6 +1999,7 @@ class Database:
             result = cursor.fetchone()
             return result[0] if result else None
 
+    @invalidates('orders')
     def update_order_status(self, order_id: int, new_status: str) -> bool:
         """Update order status (pending → confirmed → shipped → completed)"""
         with self.get_connection() as conn:
@@ -1463,6 +2077,7 @@ class Database:
             return stats
         
     # ✅ FIXED: Delete order with PROPER status checking and inventory restoration
+    @invalidates('products', 'orders')
     def delete_order(self, order_id: int) -> Dict:
         """Delete an order with status validation and inventory restoration"""
         with self.get_connection() as conn:
@@ -1592,22 +2207,75 @@ class Database:
                     'can_delete': False
                 }
 
-    def get_sales_analytics(self, days: int = 30) -> Dict:
-        """Get sales analytics for the specified period"""
+    @staticmethod
+    def _rollup_since(days: int) -> str:
+        """First sales_daily day of a trailing `days`-day window (UTC, like CURRENT_TIMESTAMP)"""
+        return (datetime.now(timezone.utc) - timedelta(days=days)).strftime('%Y-%m-%d')
+
+    def get_sales_summary(self, start_date: str = None, end_date: str = None,
+                          buckets: List[str] = None, days: int = None) -> Dict:
+        """Order count and revenue between two dates (inclusive) from sales_daily
+
+        days: trailing window to use instead of start_date
+        buckets: status buckets to include ('delivered', 'open', 'cancelled'), all when None
+        """
+        if days is not None:
+            start_date = self._rollup_since(days)
+        where, params = 'product_id = 0 AND day >= date(?)', [start_date]
+        if end_date:
+            where += ' AND day <= date(?)'
+            params.append(end_date)
+        if buckets:
+            where += f" AND status_bucket IN ({', '.join('?' * len(buckets))})"
+            params.extend(buckets)
+        
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                SELECT SUM(order_count), SUM(revenue) FROM sales_daily WHERE {where}
+            ''', params)
+            total_orders, total_revenue = cursor.fetchone()
+            total_orders = total_orders or 0
+            total_revenue = total_revenue or 0
+            return {
+                'total_orders': total_orders,
+                'total_revenue': total_revenue,
+                'average_order_value': total_revenue / total_orders if total_orders else None
+            }
+
+    def get_variant_sales(self, days: int = 30, limit: int = None) -> List[Dict]:
+        """Units sold and revenue per product variant over the last `days` days, best sellers first"""
         with self.get_connection() as conn:
             conn.row_factory = sqlite3.Row
             cursor = conn.cursor()
-            
             cursor.execute('''
                 SELECT 
-                    COUNT(*) as total_orders,
-                    SUM(total_amount) as total_revenue,
-                    AVG(total_amount) as average_order_value
-                FROM orders 
-                WHERE order_date >= datetime('now', ?)
-            ''', (f'-{days} days',))
-            
-            sales_stats = dict(cursor.fetchone())
+                    sd.product_id,
+                    p.name,
+                    p.arabic_name,
+                    p.model_number,
+                    sd.color,
+                    sd.size,
+                    SUM(sd.quantity) as total_sold,
+                    SUM(sd.revenue) as total_revenue
+                FROM sales_daily sd
+                JOIN products p ON p.id = sd.product_id
+                WHERE sd.day >= ? AND sd.product_id > 0
+                GROUP BY sd.product_id, sd.color, sd.size
+                HAVING SUM(sd.order_count) > 0
+                ORDER BY total_sold DESC
+                LIMIT ?
+            ''', (self._rollup_since(days), limit if limit is not None else -1))
+            return [dict(row) for row in cursor.fetchall()]
+
+    def get_sales_analytics(self, days: int = 30) -> Dict:
+        """Get sales analytics for the specified period (from the sales_daily rollup)"""
+        since = self._rollup_since(days)
+        sales_stats = self.get_sales_summary(since)
+        
+        with self.get_connection() as conn:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.cursor()
             
             # Top selling products
             cursor.execute('''
@@ -1615,21 +2283,37 @@ class Database:
                     p.name,
                     p.arabic_name,
                     p.model_number,
-                    SUM(oi.quantity) as total_sold,
-                    SUM(oi.quantity * oi.price) as total_revenue
-                FROM order_items oi
-                JOIN products p ON oi.product_id = p.id
-                JOIN orders o ON oi.order_id = o.id
-                WHERE o.order_date >= datetime('now', ?)
+                    SUM(sd.quantity) as total_sold,
+                    SUM(sd.revenue) as total_revenue
+                FROM sales_daily sd
+                JOIN products p ON sd.product_id = p.id
+                WHERE sd.day >= ? AND sd.product_id > 0
                 GROUP BY p.id, p.name
                 ORDER BY total_sold DESC
                 LIMIT 10
-            ''', (f'-{days} days',))
+            ''', (since,))
             
             sales_stats['top_products'] = [dict(row) for row in cursor.fetchall()]
             
             return sales_stats
 
+    def rebuild_sales_daily(self) -> int:
+        """Recompute the sales_daily rollup from orders and order_items, returns the row count"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            try:
+                for sql in SALES_DAILY_REBUILD_SQL:
+                    cursor.execute(sql)
+                cursor.execute('SELECT COUNT(*) FROM sales_daily')
+                rows = cursor.fetchone()[0]
+                conn.commit()
+                print(f"✅ Rebuilt sales_daily: {rows} rows")
+                return rows
+            except Exception as e:
+                conn.rollback()
+                print(f"❌ Error rebuilding sales_daily: {e}")
+                return 0
+
     def get_customer_orders_summary(self, telegram_id: int) -> Dict:
         """Get customer orders summary"""
         with self.get_connection() as conn:
@@ -1705,8 +2389,13 @@ class Database:
             
             return [dict(row) for row in cursor.fetchall()]
 
-    def get_products_performance(self) -> List[Dict]:
-        """Get products performance data for reports - INCLUDING SOLD-OUT PRODUCTS"""
+    @snapshot_read
+    def get_products_performance(self, include_variants: bool = False) -> List[Dict]:
+        """Get products performance data for reports - INCLUDING SOLD-OUT PRODUCTS
+
+        Sales come from product_sales_summary (non-cancelled orders).
+        include_variants adds a 'variant_sales' breakdown to every product.
+        """
         with self.get_connection() as conn:
             conn.row_factory = sqlite3.Row
             cursor = conn.cursor()
@@ -1718,20 +2407,23 @@ class Database:
                     p.model_number,
                     p.price,
                     c.name as category,
-                    SUM(pv.quantity) as current_stock,
-                    (SELECT SUM(oi.quantity) 
-                    FROM order_items oi 
-                    JOIN orders o ON oi.order_id = o.id 
-                    WHERE oi.product_id = p.id) as total_sold,
-                    (SELECT SUM(oi.quantity * oi.price) 
-                    FROM order_items oi 
-                    JOIN orders o ON oi.order_id = o.id 
-                    WHERE oi.product_id = p.id) as total_revenue
+                    (SELECT SUM(pv.quantity) FROM product_variants pv WHERE pv.product_id = p.id) as current_stock,
+                    COALESCE(s.total_sold, 0) as total_sold,
+                    COALESCE(s.total_revenue, 0) as total_revenue,
+                    s.first_sale,
+                    s.last_sale
                 FROM products p
                 JOIN categories c ON p.category_id = c.id
-                LEFT JOIN product_variants pv ON p.id = pv.product_id
+                LEFT JOIN (
+                    SELECT product_id, 
+                           SUM(total_sold) as total_sold, 
+                           SUM(total_revenue) as total_revenue,
+                           MIN(first_sale) as first_sale,
+                           MAX(last_sale) as last_sale
+                    FROM product_sales_summary
+                    GROUP BY product_id
+                ) s ON s.product_id = p.id
                 WHERE p.is_active = 1
-                GROUP BY p.id
                 ORDER BY total_revenue DESC
             ''')
             
@@ -1750,139 +2442,183 @@ class Database:
                 if total_sold > 0 or current_stock > 0:
                     results.append(row_dict)
             
+            if include_variants:
+                cursor.execute('''
+                    SELECT * FROM product_sales_summary 
+                    WHERE total_sold != 0 
+                    ORDER BY product_id, total_sold DESC
+                ''')
+                breakdown = {}
+                for row in cursor.fetchall():
+                    breakdown.setdefault(row['product_id'], []).append(dict(row))
+                for row_dict in results:
+                    row_dict['variant_sales'] = breakdown.get(row_dict['id'], [])
+            
             return results
+
+    def rebuild_product_sales_summary(self) -> int:
+        """Recompute product_sales_summary from order history, returns the row count"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute('DELETE FROM product_sales_summary')
+                cursor.execute(REBUILD_PRODUCT_SALES_SQL)
+                cursor.execute('SELECT COUNT(*) FROM product_sales_summary')
+                rows = cursor.fetchone()[0]
+                conn.commit()
+                print(f"✅ Rebuilt product_sales_summary: {rows} rows")
+                return rows
+            except Exception as e:
+                conn.rollback()
+                print(f"❌ Error rebuilding product_sales_summary: {e}")
+                return 0
+
+    def verify_product_sales_summary(self) -> List[Dict]:
+        """Compare product_sales_summary with a fresh aggregate of order history
+
+        Returns one dict per drifted variant with the stored and expected values;
+        an empty list means the summary is consistent.
+        """
+        with self.get_connection() as conn:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                WITH expected AS (
+                    SELECT oi.product_id, COALESCE(oi.color, '') as color, COALESCE(oi.size, '') as size,
+                           SUM(oi.quantity) as total_sold, SUM(oi.quantity * oi.price) as total_revenue,
+                           MIN(o.order_date) as first_sale, MAX(o.order_date) as last_sale
+                    FROM order_items oi
+                    JOIN orders o ON o.id = oi.order_id AND o.status_code != {CANCELLED}
+                    GROUP BY 1, 2, 3
+                ),
+                keys AS (
+                    SELECT product_id, color, size FROM expected
+                    UNION
+                    SELECT product_id, color, size FROM product_sales_summary WHERE total_sold != 0 OR total_revenue != 0
+                )
+                SELECT k.product_id, k.color, k.size,
+                       s.total_sold as stored_sold, e.total_sold as expected_sold,
+                       s.total_revenue as stored_revenue, e.total_revenue as expected_revenue,
+                       s.first_sale as stored_first_sale, e.first_sale as expected_first_sale,
+                       s.last_sale as stored_last_sale, e.last_sale as expected_last_sale
+                FROM keys k
+                LEFT JOIN expected e USING (product_id, color, size)
+                LEFT JOIN product_sales_summary s USING (product_id, color, size)
+                WHERE COALESCE(s.total_sold, 0) != COALESCE(e.total_sold, 0)
+                   OR ABS(COALESCE(s.total_revenue, 0) - COALESCE(e.total_revenue, 0)) > 0.005
+                   OR s.first_sale IS NOT e.first_sale
+                   OR s.last_sale IS NOT e.last_sale
+                ORDER BY k.product_id, k.color, k.size
+            ''')
+            return [dict(row) for row in cursor.fetchall()]
         
 
     #Add Delivered Orders Methods    
+    @snapshot_read
     def get_delivered_orders_by_date_range(self, start_date, end_date):
         """Get delivered orders between two dates - ONLY delivered status"""
         with self.get_connection() as conn:
             conn.row_factory = sqlite3.Row
             cursor = conn.cursor()
             
-            # Define delivered statuses in both Arabic and English
-            delivered_statuses = ['تم التوصيل', 'delivered', 'مكتمل', 'completed']
-            
-            # Build status condition
-            status_conditions = " OR ".join([f"status LIKE '%{status}%'" for status in delivered_statuses])
-            
+            # Range scans on idx_orders_status_code_date
             cursor.execute(f'''
                 SELECT * FROM orders 
-                WHERE ({status_conditions}) 
-                AND date(order_date) BETWEEN date(?) AND date(?)
+                WHERE status_code IN {codes_sql(DELIVERED_CODES)}
+                AND order_date >= date(?) AND order_date < date(?, '+1 day')
                 ORDER BY order_date DESC
             ''', (start_date, end_date))
             
             orders = [dict(row) for row in cursor.fetchall()]
             
-            # Get order items for each order
-            for order in orders:
-                cursor.execute('SELECT * FROM order_items WHERE order_id = ?', (order['id'],))
-                order['items'] = [dict(row) for row in cursor.fetchall()]
-            
-            return orders
+            return self._attach_order_items(cursor, orders)
 
     def get_delivered_revenue_by_date_range(self, start_date, end_date):
         """Calculate total revenue from delivered orders in date range"""
-        with self.get_connection() as conn:
-            cursor = conn.cursor()
-            
-            # Define delivered statuses
-            delivered_statuses = ['تم التوصيل', 'delivered', 'مكتمل', 'completed']
-            status_conditions = " OR ".join([f"status LIKE '%{status}%'" for status in delivered_statuses])
-            
-            cursor.execute(f'''
-                SELECT SUM(total_amount) as total_revenue 
-                FROM orders 
-                WHERE ({status_conditions}) 
-                AND date(order_date) BETWEEN date(?) AND date(?)
-            ''', (start_date, end_date))
-            
-            result = cursor.fetchone()
-            return result[0] if result and result[0] else 0
+        return self.get_sales_summary(start_date, end_date, ['delivered'])['total_revenue']
 
     # ✅ NEW: Staff Activity Logging Methods
     def log_staff_activity(self, user_id: int, action_type: str, action_description: str,
                           target_type: str = None, target_id: int = None, target_name: str = None,
                           old_value: str = None, new_value: str = None, ip_address: str = None,
                           user_agent: str = None):
-        """Log staff activity in the dashboard"""
+        """Log staff activity in the dashboard (buffered, written in batches)"""
+        self.staff_logs.log((user_id, action_type, action_description, target_type, target_id,
+                             target_name, old_value, new_value, ip_address, user_agent,
+                             self._log_timestamp()))
+        return True
+
+    @staticmethod
+    def _log_timestamp():
+        """created_at of a buffered event, in CURRENT_TIMESTAMP format (UTC)"""
+        return datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+    def _load_staff_names(self, user_ids):
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            placeholders = ', '.join('?' * len(user_ids))
+            cursor.execute(f'''
+                SELECT id, username, full_name
+                FROM dashboard_users
+                WHERE id IN ({placeholders})
+            ''', list(user_ids))
+            names = {row[0]: (row[1] or '', row[2] or '') for row in cursor.fetchall()}
+        return {user_id: names.get(user_id, ('', '')) for user_id in user_ids}
+
+    def _write_staff_logs(self, events):
+        """Insert a batch of buffered staff events (runs on the writer thread)"""
+        names = self.staff_names.get_many([event[0] for event in events], self._load_staff_names)
+        rows = [(event[0], *names[event[0]], *event[1:]) for event in events]
         with self.get_connection() as conn:
             cursor = conn.cursor()
             try:
-                # Get user info
-                user = self.get_user_by_id(user_id)
-                username = user.get('username', '') if user else ''
-                full_name = user.get('full_name', '') if user else ''
-                
-                cursor.execute('''
+                cursor.executemany('''
                     INSERT INTO staff_activity_logs 
                     (user_id, username, full_name, action_type, action_description, 
                      target_type, target_id, target_name, old_value, new_value, 
-                     ip_address, user_agent)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (user_id, username, full_name, action_type, action_description,
-                      target_type, target_id, target_name, old_value, new_value,
-                      ip_address, user_agent))
-                
+                     ip_address, user_agent, created_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', rows)
                 conn.commit()
-                print(f"✅ Logged staff activity: {action_type} by {username}")
-                return True
+                print(f"✅ Logged {len(rows)} staff activities")
+                return len(rows)
             except Exception as e:
                 print(f"❌ Error logging staff activity: {e}")
-                return False
+                raise
 
     def get_staff_activity_logs(self, user_id: int = None, action_type: str = None, 
                                limit: int = 100, offset: int = 0, 
                                start_date: str = None, end_date: str = None):
-        """Get staff activity logs with optional filters"""
-        with self.get_connection() as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            
-            query = 'SELECT * FROM staff_activity_logs WHERE 1=1'
-            params = []
-            
-            if user_id:
-                query += ' AND user_id = ?'
-                params.append(user_id)
-            
-            if action_type:
-                query += ' AND action_type = ?'
-                params.append(action_type)
-            
-            if start_date:
-                query += ' AND date(created_at) >= date(?)'
-                params.append(start_date)
-            
-            if end_date:
-                query += ' AND date(created_at) <= date(?)'
-                params.append(end_date)
-            
-            query += ' ORDER BY created_at DESC LIMIT ? OFFSET ?'
-            params.extend([limit, offset])
-            
-            cursor.execute(query, params)
-            return [dict(row) for row in cursor.fetchall()]
+        """Get staff activity logs with optional filters, newest first, archived months included"""
+        filters = []
+        if user_id:
+            filters.append(('user_id = ?', user_id))
+        if action_type:
+            filters.append(('action_type = ?', action_type))
+        return self._activity_log_page('staff_activity_logs', filters, limit, offset, start_date, end_date)
 
     def get_staff_activity_stats(self, days: int = 30):
-        """Get statistics about staff activities"""
-        with self.get_connection() as conn:
+        """Get statistics about staff activities
+
+        Totals and by_type include days compacted into activity_daily;
+        by_user covers the raw rows kept in store.db and the archive.
+        """
+        with self._activity_logs_source('staff_activity_logs', self._rollup_since(days)) as (conn, source):
             conn.row_factory = sqlite3.Row
             cursor = conn.cursor()
             
             # Total activities
-            cursor.execute('''
+            cursor.execute(f'''
                 SELECT COUNT(*) as total_activities
-                FROM staff_activity_logs
+                FROM {source}
                 WHERE created_at >= datetime('now', ?)
             ''', (f'-{days} days',))
             total = dict(cursor.fetchone())
             
             # Activities by type
-            cursor.execute('''
+            cursor.execute(f'''
                 SELECT action_type, COUNT(*) as count
-                FROM staff_activity_logs
+                FROM {source}
                 WHERE created_at >= datetime('now', ?)
                 GROUP BY action_type
                 ORDER BY count DESC
@@ -1890,9 +2626,9 @@ class Database:
             by_type = [dict(row) for row in cursor.fetchall()]
             
             # Activities by user
-            cursor.execute('''
+            cursor.execute(f'''
                 SELECT user_id, username, full_name, COUNT(*) as count
-                FROM staff_activity_logs
+                FROM {source}
                 WHERE created_at >= datetime('now', ?)
                 GROUP BY user_id, username, full_name
                 ORDER BY count DESC
@@ -1900,102 +2636,91 @@ class Database:
             ''', (f'-{days} days',))
             by_user = [dict(row) for row in cursor.fetchall()]
             
-            return {
+            return self._add_compacted_activity(cursor, 'staff_activity_logs', 'action_type', days, {
                 'total_activities': total.get('total_activities', 0),
                 'by_type': by_type,
                 'by_user': by_user
-            }
+            })
 
     # ✅ NEW: Client Activity Logging Methods
     def log_client_activity(self, telegram_id: int, activity_type: str, activity_description: str,
                            target_type: str = None, target_id: int = None, target_name: str = None,
                            metadata: str = None):
-        """Log client/bot user activity"""
+        """Log client/bot user activity (buffered, written in batches)"""
+        # Convert metadata dict to JSON string if needed
+        if metadata and isinstance(metadata, dict):
+            metadata = json.dumps(metadata)
+        self.client_logs.log((telegram_id, activity_type, activity_description, target_type,
+                              target_id, target_name, metadata, self._log_timestamp()))
+        return True
+
+    def _load_bot_user_names(self, telegram_ids):
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            placeholders = ', '.join('?' * len(telegram_ids))
+            cursor.execute(f'''
+                SELECT telegram_id, username, first_name, last_name
+                FROM bot_users
+                WHERE telegram_id IN ({placeholders})
+            ''', list(telegram_ids))
+            names = {row[0]: (row[1] or None, row[2] or None, row[3] or None)
+                     for row in cursor.fetchall()}
+        return {telegram_id: names.get(telegram_id, (None, None, None)) for telegram_id in telegram_ids}
+
+    def _write_client_logs(self, events):
+        """Insert a batch of buffered client events (runs on the writer thread)"""
+        names = self.bot_user_names.get_many([event[0] for event in events], self._load_bot_user_names)
+        rows = [(event[0], *names[event[0]], *event[1:]) for event in events]
         with self.get_connection() as conn:
             cursor = conn.cursor()
             try:
-                # Get user info from bot_users
-                cursor.execute('''
-                    SELECT username, first_name, last_name 
-                    FROM bot_users 
-                    WHERE telegram_id = ?
-                ''', (telegram_id,))
-                user_info = cursor.fetchone()
-                
-                username = user_info[0] if user_info and user_info[0] else None
-                first_name = user_info[1] if user_info and user_info[1] else None
-                last_name = user_info[2] if user_info and user_info[2] else None
-                
-                # Convert metadata dict to JSON string if needed
-                if metadata and isinstance(metadata, dict):
-                    metadata = json.dumps(metadata)
-                
-                cursor.execute('''
+                cursor.executemany('''
                     INSERT INTO client_activity_logs 
                     (telegram_id, username, first_name, last_name, activity_type, 
-                     activity_description, target_type, target_id, target_name, metadata)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (telegram_id, username, first_name, last_name, activity_type,
-                      activity_description, target_type, target_id, target_name, metadata))
-                
+                     activity_description, target_type, target_id, target_name, metadata,
+                     created_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', rows)
                 conn.commit()
-                print(f"✅ Logged client activity: {activity_type} by user {telegram_id}")
-                return True
+                print(f"✅ Logged {len(rows)} client activities")
+                return len(rows)
             except Exception as e:
                 print(f"❌ Error logging client activity: {e}")
-                return False
+                raise
 
     def get_client_activity_logs(self, telegram_id: int = None, activity_type: str = None,
                                 limit: int = 100, offset: int = 0,
                                 start_date: str = None, end_date: str = None):
-        """Get client activity logs with optional filters"""
-        with self.get_connection() as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            
-            query = 'SELECT * FROM client_activity_logs WHERE 1=1'
-            params = []
-            
-            if telegram_id:
-                query += ' AND telegram_id = ?'
-                params.append(telegram_id)
-            
-            if activity_type:
-                query += ' AND activity_type = ?'
-                params.append(activity_type)
-            
-            if start_date:
-                query += ' AND date(created_at) >= date(?)'
-                params.append(start_date)
-            
-            if end_date:
-                query += ' AND date(created_at) <= date(?)'
-                params.append(end_date)
-            
-            query += ' ORDER BY created_at DESC LIMIT ? OFFSET ?'
-            params.extend([limit, offset])
-            
-            cursor.execute(query, params)
-            return [dict(row) for row in cursor.fetchall()]
+        """Get client activity logs with optional filters, newest first, archived months included"""
+        filters = []
+        if telegram_id:
+            filters.append(('telegram_id = ?', telegram_id))
+        if activity_type:
+            filters.append(('activity_type = ?', activity_type))
+        return self._activity_log_page('client_activity_logs', filters, limit, offset, start_date, end_date)
 
     def get_client_activity_stats(self, days: int = 30):
-        """Get statistics about client activities"""
-        with self.get_connection() as conn:
+        """Get statistics about client activities
+
+        Totals and by_type include days compacted into activity_daily;
+        by_user covers the raw rows kept in store.db and the archive.
+        """
+        with self._activity_logs_source('client_activity_logs', self._rollup_since(days)) as (conn, source):
             conn.row_factory = sqlite3.Row
             cursor = conn.cursor()
             
             # Total activities
-            cursor.execute('''
+            cursor.execute(f'''
                 SELECT COUNT(*) as total_activities
-                FROM client_activity_logs
+                FROM {source}
                 WHERE created_at >= datetime('now', ?)
             ''', (f'-{days} days',))
             total = dict(cursor.fetchone())
             
             # Activities by type
-            cursor.execute('''
+            cursor.execute(f'''
                 SELECT activity_type, COUNT(*) as count
-                FROM client_activity_logs
+                FROM {source}
                 WHERE created_at >= datetime('now', ?)
                 GROUP BY activity_type
                 ORDER BY count DESC
@@ -2003,9 +2728,9 @@ class Database:
             by_type = [dict(row) for row in cursor.fetchall()]
             
             # Most active users
-            cursor.execute('''
+            cursor.execute(f'''
                 SELECT telegram_id, username, first_name, last_name, COUNT(*) as count
-                FROM client_activity_logs
+                FROM {source}
                 WHERE created_at >= datetime('now', ?)
                 GROUP BY telegram_id, username, first_name, last_name
                 ORDER BY count DESC
@@ -2013,152 +2738,120 @@ class Database:
             ''', (f'-{days} days',))
             by_user = [dict(row) for row in cursor.fetchall()]
             
-            return {
+            return self._add_compacted_activity(cursor, 'client_activity_logs', 'activity_type', days, {
                 'total_activities': total.get('total_activities', 0),
                 'by_type': by_type,
                 'by_user': by_user
-            }
+            })
+
+    def get_client_interests(self, telegram_id: int, timeline_days: int = 30):
+        """Get detailed client interests and behavior patterns.
 
-    def get_client_interests(self, telegram_id: int, days: int = 30):
-        """Get detailed client interests and behavior patterns"""
+        Counters come from client_profiles / client_interest_counts, kept up
+        to date by the insert trigger on client_activity_logs (migration 10),
+        and are all-time figures over the client's whole history. Only
+        activity_timeline is limited, to the last timeline_days days.
+        """
         with self.get_connection() as conn:
             conn.row_factory = sqlite3.Row
             cursor = conn.cursor()
-            
-            # Get all activities for this client
+
+            cursor.execute('SELECT * FROM client_profiles WHERE telegram_id = ?', (telegram_id,))
+            profile = cursor.fetchone()
+            profile = dict(profile) if profile else {}
+
+            cursor.execute('''
+                SELECT dimension, value, count
+                FROM client_interest_counts
+                WHERE telegram_id = ?
+                ORDER BY count DESC
+            ''', (telegram_id,))
+            counters = {}
+            for row in cursor.fetchall():
+                counters.setdefault(row['dimension'], {})[row['value']] = row['count']
+
             cursor.execute('''
-                SELECT activity_type, activity_description, target_type, target_id, target_name, metadata, created_at
+                SELECT activity_type, activity_description, created_at
                 FROM client_activity_logs
                 WHERE telegram_id = ? AND created_at >= datetime('now', ?)
                 ORDER BY created_at DESC
-            ''', (telegram_id, f'-{days} days'))
-            
-            activities = [dict(row) for row in cursor.fetchall()]
-            
-            # Analyze interests
-            interests = {
-                'browsed_categories': {},
-                'viewed_products': {},
-                'cart_additions': {},
-                'purchased_products': {},
-                'favorite_colors': {},
-                'favorite_sizes': {},
-                'activity_timeline': [],
-                'shopping_behavior': {
-                    'total_browses': 0,
-                    'total_cart_adds': 0,
-                    'total_orders': 0,
-                    'cart_abandonment_rate': 0,
-                    'average_order_value': 0,
-                    'most_active_day': None,
-                    'most_active_hour': None
-                }
+                LIMIT ?
+            ''', (telegram_id, f'-{timeline_days} days', CLIENT_TIMELINE_LIMIT))
+            timeline = [{
+                'type': row['activity_type'],
+                'description': row['activity_description'],
+                'timestamp': row['created_at']
+            } for row in cursor.fetchall()]
+
+        def top(dimension, limit=None):
+            items = list(counters.get(dimension, {}).items())
+            return dict(items[:limit] if limit else items)
+
+        cart_adds = profile.get('total_cart_adds', 0)
+        orders = profile.get('total_orders', 0)
+        weekdays = counters.get('weekday', {})
+        hours = counters.get('hour', {})
+
+        return {
+            'browsed_categories': top('category'),
+            'viewed_products': top('product'),
+            'cart_additions': top('cart_product', 10),
+            'purchased_products': {},
+            'favorite_colors': top('color', 5),
+            'favorite_sizes': top('size', 5),
+            'activity_timeline': timeline,
+            'shopping_behavior': {
+                'total_browses': profile.get('total_browses', 0),
+                'total_cart_adds': cart_adds,
+                'total_orders': orders,
+                'cart_abandonment_rate': round((1 - (orders / cart_adds)) * 100, 2) if cart_adds > 0 else 0,
+                'average_order_value': round(profile['total_order_value'] / orders, 2) if orders > 0 else 0,
+                'most_active_day': WEEKDAY_NAMES[int(next(iter(weekdays)))] if weekdays else None,
+                'most_active_hour': int(next(iter(hours))) if hours else None
             }
-            
-            # Parse activities
-            cart_adds = 0
-            orders = 0
-            total_order_value = 0
-            day_counts = {}
-            hour_counts = {}
-            
-            for activity in activities:
-                activity_type = activity.get('activity_type', '')
-                metadata_str = activity.get('metadata', '')
-                created_at = activity.get('created_at', '')
-                
-                # Track timeline
-                interests['activity_timeline'].append({
-                    'type': activity_type,
-                    'description': activity.get('activity_description', ''),
-                    'timestamp': created_at
-                })
-                
-                # Parse metadata
-                try:
-                    if metadata_str:
-                        metadata = json.loads(metadata_str)
-                    else:
-                        metadata = {}
-                except:
-                    metadata = {}
-                
-                # Analyze by activity type
-                if activity_type == 'browse_products':
-                    interests['shopping_behavior']['total_browses'] += 1
-                elif activity_type == 'add_to_cart':
-                    cart_adds += 1
-                    interests['shopping_behavior']['total_cart_adds'] += 1
-                    
-                    # Track product interests
-                    target_name = activity.get('target_name', '')
-                    if target_name:
-                        if target_name not in interests['cart_additions']:
-                            interests['cart_additions'][target_name] = 0
-                        interests['cart_additions'][target_name] += 1
-                    
-                    # Track color preferences
-                    if 'color' in metadata:
-                        color = metadata['color']
-                        if color not in interests['favorite_colors']:
-                            interests['favorite_colors'][color] = 0
-                        interests['favorite_colors'][color] += 1
-                    
-                    # Track size preferences
-                    if 'size' in metadata:
-                        size = metadata['size']
-                        if size not in interests['favorite_sizes']:
-                            interests['favorite_sizes'][size] = 0
-                        interests['favorite_sizes'][size] += 1
-                
-                elif activity_type == 'order_placed':
-                    orders += 1
-                    interests['shopping_behavior']['total_orders'] += 1
-                    
-                    if 'total_amount' in metadata:
-                        total_order_value += float(metadata['total_amount'])
-                
-                # Track time patterns
-                if created_at:
-                    try:
-                        from datetime import datetime
-                        dt = datetime.strptime(created_at.split('.')[0], '%Y-%m-%d %H:%M:%S')
-                        day_name = dt.strftime('%A')
-                        hour = dt.hour
-                        
-                        if day_name not in day_counts:
-                            day_counts[day_name] = 0
-                        day_counts[day_name] += 1
-                        
-                        if hour not in hour_counts:
-                            hour_counts[hour] = 0
-                        hour_counts[hour] += 1
-                    except:
-                        pass
-            
-            # Calculate shopping behavior metrics
-            if cart_adds > 0:
-                interests['shopping_behavior']['cart_abandonment_rate'] = round((1 - (orders / cart_adds)) * 100, 2) if cart_adds > 0 else 0
-            
-            if orders > 0:
-                interests['shopping_behavior']['average_order_value'] = round(total_order_value / orders, 2)
-            
-            if day_counts:
-                interests['shopping_behavior']['most_active_day'] = max(day_counts, key=day_counts.get)
-            
-            if hour_counts:
-                interests['shopping_behavior']['most_active_hour'] = max(hour_counts, key=hour_counts.get)
-            
-            # Sort by frequency
-            interests['cart_additions'] = dict(sorted(interests['cart_additions'].items(), key=lambda x: x[1], reverse=True)[:10])
-            interests['favorite_colors'] = dict(sorted(interests['favorite_colors'].items(), key=lambda x: x[1], reverse=True)[:5])
-            interests['favorite_sizes'] = dict(sorted(interests['favorite_sizes'].items(), key=lambda x: x[1], reverse=True)[:5])
-            
-            return interests
+        }
+
+    def get_top_interests(self, dimension: str, limit: int = 10):
+        """Most common values of one interest dimension across all clients
+        (category, product, cart_product, color, size, hour, weekday)"""
+        with self.get_connection() as conn:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT value, COUNT(*) as clients, SUM(count) as events
+                FROM client_interest_counts
+                WHERE dimension = ?
+                GROUP BY value
+                ORDER BY events DESC
+                LIMIT ?
+            ''', (dimension, limit))
+            return [dict(row) for row in cursor.fetchall()]
+
+    def rebuild_client_profiles(self):
+        """Recompute client profiles from the activity logs, archive included.
+
+        Months compacted into activity_daily no longer have per-client rows,
+        so a rebuild drops their share of the trigger-maintained counters.
+        """
+        self.flush_activity_logs()
+        with self._activity_logs_source('client_activity_logs', '0000-01-01') as (conn, source):
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                conn.execute('DELETE FROM main.client_profiles')
+                conn.execute('DELETE FROM main.client_interest_counts')
+                for sql in CLIENT_PROFILE_SQL:
+                    conn.execute(sql.format(events=source))
+                count = conn.execute('SELECT COUNT(*) FROM main.client_profiles').fetchone()[0]
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        print(f"✅ Rebuilt {count} client profiles")
+        return count
 
     def get_client_interest_summary(self, telegram_id: int):
-        """Get quick summary of client interests"""
-        interests = self.get_client_interests(telegram_id, days=90)
+        """Get quick summary of client interests (all-time counters)"""
+        interests = self.get_client_interests(telegram_id)
         
         summary = {
             'top_products': list(interests['cart_additions'].keys())[:5],
@@ -0,0 +1,215 @@
+# db_archive.py - Monthly archive partitions for the activity log tables
+import os
+import sqlite3
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+# Log table -> (user column, activity type column)
+ARCHIVE_TABLES = {
+    'client_activity_logs': ('telegram_id', 'activity_type'),
+    'staff_activity_logs': ('user_id', 'action_type'),
+}
+
+DEFAULT_HOT_MONTHS = 2          # the current and previous month stay in store.db
+DEFAULT_RETENTION_MONTHS = 12   # archived rows are kept this long, then compacted
+DEFAULT_ARCHIVE_INTERVAL = 6 * 3600.0  # seconds between scheduled archive runs
+ARCHIVE_START_DELAY = 60.0      # first scheduled run, seconds after startup
+
+
+def month_start(months_back: int, now: datetime = None) -> str:
+    """'YYYY-MM-01' of the month months_back before now's month (UTC)"""
+    now = now or datetime.now(timezone.utc)
+    index = now.year * 12 + now.month - 1 - months_back
+    return f'{index // 12:04d}-{index % 12 + 1:02d}-01'
+
+
+def partition_name(table: str, month: str) -> str:
+    """Archive table of a month, e.g. client_activity_logs_2026_09 for '2026-09'"""
+    return f"{table}_{month[:7].replace('-', '_')}"
+
+
+class ActivityArchive:
+    """Moves old activity log rows out of store.db into monthly partitions.
+
+    The hot tables in store.db keep the last hot_months calendar months.
+    Older months are moved, one month per transaction, into tables named
+    <table>_YYYY_MM in a separate archive file (store_archive.db next to
+    store.db), so every hot query and the main WAL stay small. Partitions
+    older than retention_months are compacted into per-day counts in the
+    activity_daily table (store.db, migration 9) and dropped.
+
+    All of this runs on a dedicated connection with the archive ATTACHed:
+    pooled connections never see the archive, and ATTACH is not allowed
+    inside the writer queue's open transaction.
+    """
+
+    def __init__(self, db_path: str, archive_path: str = None,
+                 hot_months: int = DEFAULT_HOT_MONTHS,
+                 retention_months: int = DEFAULT_RETENTION_MONTHS,
+                 timeout: float = 30.0):
+        if archive_path is None:
+            root, ext = os.path.splitext(db_path)
+            archive_path = f'{root}_archive{ext or ".db"}'
+        self.db_path = db_path
+        self.archive_path = archive_path
+        self.hot_months = hot_months
+        self.retention_months = retention_months
+        self.timeout = timeout
+
+    def connect(self) -> sqlite3.Connection:
+        """New connection to store.db with the archive attached as 'archive'"""
+        conn = sqlite3.connect(self.db_path, timeout=self.timeout, isolation_level=None)
+        conn.execute(f'PRAGMA busy_timeout = {int(self.timeout * 1000)}')
+        conn.execute('ATTACH DATABASE ? AS archive', (self.archive_path,))
+        return conn
+
+    def hot_boundary(self, now: datetime = None) -> str:
+        """Rows created before this date belong in the archive"""
+        return month_start(self.hot_months - 1, now)
+
+    def retention_boundary(self, now: datetime = None) -> str:
+        """Partitions of months before this date are compacted"""
+        return month_start(self.hot_months + self.retention_months - 1, now)
+
+    def partitions(self, conn, table: str) -> List[str]:
+        """Archived months of a table, oldest first ('YYYY-MM')"""
+        prefix = f'{table}_'
+        rows = conn.execute('''
+            SELECT name FROM archive.sqlite_master
+            WHERE type = 'table' AND name LIKE ? ESCAPE '!'
+        ''', (prefix.replace('_', '!_') + '%',)).fetchall()
+        months = []
+        for (name,) in rows:
+            suffix = name[len(prefix):]
+            if len(suffix) == 7 and suffix[4] == '_':
+                months.append(suffix.replace('_', '-'))
+        return sorted(months)
+
+    def _partition_selects(self, conn, table: str, start_date: Optional[str]) -> List[str]:
+        months = [m for m in self.partitions(conn, table) if not start_date or m >= start_date[:7]]
+        return [f'SELECT * FROM archive.{partition_name(table, m)}' for m in months]
+
+    def source_sql(self, conn, table: str, start_date: Optional[str] = None,
+                   now: datetime = None) -> str:
+        """FROM clause covering table from start_date on: the hot table, or a
+        UNION ALL of it and the archive partitions the range reaches"""
+        if not start_date or start_date[:10] >= self.hot_boundary(now):
+            return table
+        parts = self._partition_selects(conn, table, start_date)
+        if not parts:
+            return table
+        parts.insert(0, f'SELECT * FROM main.{table}')
+        return '(' + ' UNION ALL '.join(parts) + f') AS {table}'
+
+    def archived_sql(self, conn, table: str) -> Optional[str]:
+        """FROM clause over every archive partition of table (no hot rows),
+        None when nothing is archived"""
+        parts = self._partition_selects(conn, table, None)
+        if not parts:
+            return None
+        return '(' + ' UNION ALL '.join(parts) + f') AS {table}'
+
+    def archive(self, now: datetime = None) -> Dict[str, int]:
+        """Move rows older than the hot window into monthly partitions"""
+        boundary = self.hot_boundary(now)
+        moved = {}
+        conn = self.connect()
+        try:
+            for table, (user_column, _) in ARCHIVE_TABLES.items():
+                moved[table] = 0
+                months = [row[0] for row in conn.execute(f'''
+                    SELECT DISTINCT substr(created_at, 1, 7)
+                    FROM main.{table}
+                    WHERE created_at < ?
+                ''', (boundary,))]
+                for month in months:
+                    moved[table] += self._move_month(conn, table, user_column, month)
+        finally:
+            conn.close()
+        return moved
+
+    def _move_month(self, conn, table: str, user_column: str, month: str) -> int:
+        partition = partition_name(table, month)
+        start = f'{month}-01'
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # Same columns, in the same order, as the hot table (for UNION ALL)
+            conn.execute(f'CREATE TABLE IF NOT EXISTS archive.{partition} AS SELECT * FROM main.{table} WHERE 0')
+            conn.execute(f'CREATE INDEX IF NOT EXISTS archive.idx_{partition}_created_at ON {partition}(created_at)')
+            conn.execute(f'CREATE INDEX IF NOT EXISTS archive.idx_{partition}_{user_column} ON {partition}({user_column})')
+            # Copy before delete: a crash between the two files' commits can
+            # only leave a row in both places, never in neither
+            window = (start, start)
+            conn.execute(f'''
+                INSERT INTO archive.{partition}
+                SELECT * FROM main.{table}
+                WHERE created_at >= ? AND created_at < date(?, '+1 month')
+            ''', window)
+            count = conn.execute(f'''
+                DELETE FROM main.{table}
+                WHERE created_at >= ? AND created_at < date(?, '+1 month')
+            ''', window).rowcount
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return count
+
+    def compact(self, now: datetime = None) -> Dict[str, List[str]]:
+        """Fold partitions past retention into activity_daily and drop them"""
+        boundary = self.retention_boundary(now)[:7]
+        compacted = {}
+        conn = self.connect()
+        try:
+            for table, (user_column, type_column) in ARCHIVE_TABLES.items():
+                compacted[table] = []
+                for month in [m for m in self.partitions(conn, table) if m < boundary]:
+                    partition = partition_name(table, month)
+                    conn.execute('BEGIN IMMEDIATE')
+                    try:
+                        # The bot and the dashboard both run the schedule;
+                        # the other process may have compacted it meanwhile
+                        if month not in self.partitions(conn, table):
+                            conn.execute('COMMIT')
+                            continue
+                        conn.execute(f'''
+                            INSERT INTO main.activity_daily (log_table, day, activity_type, events, users)
+                            SELECT ?, date(created_at), {type_column}, COUNT(*), COUNT(DISTINCT {user_column})
+                            FROM archive.{partition}
+                            WHERE true
+                            GROUP BY date(created_at), {type_column}
+                            ON CONFLICT(log_table, day, activity_type) DO UPDATE SET
+                                events = events + excluded.events,
+                                users = MAX(users, excluded.users)
+                        ''', (table,))
+                        conn.execute(f'DROP TABLE archive.{partition}')
+                        conn.execute('COMMIT')
+                    except Exception:
+                        conn.execute('ROLLBACK')
+                        raise
+                    compacted[table].append(month)
+            if any(compacted.values()):
+                conn.execute('VACUUM archive')
+        finally:
+            conn.close()
+        return compacted
+
+    def stats(self) -> Dict:
+        conn = self.connect()
+        try:
+            partitions = {}
+            for table in ARCHIVE_TABLES:
+                partitions[table] = {
+                    month: conn.execute(f'SELECT COUNT(*) FROM archive.{partition_name(table, month)}').fetchone()[0]
+                    for month in self.partitions(conn, table)
+                }
+        finally:
+            conn.close()
+        return {
+            'archive_path': self.archive_path,
+            'archive_bytes': os.path.getsize(self.archive_path) if os.path.exists(self.archive_path) else 0,
+            'hot_months': self.hot_months,
+            'retention_months': self.retention_months,
+            'hot_boundary': self.hot_boundary(),
+            'partitions': partitions,
+        }
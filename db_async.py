@@ -0,0 +1,192 @@
+# db_async.py - Async facade over Database for the Telegram bot
+import asyncio
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict
+
+from database import Database, db
+
+DEFAULT_WORKERS = 4
+DEFAULT_MAX_QUEUE = 256
+
+# How long a coroutine waits before retrying when the queue is full
+BACKPRESSURE_DELAY = 0.01
+
+# Writes routed through the single-writer group-commit queue (db.writer)
+# instead of the executor, so bursts of them share one transaction
+GROUP_COMMIT_METHODS = frozenset({
+    'add_bot_user',
+    'add_customer',
+    'mark_user_as_buyer',
+    'create_order',
+})
+
+# Only append to an in-memory buffer (flushed in batches by the writer),
+# so they run inline on the event loop instead of taking a worker
+BUFFERED_METHODS = frozenset({
+    'log_client_activity',
+    'log_staff_activity',
+})
+
+_STOP = object()
+
+
+class DatabaseExecutor:
+    """Runs Database calls on dedicated worker threads fed by a bounded queue.
+
+    Each worker keeps its own pooled SQLite connection, so queries never run
+    on the asyncio event loop thread. The queue bound applies backpressure
+    instead of letting a burst of updates pile up unbounded work.
+    """
+
+    def __init__(self, workers: int = DEFAULT_WORKERS, max_queue: int = DEFAULT_MAX_QUEUE,
+                 name: str = 'db-worker'):
+        self.workers = workers
+        self.name = name
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._threads = []
+        self._lock = threading.Lock()
+        self._stats = {
+            'submitted': 0,
+            'completed': 0,
+            'failed': 0,
+            'queue_full': 0,
+        }
+
+    def _ensure_started(self):
+        if self._threads:
+            return
+        with self._lock:
+            if self._threads:
+                return
+            for index in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f'{self.name}-{index}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is _STOP:
+                    return
+                future, fn, args, kwargs = item
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    result = fn(*args, **kwargs)
+                except BaseException as e:
+                    self._stats['failed'] += 1
+                    future.set_exception(e)
+                else:
+                    self._stats['completed'] += 1
+                    future.set_result(result)
+            finally:
+                self._queue.task_done()
+
+    def _put(self, fn: Callable, args, kwargs, block: bool) -> Future:
+        self._ensure_started()
+        future = Future()
+        try:
+            self._queue.put((future, fn, args, kwargs), block=block)
+        except queue.Full:
+            self._stats['queue_full'] += 1
+            raise
+        self._stats['submitted'] += 1
+        return future
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        """Queue a call, blocking while the queue is full"""
+        return self._put(fn, args, kwargs, block=True)
+
+    def submit_nowait(self, fn: Callable, *args, **kwargs) -> Future:
+        """Queue a call, raising queue.Full instead of blocking"""
+        return self._put(fn, args, kwargs, block=False)
+
+    def shutdown(self, wait: bool = True):
+        """Stop the workers after the queued calls have run"""
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for _ in threads:
+            self._queue.put(_STOP)
+        if wait:
+            for thread in threads:
+                thread.join()
+
+    def stats(self) -> Dict:
+        return {
+            'workers': len(self._threads),
+            'queued': self._queue.qsize(),
+            'max_queue': self._queue.maxsize,
+            **self._stats,
+        }
+
+
+class AsyncDatabase:
+    """Awaitable versions of the Database methods.
+
+        order_result = await adb.create_order(...)
+
+    Any public Database method is available under the same name and
+    signature; the call runs on the DatabaseExecutor (or, for
+    GROUP_COMMIT_METHODS, on the database's writer thread; BUFFERED_METHODS
+    run inline) and the coroutine
+    resumes with its return value (or exception) when it completes.
+    """
+
+    def __init__(self, database: Database, executor: DatabaseExecutor = None):
+        self._db = database
+        self.executor = executor or DatabaseExecutor()
+
+    async def run(self, fn: Callable, *args, **kwargs):
+        """Run any blocking callable on the database executor"""
+        while True:
+            try:
+                future = self.executor.submit_nowait(fn, *args, **kwargs)
+                break
+            except queue.Full:
+                # ✅ Yield to the event loop instead of blocking it
+                await asyncio.sleep(BACKPRESSURE_DELAY)
+        return await asyncio.wrap_future(future)
+
+    async def write(self, fn: Callable, *args, **kwargs):
+        """Run a write on the database's single writer thread (group commit)"""
+        while True:
+            try:
+                future = self._db.queue_write_nowait(fn, *args, **kwargs)
+                break
+            except queue.Full:
+                # ✅ Same backpressure as run(): never block the event loop on the writer queue
+                await asyncio.sleep(BACKPRESSURE_DELAY)
+        return await asyncio.wrap_future(future)
+
+    def __getattr__(self, name: str):
+        attr = getattr(self._db, name)
+        if name.startswith('_') or not callable(attr):
+            return attr
+
+        if name in GROUP_COMMIT_METHODS:
+            async def method(*args, **kwargs):
+                return await self.write(attr, *args, **kwargs)
+        elif name in BUFFERED_METHODS:
+            async def method(*args, **kwargs):
+                return attr(*args, **kwargs)
+        else:
+            async def method(*args, **kwargs):
+                return await self.run(attr, *args, **kwargs)
+
+        method.__name__ = name
+        method.__doc__ = attr.__doc__
+        setattr(self, name, method)
+        return method
+
+    def shutdown(self, wait: bool = True):
+        self.executor.shutdown(wait=wait)
+
+    def stats(self) -> Dict:
+        return self.executor.stats()
+
+
+# Global async facade over the shared database instance
+adb = AsyncDatabase(db)
@@ -0,0 +1,288 @@
+# db_backup.py - Online, paged backups of store.db with rotation and verification
+#
+# Usage: python db_backup.py [--db store.db] [--archive store_archive.db] [--dir backups]
+#                            [--keep 7] [--list] [--quick]
+import argparse
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+DEFAULT_BACKUP_DIR = 'backups'
+DEFAULT_KEEP = 7               # newest backups kept by rotation
+DEFAULT_PAGES_PER_STEP = 1024  # pages copied per backup step
+DEFAULT_STEP_SLEEP = 0.005     # pause after a step that found the database busy
+DEFAULT_MAX_RESTARTS = 20      # paged restarts before copying in one pass
+
+BACKUP_TIME_FORMAT = '%Y%m%d-%H%M%S-%f'  # microseconds keep back-to-back backups apart
+
+
+class _TooManyRestarts(Exception):
+    pass
+
+
+def online_copy(source_path: str, target_path: str,
+                pages_per_step: int = DEFAULT_PAGES_PER_STEP,
+                step_sleep: float = DEFAULT_STEP_SLEEP,
+                progress: Optional[Callable] = None,
+                max_restarts: int = DEFAULT_MAX_RESTARTS) -> Dict:
+    """Copy a live database with the sqlite3 backup API.
+
+    The copy runs pages_per_step pages at a time, each step in its own short
+    read transaction; in WAL mode those never block the bot's writers.
+    sqlite3 sleeps step_sleep only after a step that found the database
+    busy or locked, not between successful steps (a pause there would only
+    widen the window for restarts). A write from another connection
+    restarts a paged copy; after max_restarts
+    of those the copy is finished in a single pass instead, which in WAL
+    mode only holds back checkpoints, not writers. Either way the result
+    is a consistent point-in-time image. The target is left in
+    rollback-journal mode so it opens on its own, without -wal/-shm files
+    and read-only if need be. Returns pages, restarts and single_pass.
+    """
+    if os.path.exists(target_path):
+        os.remove(target_path)
+    state = {'remaining': None, 'restarts': 0, 'single_pass': False}
+
+    def watch(status, remaining, total):
+        if state['remaining'] is not None and remaining >= state['remaining']:
+            state['restarts'] += 1
+            if state['restarts'] >= max_restarts:
+                raise _TooManyRestarts()
+        state['remaining'] = remaining
+        if progress:
+            progress(status, remaining, total)
+
+    source = sqlite3.connect(source_path, timeout=30.0)
+    target = sqlite3.connect(target_path)
+    try:
+        try:
+            source.backup(target, pages=pages_per_step, sleep=step_sleep, progress=watch)
+        except _TooManyRestarts:
+            print(f"⚠️ Backup restarted {max_restarts} times under writes, finishing in one pass")
+            state['single_pass'] = True
+            source.backup(target, pages=-1)
+        target.execute('PRAGMA journal_mode = DELETE')
+        return {
+            'pages': target.execute('PRAGMA page_count').fetchone()[0],
+            'restarts': state['restarts'],
+            'single_pass': state['single_pass'],
+        }
+    finally:
+        target.close()
+        source.close()
+
+
+def verify(path: str, quick: bool = False) -> List[str]:
+    """integrity_check (or quick_check) of a database file; [] when it is sound"""
+    conn = sqlite3.connect(f'file:{os.path.abspath(path)}?mode=ro', uri=True)
+    try:
+        pragma = 'quick_check' if quick else 'integrity_check'
+        problems = [row[0] for row in conn.execute(f'PRAGMA {pragma}').fetchall()]
+    finally:
+        conn.close()
+    return [] if problems == ['ok'] else problems
+
+
+class BackupManager:
+    """Point-in-time backups of the live database into backup_dir.
+
+    Each backup is written to a .tmp file, verified with integrity_check and
+    only then renamed to <name>-YYYYmmdd-HHMMSS-ffffff.db, so a listed backup is
+    always complete and sound. With archive_path (the activity log archive,
+    store_archive.db) every backup also copies that file, under the same
+    timestamp, and lists, rotates and reports the two as one set. store.db
+    is copied first: a month that archive() moves in between then shows up
+    in both copies, never in neither. Rotation keeps the newest `keep`
+    backups. One backup runs at a time.
+    """
+
+    def __init__(self, db_path: str, backup_dir: str = None, keep: int = DEFAULT_KEEP,
+                 pages_per_step: int = DEFAULT_PAGES_PER_STEP,
+                 step_sleep: float = DEFAULT_STEP_SLEEP,
+                 archive_path: str = None):
+        if backup_dir is None:
+            backup_dir = os.path.join(os.path.dirname(os.path.abspath(db_path)), DEFAULT_BACKUP_DIR)
+        self.db_path = db_path
+        self.archive_path = archive_path
+        self.backup_dir = backup_dir
+        self.keep = keep
+        self.pages_per_step = pages_per_step
+        self.step_sleep = step_sleep
+        self.prefix = self._prefix(db_path)
+        self.archive_prefix = self._prefix(archive_path) if archive_path else None
+
+        self._lock = threading.Lock()
+        self.last_result = None
+        self.last_error = None
+
+    @staticmethod
+    def _prefix(path: str) -> str:
+        return os.path.splitext(os.path.basename(path))[0] + '-'
+
+    def _archive_backup_path(self, path: str) -> str:
+        """Archive file of the set whose store.db backup is `path`"""
+        stamp = os.path.basename(path)[len(self.prefix):]
+        return os.path.join(self.backup_dir, self.archive_prefix + stamp)
+
+    def _copy_verified(self, source_path: str, path: str, quick_check: bool, steps: list) -> Dict:
+        """Online copy of source_path into path.tmp, verified, then renamed to path"""
+        temp_path = f'{path}.tmp'
+
+        def progress(status, remaining, total):
+            steps[0] += 1
+
+        started = time.monotonic()
+        copy = online_copy(source_path, temp_path, self.pages_per_step, self.step_sleep, progress)
+        copied = time.monotonic()
+        problems = verify(temp_path, quick=quick_check)
+        if problems:
+            os.remove(temp_path)
+            raise RuntimeError(f'Backup of {source_path} failed verification: {problems[:5]}')
+        os.replace(temp_path, path)
+        return {**copy, 'copy_seconds': copied - started, 'verify_seconds': time.monotonic() - copied}
+
+    def backup(self, quick_check: bool = False) -> Dict:
+        """Take, verify and rotate one backup set; returns its report"""
+        if not self._lock.acquire(blocking=False):
+            raise RuntimeError('A backup is already running')
+        try:
+            os.makedirs(self.backup_dir, exist_ok=True)
+            name = f"{self.prefix}{datetime.now().strftime(BACKUP_TIME_FORMAT)}.db"
+            path = os.path.join(self.backup_dir, name)
+            steps = [0]
+
+            copies = [self._copy_verified(self.db_path, path, quick_check, steps)]
+            archive_path = None
+            if self.archive_path and os.path.exists(self.archive_path):
+                archive_path = self._archive_backup_path(path)
+                try:
+                    copies.append(self._copy_verified(self.archive_path, archive_path, quick_check, steps))
+                except BaseException:
+                    # Never leave a set without its archive behind
+                    os.remove(path)
+                    raise
+
+            size = sum(os.path.getsize(p) for p in (path, archive_path) if p)
+            copy_seconds = sum(copy['copy_seconds'] for copy in copies)
+            result = {
+                'path': path,
+                'archive_path': archive_path,
+                'bytes': size,
+                'pages': sum(copy['pages'] for copy in copies),
+                'steps': steps[0],
+                'restarts': sum(copy['restarts'] for copy in copies),
+                'single_pass': any(copy['single_pass'] for copy in copies),
+                'copy_seconds': round(copy_seconds, 3),
+                'verify_seconds': round(sum(copy['verify_seconds'] for copy in copies), 3),
+                'mb_per_second': round(size / 1048576 / copy_seconds, 1) if copy_seconds > 0 else None,
+                'removed': self.rotate(),
+            }
+            self.last_result = result
+            self.last_error = None
+            print(f"💾 Backup {name}{' + archive' if archive_path else ''}: "
+                  f"{size / 1048576:.1f} MB in {copy_seconds:.2f}s, verified")
+            return result
+        except Exception as e:
+            self.last_error = str(e)
+            raise
+        finally:
+            self._lock.release()
+
+    def backup_in_background(self, quick_check: bool = False) -> bool:
+        """Start backup() on its own thread; False if one is already running"""
+        if self.running:
+            return False
+
+        def run():
+            try:
+                self.backup(quick_check)
+            except Exception as e:
+                print(f"❌ Backup failed: {e}")
+
+        threading.Thread(target=run, name='db-backup', daemon=True).start()
+        return True
+
+    def list_backups(self) -> List[Dict]:
+        """Finished backup sets, newest first"""
+        if not os.path.isdir(self.backup_dir):
+            return []
+        backups = []
+        for name in os.listdir(self.backup_dir):
+            if not (name.startswith(self.prefix) and name.endswith('.db')):
+                continue
+            try:
+                taken_at = datetime.strptime(name[len(self.prefix):-3], BACKUP_TIME_FORMAT)
+            except ValueError:
+                continue
+            path = os.path.join(self.backup_dir, name)
+            backup = {'path': path, 'name': name, 'taken_at': taken_at.isoformat(),
+                      'bytes': os.path.getsize(path), 'archive_path': None}
+            if self.archive_prefix:
+                archive_path = self._archive_backup_path(path)
+                if os.path.exists(archive_path):
+                    backup['archive_path'] = archive_path
+                    backup['bytes'] += os.path.getsize(archive_path)
+            backups.append(backup)
+        return sorted(backups, key=lambda backup: backup['taken_at'], reverse=True)
+
+    def rotate(self) -> List[str]:
+        """Delete all but the newest `keep` backup sets; returns removed names"""
+        removed = []
+        for backup in self.list_backups()[self.keep:]:
+            os.remove(backup['path'])
+            if backup['archive_path']:
+                os.remove(backup['archive_path'])
+            removed.append(backup['name'])
+        return removed
+
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+
+    def stats(self) -> Dict:
+        return {
+            'backup_dir': self.backup_dir,
+            'archive_path': self.archive_path,
+            'keep': self.keep,
+            'running': self.running,
+            'last_result': self.last_result,
+            'last_error': self.last_error,
+            'backups': self.list_backups(),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Online backup of the store database')
+    parser.add_argument('--db', default='store.db', help='database to back up')
+    parser.add_argument('--archive', help='activity log archive backed up in the same set (default: '
+                                          '<db>_archive.db when it exists)')
+    parser.add_argument('--dir', help='backup directory (default: backups/ next to the database)')
+    parser.add_argument('--keep', type=int, default=DEFAULT_KEEP, help='backups kept by rotation')
+    parser.add_argument('--pages', type=int, default=DEFAULT_PAGES_PER_STEP, help='pages per backup step')
+    parser.add_argument('--sleep', type=float, default=DEFAULT_STEP_SLEEP, help='seconds to wait after a busy step')
+    parser.add_argument('--quick', action='store_true', help='quick_check instead of integrity_check')
+    parser.add_argument('--list', action='store_true', help='list backups and exit')
+    args = parser.parse_args()
+
+    archive = args.archive
+    if archive is None:
+        root, ext = os.path.splitext(args.db)
+        archive = f'{root}_archive{ext or ".db"}'
+    manager = BackupManager(args.db, args.dir, args.keep, args.pages, args.sleep, archive_path=archive)
+    if args.list:
+        for backup in manager.list_backups():
+            print(f"{backup['taken_at']}  {backup['bytes'] / 1048576:10.1f} MB  {backup['path']}"
+                  f"{'  + archive' if backup['archive_path'] else ''}")
+        return 0
+
+    result = manager.backup(quick_check=args.quick)
+    for name in result['removed']:
+        print(f"🗑️ Rotated out {name}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,155 @@
+# db_cache.py - Versioned read-through cache for hot Database read methods
+import copy
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from typing import Dict, Hashable, Optional, Tuple
+
+DEFAULT_MAX_ENTRIES = 4096
+
+# Seconds an entry may be served. Writes made by this process invalidate
+# immediately; the TTL bounds staleness for writes made by the other process
+# (bot vs dashboard) sharing store.db.
+DEFAULT_TTLS = {
+    'products': 30.0,
+    'orders': 10.0,
+    'categories': 300.0,
+    'options': 3600.0,
+}
+DEFAULT_TTL = 30.0
+
+_MISSING = object()
+
+
+class ReadCache:
+    """LRU + TTL cache whose entries are grouped in versioned namespaces.
+
+    Every namespace carries a version number. Entries remember the version
+    that was current before their query ran, and invalidate() bumps it, so a
+    read that raced with a write can never be served after that write.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, ttls: Optional[Dict[str, float]] = None,
+                 enabled: bool = True):
+        self.max_entries = max_entries
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self.enabled = enabled
+
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[str, Hashable], Tuple[int, float, object]]" = OrderedDict()
+        self._versions: Dict[str, int] = {}
+        self._counters: Dict[str, Dict[str, int]] = {}
+
+    def _count(self, namespace: str, counter: str):
+        counters = self._counters.setdefault(
+            namespace, {'hits': 0, 'misses': 0, 'invalidations': 0, 'evictions': 0})
+        counters[counter] += 1
+
+    def version(self, namespace: str) -> int:
+        return self._versions.get(namespace, 0)
+
+    def get(self, namespace: str, key: Hashable):
+        """Return the cached value or _MISSING"""
+        if not self.enabled:
+            return _MISSING
+        with self._lock:
+            entry = self._entries.get((namespace, key))
+            if entry is not None:
+                version, expires_at, value = entry
+                if version == self.version(namespace) and expires_at > time.monotonic():
+                    self._entries.move_to_end((namespace, key))
+                    self._count(namespace, 'hits')
+                    return value
+                del self._entries[(namespace, key)]
+            self._count(namespace, 'misses')
+            return _MISSING
+
+    def set(self, namespace: str, key: Hashable, value, version: int):
+        """Store a value read while `version` was current"""
+        if not self.enabled:
+            return
+        with self._lock:
+            if version != self.version(namespace):
+                return  # a write landed while the value was being read
+            ttl = self.ttls.get(namespace, DEFAULT_TTL)
+            self._entries[(namespace, key)] = (version, time.monotonic() + ttl, value)
+            self._entries.move_to_end((namespace, key))
+            while len(self._entries) > self.max_entries:
+                (evicted_namespace, _), _ = self._entries.popitem(last=False)
+                self._count(evicted_namespace, 'evictions')
+
+    def invalidate(self, *namespaces: str):
+        """Make every entry of the given namespaces stale"""
+        with self._lock:
+            for namespace in namespaces:
+                self._versions[namespace] = self.version(namespace) + 1
+                self._count(namespace, 'invalidations')
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            for namespace in list(self._versions):
+                self._versions[namespace] += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            namespaces = {}
+            for namespace, counters in self._counters.items():
+                lookups = counters['hits'] + counters['misses']
+                namespaces[namespace] = dict(
+                    counters,
+                    version=self.version(namespace),
+                    hit_rate=round(counters['hits'] / lookups, 3) if lookups else 0.0,
+                )
+            return {
+                'enabled': self.enabled,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttls': dict(self.ttls),
+                'namespaces': namespaces,
+            }
+
+
+def cached(namespace: str):
+    """Serve a Database read method through self.cache.
+
+    Callers receive their own deep copy, so routes that decorate the returned
+    dicts (e.g. order['items_with_details']) cannot corrupt the cache.
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if self.reading_snapshot:
+                # Snapshot data may be older than the cached version
+                return method(self, *args, **kwargs)
+            cache = self.cache
+            key = (method.__name__, args, tuple(sorted(kwargs.items())))
+            value = cache.get(namespace, key)
+            if value is not _MISSING:
+                return copy.deepcopy(value)
+
+            version = cache.version(namespace)
+            value = method(self, *args, **kwargs)
+            cache.set(namespace, key, copy.deepcopy(value), version)
+            return value
+        return wrapper
+    return decorator
+
+
+def invalidates(*namespaces: str):
+    """Invalidate cache namespaces once a Database write method has run"""
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, *args, **kwargs):
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                self.cache.invalidate(*namespaces)
+                conn = self.pool.current()
+                if conn is not None and conn.depth > 0:
+                    # Inside an enclosing transaction (e.g. a group commit):
+                    # readers may still cache the old rows until it commits
+                    conn.after_commit(lambda: self.cache.invalidate(*namespaces))
+        return wrapper
+    return decorator
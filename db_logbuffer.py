@@ -0,0 +1,174 @@
+# db_logbuffer.py - Buffered batch writer for the activity log tables
+import queue
+import threading
+from collections import OrderedDict, deque
+from typing import Callable, Dict, Hashable, Iterable
+
+DEFAULT_FLUSH_EVENTS = 100      # flush once this many events are buffered
+DEFAULT_FLUSH_INTERVAL = 0.5    # seconds an event may wait for its flush
+DEFAULT_CAPACITY = 10000        # ring size; the oldest events are dropped beyond it
+DEFAULT_NAME_CACHE_SIZE = 1024
+
+
+class ActivityLogBuffer:
+    """Collects activity log events in memory and writes them in batches.
+
+    log() only appends to a bounded ring buffer. Every flush_events events,
+    or flush_interval seconds after the first unflushed event, the buffered
+    events are handed to write_batch(events) on the database's writer thread
+    (WriteQueue), so a whole batch costs one executemany inside a group
+    commit instead of one transaction per event. The writer queue drains the
+    buffer before it shuts down, so events are not lost on a clean exit.
+
+    log() may run on the bot's event loop, so the flush it triggers never
+    blocks: if the writer queue is full the events go back into the buffer
+    and the timer retries. Batches whose write fails are counted in stats().
+    """
+
+    def __init__(self, writer, write_batch: Callable, name: str = 'activity_logs',
+                 flush_events: int = DEFAULT_FLUSH_EVENTS,
+                 flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+                 capacity: int = DEFAULT_CAPACITY):
+        self.writer = writer
+        self.write_batch = write_batch
+        self.name = name
+        self.flush_events = flush_events
+        self.flush_interval = flush_interval
+
+        self._events = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self._timer = None
+        self._backoff = False  # writer queue was full: leave the next flush to the timer
+        self._stats = {
+            'logged': 0,
+            'dropped': 0,
+            'flushes': 0,
+            'largest_flush': 0,
+            'requeued': 0,
+            'failed_batches': 0,
+            'failed_events': 0,
+        }
+        writer.add_shutdown_hook(self.flush)
+
+    def log(self, event: tuple):
+        """Buffer one event (a row tuple understood by write_batch)"""
+        with self._lock:
+            if len(self._events) == self._events.maxlen:
+                self._stats['dropped'] += 1
+            self._events.append(event)
+            self._stats['logged'] += 1
+            if len(self._events) < self.flush_events or self._backoff:
+                self._arm_timer()
+                return
+        self.flush(block=False)
+
+    def _arm_timer(self):
+        """Schedule a flush in flush_interval seconds (caller holds the lock)"""
+        if self._timer is None:
+            self._timer = threading.Timer(self.flush_interval, self.flush)
+            self._timer.name = f'{self.name}-flush'
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self, block: bool = True):
+        """Hand every buffered event to the writer; returns its Future (None if empty).
+
+        With block=False a full writer queue puts the events back and leaves
+        them for the timer instead of waiting.
+        """
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._events:
+                return None
+            events = list(self._events)
+            self._events.clear()
+        try:
+            if block:
+                future = self.writer.submit(self.write_batch, events)
+            else:
+                future = self.writer.submit_nowait(self.write_batch, events)
+        except queue.Full:
+            self._requeue(events)
+            return None
+
+        with self._lock:
+            self._backoff = False
+            self._stats['flushes'] += 1
+            self._stats['largest_flush'] = max(self._stats['largest_flush'], len(events))
+        future.add_done_callback(lambda done: self._batch_done(done, len(events)))
+        return future
+
+    def _requeue(self, events: list):
+        """Put unflushed events back ahead of newer ones, dropping the oldest past capacity"""
+        with self._lock:
+            room = self._events.maxlen - len(self._events)
+            if room < len(events):
+                self._stats['dropped'] += len(events) - room
+                events = events[len(events) - room:] if room else []
+            self._events.extendleft(reversed(events))
+            self._stats['requeued'] += len(events)
+            self._backoff = True
+            self._arm_timer()
+
+    def _batch_done(self, future, count: int):
+        error = future.exception()
+        if error is None:
+            return
+        with self._lock:
+            self._stats['failed_batches'] += 1
+            self._stats['failed_events'] += count
+        print(f"❌ Writing {count} {self.name} events failed: {error}")
+
+    def stats(self) -> Dict:
+        return {
+            'buffered': len(self._events),
+            'flush_events': self.flush_events,
+            'flush_interval_ms': self.flush_interval * 1000,
+            **self._stats,
+        }
+
+
+class NameCache:
+    """Small thread-safe LRU of user id -> display name columns for log rows"""
+
+    def __init__(self, max_entries: int = DEFAULT_NAME_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def put(self, key: Hashable, value: tuple):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def discard(self, key: Hashable):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def get_many(self, keys: Iterable[Hashable], load: Callable) -> Dict[Hashable, tuple]:
+        """Names for keys; misses are fetched together with load(missing_keys) -> dict"""
+        found, missing = {}, []
+        with self._lock:
+            for key in set(keys):
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    found[key] = self._entries[key]
+                    self.hits += 1
+                else:
+                    missing.append(key)
+                    self.misses += 1
+        if missing:
+            loaded = load(missing)
+            for key, value in loaded.items():
+                self.put(key, value)
+            found.update(loaded)
+        return found
+
+    def stats(self) -> Dict:
+        return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
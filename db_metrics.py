@@ -0,0 +1,390 @@
+# db_metrics.py - Per-method and per-statement timing for Database, with a slow-query log
+import inspect
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+from functools import wraps
+from typing import Dict, List, Optional
+
+DEFAULT_SLOW_QUERY_MS = 100.0   # statements slower than this are logged with their plan
+DEFAULT_SAMPLES = 512           # latest latencies kept per method / statement for percentiles
+DEFAULT_SLOW_LOG_SIZE = 100     # slow statements kept for the dashboard
+DEFAULT_REPORT_INTERVAL = 300.0 # seconds between summary log lines
+PROGRESS_STEPS = 100            # VM steps between progress handler calls
+# SQLite's busy handler sleeps at least 1 ms, so a shorter wait is no lock wait
+LOCK_WAIT_MIN = 0.001
+# Statements that take a write lock (and can sit in busy_timeout) before their
+# first VM steps; for anything else a run too short to reach PROGRESS_STEPS is work
+_LOCKING_SQL = re.compile(r'\s*(BEGIN|COMMIT|END|INSERT|UPDATE|DELETE|REPLACE)\b', re.IGNORECASE)
+
+# Database methods that are not timed: plumbing called from every method,
+# context managers and the metrics readers themselves
+UNINSTRUMENTED = {'get_connection', 'release_connection', 'snapshot_reads', 'get_query_stats'}
+
+_PLACEHOLDER_LIST = re.compile(r'\?(\s*,\s*\?)+')
+
+
+def normalize_sql(sql: str) -> str:
+    """One line per statement shape: whitespace collapsed, IN (?, ?, ...) lists folded"""
+    return _PLACEHOLDER_LIST.sub('?, ...', ' '.join(sql.split()))
+
+
+def _percentile(ordered: List[float], fraction: float) -> float:
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class _Timing:
+    """Counters and a window of recent latencies for one method or statement"""
+
+    __slots__ = ('calls', 'errors', 'rows', 'total', 'max', 'lock_wait', 'samples')
+
+    def __init__(self, samples: int):
+        self.calls = 0
+        self.errors = 0
+        self.rows = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.lock_wait = 0.0
+        self.samples = deque(maxlen=samples)
+
+    def add(self, elapsed: float, rows: int = 0, lock_wait: float = 0.0, error: bool = False):
+        self.calls += 1
+        self.errors += error
+        self.rows += rows
+        self.total += elapsed
+        self.max = max(self.max, elapsed)
+        self.lock_wait += lock_wait
+        self.samples.append(elapsed)
+
+    def report(self, name: str) -> Dict:
+        ordered = sorted(self.samples) or [0.0]
+        return {
+            'name': name,
+            'calls': self.calls,
+            'errors': self.errors,
+            'rows': self.rows,
+            'total_ms': round(self.total * 1000, 2),
+            'mean_ms': round(self.total * 1000 / self.calls, 3) if self.calls else 0.0,
+            'p50_ms': round(_percentile(ordered, 0.50) * 1000, 3),
+            'p95_ms': round(_percentile(ordered, 0.95) * 1000, 3),
+            'p99_ms': round(_percentile(ordered, 0.99) * 1000, 3),
+            'max_ms': round(self.max * 1000, 3),
+            'lock_wait_ms': round(self.lock_wait * 1000, 2),
+        }
+
+
+class TimedCursor(sqlite3.Cursor):
+    """Cursor that reports each statement to the connection's QueryMetrics.
+
+    A statement's time runs from execute() until its rows are fetched (the
+    next execute, fetchall, an exhausted fetchone/fetchmany or close), so
+    lazily stepped SELECTs are timed in full and their rows are counted.
+    """
+
+    _pending = None
+    _thread = None
+
+    def execute(self, sql, parameters=()):
+        self._finish()
+        return self._run(super().execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        self._finish()
+        return self._run(super().executemany, sql, seq_of_parameters, many=True)
+
+    def _run(self, run, sql, parameters, many=False):
+        conn = self.connection
+        if not conn.metrics.enabled:
+            run(sql, parameters)
+            return self
+        conn.first_step = None
+        self._thread = threading.get_ident()
+        started = time.perf_counter()
+        try:
+            run(sql, parameters)
+        except Exception:
+            elapsed = time.perf_counter() - started
+            conn.metrics.record_statement(conn, sql, parameters, elapsed, 0,
+                                          self._lock_wait(sql, started, elapsed), error=True)
+            raise
+        elapsed = time.perf_counter() - started
+        # Row counts: affected rows for DML, fetched rows for queries
+        rows = self.rowcount if self.rowcount > 0 else 0
+        self._pending = [sql, parameters if not many else '(executemany)', elapsed, rows,
+                         self._lock_wait(sql, started, elapsed)]
+        return self
+
+    def _lock_wait(self, sql, started, elapsed):
+        # Time before the first VM steps is spent acquiring locks (busy_timeout).
+        # No progress call means the statement ran under PROGRESS_STEPS steps:
+        # its time is lock wait only if it takes a lock, otherwise it is its own
+        # work (page cache misses on a point lookup are not busy_timeout)
+        first_step = self.connection.first_step
+        if first_step is not None:
+            wait = first_step - started
+        elif _LOCKING_SQL.match(sql):
+            wait = elapsed
+        else:
+            wait = 0.0
+        return wait if wait >= LOCK_WAIT_MIN else 0.0
+
+    def _fetched(self, started, rows, done):
+        if self._pending is not None:
+            self._pending[2] += time.perf_counter() - started
+            self._pending[3] += rows
+            if done:
+                self._finish()
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        self._fetched(started, row is not None, row is None)
+        return row
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._fetched(started, len(rows), len(rows) < (self.arraysize if size is None else size))
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self._fetched(started, len(rows), True)
+        return rows
+
+    def __next__(self):
+        started = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._fetched(started, 0, True)
+            raise
+        self._fetched(started, 1, False)
+        return row
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def _finish(self):
+        pending, self._pending = self._pending, None
+        if pending is not None:
+            self.connection.metrics.record_statement(self.connection, *pending)
+
+    def __del__(self):
+        # Cursors dropped after fetchone() still count; the plan is only
+        # fetched on the thread that owns the connection
+        pending, self._pending = self._pending, None
+        if pending is not None:
+            try:
+                self.connection.metrics.record_statement(
+                    self.connection, *pending, explain=threading.get_ident() == self._thread)
+            except Exception:
+                pass
+
+
+class QueryMetrics:
+    """Call counts, rows and latency percentiles per Database method and per
+    SQL statement, plus a log of slow statements with their query plans.
+
+    install() hooks a connection: its cursors become TimedCursors, and a
+    progress handler marks when a statement starts executing, which
+    separates lock wait (busy_timeout) from the statement's own work.
+    Methods are timed by the @instrumented class decorator.
+    """
+
+    def __init__(self, slow_query_ms: float = DEFAULT_SLOW_QUERY_MS,
+                 samples: int = DEFAULT_SAMPLES,
+                 slow_log_size: int = DEFAULT_SLOW_LOG_SIZE,
+                 enabled: bool = True):
+        self.slow_query_ms = slow_query_ms
+        self.samples = samples
+        self.enabled = enabled
+
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._methods: Dict[str, _Timing] = {}
+        self._statements: Dict[str, _Timing] = {}
+        self._slow = deque(maxlen=slow_log_size)
+        self._started_at = time.time()
+        self._reporter = None
+        self._stop = threading.Event()
+
+    def install(self, conn):
+        """Time every statement run on a PooledConnection"""
+        if not self.enabled:
+            return
+        conn.metrics = self
+        conn.first_step = None
+        conn.cursor_factory = TimedCursor
+
+        def on_progress():
+            if conn.first_step is None:
+                conn.first_step = time.perf_counter()
+            return 0
+
+        conn.set_progress_handler(on_progress, PROGRESS_STEPS)
+
+    def _timing(self, table: Dict[str, _Timing], name: str) -> _Timing:
+        timing = table.get(name)
+        if timing is None:
+            timing = table.setdefault(name, _Timing(self.samples))
+        return timing
+
+    def current_method(self) -> Optional[str]:
+        stack = getattr(self._local, 'methods', None)
+        return stack[-1] if stack else None
+
+    def call(self, name: str, method, args, kwargs):
+        """Run and time one Database method call"""
+        stack = getattr(self._local, 'methods', None)
+        if stack is None:
+            stack = self._local.methods = []
+            self._local.lock_waits = []
+        waits = self._local.lock_waits
+        stack.append(name)
+        waits.append(0.0)
+        started = time.perf_counter()
+        error = False
+        result = None
+        try:
+            result = method(*args, **kwargs)
+            return result
+        except Exception:
+            error = True
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            stack.pop()
+            lock_wait = waits.pop()
+            if waits:
+                waits[-1] += lock_wait  # a caller waited as long as its callees
+            rows = len(result) if isinstance(result, (list, tuple)) else 0
+            with self._lock:
+                self._timing(self._methods, name).add(elapsed, rows, lock_wait, error)
+
+    def record_statement(self, conn, sql: str, parameters, elapsed: float, rows: int,
+                         lock_wait: float = 0.0, error: bool = False, explain: bool = True):
+        key = normalize_sql(sql)
+        waits = getattr(self._local, 'lock_waits', None)
+        if waits:
+            waits[-1] += lock_wait
+        with self._lock:
+            self._timing(self._statements, key).add(elapsed, rows, lock_wait, error)
+        if elapsed * 1000 >= self.slow_query_ms:
+            plan = self._explain(conn, sql, parameters) if explain else []
+            self._log_slow(sql, parameters, elapsed, rows, lock_wait, plan)
+
+    def _log_slow(self, sql, parameters, elapsed, rows, lock_wait, plan):
+        entry = {
+            'at': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'method': self.current_method(),
+            'sql': normalize_sql(sql),
+            'params': repr(parameters)[:300],
+            'ms': round(elapsed * 1000, 2),
+            'lock_wait_ms': round(lock_wait * 1000, 2),
+            'rows': rows,
+            'plan': plan,
+        }
+        with self._lock:
+            self._slow.append(entry)
+        print(f"🐢 Slow query {entry['ms']} ms in {entry['method'] or '?'} "
+              f"(lock wait {entry['lock_wait_ms']} ms, {rows} rows): {entry['sql'][:200]} "
+              f"params={entry['params'][:100]}")
+        for line in plan:
+            print(f"   {line}")
+
+    @staticmethod
+    def _explain(conn, sql: str, parameters) -> List[str]:
+        """EXPLAIN QUERY PLAN of a statement, on a plain (untimed) cursor"""
+        if not sql.lstrip().upper().startswith(('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE', 'REPLACE')):
+            return []
+        if not isinstance(parameters, (tuple, list, dict)):
+            return []  # executemany
+        try:
+            cursor = conn.cursor(sqlite3.Cursor)
+            try:
+                rows = cursor.execute(f'EXPLAIN QUERY PLAN {sql}', parameters).fetchall()
+            finally:
+                cursor.close()
+        except sqlite3.Error as e:
+            return [f'(no plan: {e})']
+        return [row[3] for row in rows]
+
+    def stats(self, limit: int = 20) -> Dict:
+        """Slowest methods and statements by total time, and the slow-query log"""
+        with self._lock:
+            methods = [timing.report(name) for name, timing in self._methods.items()]
+            statements = [timing.report(name) for name, timing in self._statements.items()]
+            slow = list(self._slow)
+        methods.sort(key=lambda item: item['total_ms'], reverse=True)
+        statements.sort(key=lambda item: item['total_ms'], reverse=True)
+        return {
+            'enabled': self.enabled,
+            'since': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self._started_at)),
+            'slow_query_ms': self.slow_query_ms,
+            'method_calls': sum(item['calls'] for item in methods),
+            'statement_calls': sum(item['calls'] for item in statements),
+            'methods': methods[:limit],
+            'statements': statements[:limit],
+            'slow_queries': slow[::-1][:limit],
+        }
+
+    def reset(self):
+        with self._lock:
+            self._methods.clear()
+            self._statements.clear()
+            self._slow.clear()
+            self._started_at = time.time()
+
+    def summary(self, top: int = 3) -> str:
+        """One log line: totals and the methods with the most total time"""
+        stats = self.stats(limit=top)
+        slowest = ', '.join(f"{item['name']} {item['calls']}x p95 {item['p95_ms']} ms"
+                            for item in stats['methods'])
+        return (f"📊 DB since {stats['since']}: {stats['method_calls']} calls, "
+                f"{stats['statement_calls']} statements, {len(self._slow)} slow; "
+                f"top: {slowest or '-'}")
+
+    def start_reporter(self, interval: float = DEFAULT_REPORT_INTERVAL):
+        """Print summary() every interval seconds on a daemon thread"""
+        if not self.enabled or self._reporter is not None:
+            return
+
+        def run():
+            last_calls = None
+            while not self._stop.wait(interval):
+                calls = sum(timing.calls for timing in list(self._methods.values()))
+                if calls != last_calls:
+                    print(self.summary())
+                    last_calls = calls
+
+        self._reporter = threading.Thread(target=run, name='query-metrics', daemon=True)
+        self._reporter.start()
+
+    def stop_reporter(self):
+        self._stop.set()
+
+
+def instrumented(cls):
+    """Class decorator timing every public method through self.metrics"""
+    for name, method in list(vars(cls).items()):
+        if name.startswith('_') or name in UNINSTRUMENTED or not inspect.isfunction(method):
+            continue
+        if inspect.isgeneratorfunction(inspect.unwrap(method)):
+            continue
+        setattr(cls, name, _timed(name, method))
+    return cls
+
+
+def _timed(name, method):
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        metrics = self.metrics
+        if not metrics.enabled:
+            return method(self, *args, **kwargs)
+        return metrics.call(name, method, (self,) + args, kwargs)
+    return wrapper
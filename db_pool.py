@@ -0,0 +1,248 @@
+# db_pool.py - Pooled, thread-aware SQLite connections for Database
+import sqlite3
+import threading
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+# Connection-level PRAGMAs applied once when a pooled connection is opened.
+# foreign_keys stays OFF: delete_product / delete_product_variant remove rows
+# that order_items and inventory_history still reference.
+DEFAULT_PRAGMAS: Tuple[Tuple[str, object], ...] = (
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'NORMAL'),
+    ('cache_size', -32000),        # ~32 MB page cache per connection
+    ('mmap_size', 268435456),      # 256 MB memory-mapped reads
+    ('temp_store', 'MEMORY'),
+    ('busy_timeout', 5000),        # wait up to 5s on a locked database
+    ('foreign_keys', 'OFF'),
+)
+
+DEFAULT_MAX_IDLE = 8
+
+
+class PooledConnection(sqlite3.Connection):
+    """sqlite3 connection whose ``with`` block is re-entrant.
+
+    Database methods call each other while holding a connection
+    (create_order -> check_inventory -> get_variant_id). With one shared
+    connection per thread only the outermost ``with`` commits or rolls back,
+    and every block starts with the default tuple row_factory just like a
+    freshly opened connection did. Explicit commit() calls inside a nested
+    block are deferred to the outermost one, and rollback() there only undoes
+    the innermost savepoint (see db_writer.WriteQueue).
+
+    cursor_factory is used for cursor() and execute() alike, so a
+    db_metrics.TimedCursor sees every statement.
+    """
+
+    cursor_factory = sqlite3.Cursor
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._depth = 0
+        self._row_factories = []
+        self._savepoints = []
+        self._after_commit = []
+
+    def __enter__(self):
+        self._row_factories.append(self.row_factory)
+        self.row_factory = None
+        self._depth += 1
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._depth -= 1
+        self.row_factory = self._row_factories.pop()
+        if self._depth == 0:
+            if exc_type is None:
+                self.commit()
+            else:
+                self.rollback()
+        return False
+
+    def cursor(self, factory=None):
+        return super().cursor(factory or self.cursor_factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def commit(self):
+        """Commit, unless an enclosing ``with`` block owns the transaction"""
+        if self._depth > 1:
+            return
+        super().commit()
+        callbacks, self._after_commit = self._after_commit, []
+        for callback in callbacks:
+            callback()
+
+    def rollback(self):
+        """Roll back the innermost savepoint, or the whole transaction"""
+        if self._depth > 1 and self._savepoints:
+            self.execute(f'ROLLBACK TO {self._savepoints[-1]}')
+            return
+        super().rollback()
+        self._after_commit = []
+
+    def savepoint(self, name: str):
+        self.execute(f'SAVEPOINT {name}')
+        self._savepoints.append(name)
+
+    def release_savepoint(self, name: str, rollback: bool = False):
+        if rollback:
+            self.execute(f'ROLLBACK TO {name}')
+        self.execute(f'RELEASE {name}')
+        self._savepoints.remove(name)
+
+    def after_commit(self, callback):
+        """Run callback once the enclosing transaction commits"""
+        if self._depth > 0:
+            self._after_commit.append(callback)
+        else:
+            callback()
+
+    @property
+    def depth(self) -> int:
+        return self._depth
+
+
+class ConnectionPool:
+    """Hands out one reusable SQLite connection per thread.
+
+    Flask worker threads and the bot's asyncio loop thread each get their own
+    connection, which is kept open between calls. Connections owned by
+    threads that have exited are recycled into an idle list instead of being
+    reopened, so the PRAGMA setup only happens when a connection is created.
+    """
+
+    def __init__(self, db_path: str, max_idle: int = DEFAULT_MAX_IDLE,
+                 pragmas: Optional[Sequence[Tuple[str, object]]] = None,
+                 timeout: float = 5.0,
+                 on_connect: Optional[Callable[[PooledConnection], None]] = None):
+        self.db_path = db_path
+        self.max_idle = max_idle
+        self.pragmas = tuple(pragmas) if pragmas is not None else DEFAULT_PRAGMAS
+        self.timeout = timeout
+        self.on_connect = on_connect
+
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._owners: Dict[int, Tuple[threading.Thread, PooledConnection]] = {}
+        self._idle = []
+
+        self._stats = {
+            'created': 0,
+            'closed': 0,
+            'checkouts': 0,
+            'reused': 0,
+            'recycled': 0,
+        }
+
+    def _open(self) -> PooledConnection:
+        conn = sqlite3.connect(self.db_path, timeout=self.timeout,
+                               check_same_thread=False, factory=PooledConnection)
+        cursor = conn.cursor()
+        for name, value in self.pragmas:
+            cursor.execute(f'PRAGMA {name} = {value}')
+        cursor.close()
+        if self.on_connect is not None:
+            self.on_connect(conn)
+        self._stats['created'] += 1
+        return conn
+
+    def _reset(self, conn: PooledConnection) -> bool:
+        """Prepare a connection for another thread, False if it is unusable"""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            conn._depth = 0
+            conn._row_factories = []
+            conn._savepoints = []
+            conn._after_commit = []
+            conn.row_factory = None
+            return True
+        except sqlite3.Error:
+            return False
+
+    def _park(self, conn: PooledConnection):
+        """Return a connection to the idle list or close it (lock held)"""
+        if len(self._idle) < self.max_idle and self._reset(conn):
+            self._idle.append(conn)
+        else:
+            self._close(conn)
+
+    def _close(self, conn: PooledConnection):
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        self._stats['closed'] += 1
+
+    def _collect_dead_threads(self):
+        """Recycle connections of threads that are gone (lock held)"""
+        dead = [ident for ident, (thread, _) in self._owners.items() if not thread.is_alive()]
+        for ident in dead:
+            _, conn = self._owners.pop(ident)
+            self._stats['recycled'] += 1
+            self._park(conn)
+
+    def connection(self) -> PooledConnection:
+        """Get the calling thread's connection, opening one if needed"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            self._stats['checkouts'] += 1
+            self._stats['reused'] += 1
+            return conn
+
+        with self._lock:
+            self._collect_dead_threads()
+            if self._idle:
+                conn = self._idle.pop()
+                self._stats['reused'] += 1
+            else:
+                conn = self._open()
+            self._stats['checkouts'] += 1
+            thread = threading.current_thread()
+            self._owners[thread.ident] = (thread, conn)
+
+        self._local.conn = conn
+        return conn
+
+    def current(self) -> Optional[PooledConnection]:
+        """The calling thread's connection, if it has one"""
+        return getattr(self._local, 'conn', None)
+
+    def release(self):
+        """Give the calling thread's connection back to the idle list"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or conn.depth > 0:
+            return
+        self._local.conn = None
+        with self._lock:
+            self._owners.pop(threading.get_ident(), None)
+            self._park(conn)
+
+    def close_all(self):
+        """Close every pooled connection (idle and thread-owned)"""
+        with self._lock:
+            for _, conn in self._owners.values():
+                self._close(conn)
+            for conn in self._idle:
+                self._close(conn)
+            self._owners.clear()
+            self._idle = []
+        self._local = threading.local()
+
+    def stats(self) -> Dict:
+        """Snapshot of pool counters"""
+        with self._lock:
+            self._collect_dead_threads()
+            return {
+                'db_path': self.db_path,
+                'thread_connections': len(self._owners),
+                'idle_connections': len(self._idle),
+                'max_idle': self.max_idle,
+                'pragmas': {name: value for name, value in self.pragmas},
+                **self._stats,
+            }
@@ -0,0 +1,153 @@
+# db_snapshot.py - Read-only snapshot of store.db for long dashboard reports
+import os
+import pathlib
+import sqlite3
+import threading
+import time
+from functools import wraps
+from typing import Callable, Dict, Optional
+
+from db_backup import DEFAULT_PAGES_PER_STEP, DEFAULT_STEP_SLEEP, online_copy
+from db_pool import PooledConnection
+
+DEFAULT_MAX_AGE = 300.0        # seconds before a report triggers a refresh
+
+
+class ReportSnapshot:
+    """A periodically refreshed copy of the database for heavy reads.
+
+    Reports and exports scan whole tables. Run on store.db they hold a WAL
+    read snapshot for their whole duration, which keeps checkpoints from
+    completing while the bot is writing orders. Reading a separate copy
+    (store_snapshot.db, made with the online backup API in small steps and
+    swapped in atomically) keeps them off the live file entirely.
+
+    The first read builds the snapshot; afterwards a read that finds it
+    older than max_age starts a background refresh and keeps using the
+    current copy, so no report waits for a backup.
+    """
+
+    def __init__(self, db_path: str, snapshot_path: str = None,
+                 max_age: float = DEFAULT_MAX_AGE,
+                 pages_per_step: int = DEFAULT_PAGES_PER_STEP,
+                 step_sleep: float = DEFAULT_STEP_SLEEP,
+                 on_connect: Optional[Callable[[PooledConnection], None]] = None):
+        if snapshot_path is None:
+            root, ext = os.path.splitext(db_path)
+            snapshot_path = f'{root}_snapshot{ext or ".db"}'
+        self.db_path = db_path
+        self.snapshot_path = snapshot_path
+        self.max_age = max_age
+        self.pages_per_step = pages_per_step
+        self.step_sleep = step_sleep
+        self.on_connect = on_connect
+
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._local = threading.local()
+        self._refreshing = None
+        self._generation = 0
+        self._refreshed_at = None
+        self._stats = {
+            'refreshes': 0,
+            'failures': 0,
+            'last_refresh_seconds': None,
+            'connections': 0,
+        }
+
+    def refresh(self):
+        """Copy the live database into a new snapshot and swap it in"""
+        with self._refresh_lock:
+            self._copy()
+
+    def _copy(self):
+        started = time.monotonic()
+        # The bot and the dashboard both refresh the same snapshot: a per-process
+        # temp file keeps one from deleting or replacing the other's half-written copy
+        temp_path = f'{self.snapshot_path}.{os.getpid()}.tmp'
+        # online_copy leaves the copy in DELETE mode: a read-only WAL
+        # database would need a -shm file next to it
+        try:
+            online_copy(self.db_path, temp_path, self.pages_per_step, self.step_sleep)
+            os.replace(temp_path, self.snapshot_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        with self._lock:
+            self._generation += 1
+            self._refreshed_at = time.monotonic()
+            self._stats['refreshes'] += 1
+            self._stats['last_refresh_seconds'] = round(self._refreshed_at - started, 3)
+        print(f"📸 Refreshed report snapshot in {self._stats['last_refresh_seconds']}s")
+
+    def _refresh_in_background(self):
+        def run():
+            try:
+                self.refresh()
+            except Exception as e:
+                self._stats['failures'] += 1
+                print(f"❌ Report snapshot refresh failed: {e}")
+            finally:
+                self._refreshing = None
+
+        with self._lock:
+            if self._refreshing is not None:
+                return
+            self._refreshing = threading.Thread(target=run, name='report-snapshot', daemon=True)
+            self._refreshing.start()
+
+    def _ensure_fresh(self):
+        if self._refreshed_at is None:
+            with self._refresh_lock:
+                if self._refreshed_at is None:
+                    self._copy()
+        elif time.monotonic() - self._refreshed_at > self.max_age:
+            self._refresh_in_background()
+
+    def connection(self) -> PooledConnection:
+        """The calling thread's read-only connection to the current snapshot"""
+        self._ensure_fresh()
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            # Keep a connection that is mid-report on its snapshot
+            if self._local.generation == self._generation or conn.depth > 0:
+                return conn
+            conn.close()
+
+        uri = pathlib.Path(os.path.abspath(self.snapshot_path)).as_uri() + '?mode=ro'
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False, factory=PooledConnection)
+        conn.execute('PRAGMA query_only = 1')
+        if self.on_connect is not None:
+            self.on_connect(conn)
+        self._local.conn = conn
+        self._local.generation = self._generation
+        self._stats['connections'] += 1
+        return conn
+
+    def age(self):
+        """Seconds since the last refresh (None before the first one)"""
+        if self._refreshed_at is None:
+            return None
+        return time.monotonic() - self._refreshed_at
+
+    def stats(self) -> Dict:
+        age = self.age()
+        return {
+            'snapshot_path': self.snapshot_path,
+            'age_seconds': round(age, 1) if age is not None else None,
+            'max_age': self.max_age,
+            'generation': self._generation,
+            'refreshing': self._refreshing is not None,
+            **self._stats,
+        }
+
+
+def snapshot_read(method):
+    """Run a Database read method against the report snapshot"""
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.snapshot_reads():
+            return method(self, *args, **kwargs)
+    return wrapper
@@ -0,0 +1,185 @@
+# db_writer.py - Single-writer queue with group commit for store.db
+import atexit
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict
+
+from db_pool import ConnectionPool
+
+DEFAULT_MAX_BATCH = 64         # operations per group commit
+DEFAULT_MAX_DELAY = 0.005      # seconds to wait for more operations
+DEFAULT_MAX_QUEUE = 4096
+
+_STOP = object()
+
+
+class WriteQueue:
+    """Funnels write operations from any thread through one writer thread.
+
+    SQLite (even in WAL mode) allows a single writer, so instead of every
+    thread committing its own tiny transaction and retrying on SQLITE_BUSY,
+    operations are queued and the writer runs up to max_batch of them (or
+    whatever arrived within max_delay) inside one BEGIN IMMEDIATE transaction.
+    Each operation gets its own savepoint, so one failing operation is rolled
+    back without affecting the rest of the group. Futures resolve only after
+    the group has committed.
+
+    Operations are plain callables, typically bound Database methods; they
+    run on the writer thread and therefore share its pooled connection.
+    """
+
+    def __init__(self, pool: ConnectionPool, max_batch: int = DEFAULT_MAX_BATCH,
+                 max_delay: float = DEFAULT_MAX_DELAY, max_queue: int = DEFAULT_MAX_QUEUE):
+        self.pool = pool
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._lock = threading.Lock()
+        self._shutdown_hooks = []
+        self._stats = {
+            'submitted': 0,
+            'completed': 0,
+            'failed': 0,
+            'groups': 0,
+            'largest_group': 0,
+            'commit_errors': 0,
+            'queue_full': 0,
+        }
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='db-writer', daemon=True)
+                self._thread.start()
+                # Commit queued writes (e.g. activity logs) when the process exits
+                atexit.register(self.shutdown)
+
+    def _put(self, fn: Callable, args, kwargs, block: bool) -> Future:
+        if threading.current_thread() is self._thread:
+            # Already on the writer (an operation queuing another): run inline
+            future = Future()
+            future.set_result(fn(*args, **kwargs))
+            return future
+
+        self._ensure_started()
+        future = Future()
+        try:
+            self._queue.put((future, fn, args, kwargs), block=block)
+        except queue.Full:
+            self._stats['queue_full'] += 1
+            raise
+        self._stats['submitted'] += 1
+        return future
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        """Queue a write; the future resolves with fn's result after commit"""
+        return self._put(fn, args, kwargs, block=True)
+
+    def submit_nowait(self, fn: Callable, *args, **kwargs) -> Future:
+        """Queue a write, raising queue.Full instead of blocking"""
+        return self._put(fn, args, kwargs, block=False)
+
+    def _collect(self, first) -> list:
+        """Gather up to max_batch operations arriving within max_delay"""
+        batch = [first]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            batch.append(item)
+            if item is _STOP:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect(self._queue.get())
+            stop = batch[-1] is _STOP
+            if stop:
+                batch.pop()
+            if batch:
+                self._commit_group(batch)
+            if stop:
+                self.pool.release()
+                return
+
+    def _commit_group(self, batch):
+        outcomes = []
+        conn = self.pool.connection()
+        try:
+            with conn:
+                conn.execute('BEGIN IMMEDIATE')
+                for index, (future, fn, args, kwargs) in enumerate(batch):
+                    if not future.set_running_or_notify_cancel():
+                        outcomes.append(None)
+                        continue
+                    savepoint = f'write_{index}'
+                    conn.savepoint(savepoint)
+                    try:
+                        result = fn(*args, **kwargs)
+                    except Exception as e:
+                        conn.release_savepoint(savepoint, rollback=True)
+                        outcomes.append((future, False, e))
+                    else:
+                        conn.release_savepoint(savepoint)
+                        outcomes.append((future, True, result))
+        except sqlite3.Error as e:
+            # The whole group was rolled back: fail every pending future
+            self._stats['commit_errors'] += 1
+            print(f"❌ Group commit of {len(batch)} writes failed: {e}")
+            outcomes = [(future, False, e) for future, _, _, _ in batch if not future.done()]
+
+        self._stats['groups'] += 1
+        self._stats['largest_group'] = max(self._stats['largest_group'], len(batch))
+        for outcome in outcomes:
+            if outcome is None:
+                continue
+            future, ok, value = outcome
+            if ok:
+                self._stats['completed'] += 1
+                future.set_result(value)
+            else:
+                self._stats['failed'] += 1
+                future.set_exception(value)
+
+    def add_shutdown_hook(self, fn: Callable):
+        """Call fn before the writer stops (e.g. to drain a buffer into the queue)"""
+        self._shutdown_hooks.append(fn)
+
+    def flush(self, timeout: float = None):
+        """Wait until everything queued so far has been committed"""
+        self.submit(lambda: None).result(timeout)
+
+    def shutdown(self, wait: bool = True):
+        """Commit what is queued, then stop the writer thread"""
+        for hook in self._shutdown_hooks:
+            try:
+                hook()
+            except Exception as e:
+                print(f"❌ Writer shutdown hook failed: {e}")
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._queue.put(_STOP)
+        if wait:
+            thread.join()
+
+    def stats(self) -> Dict:
+        return {
+            'queued': self._queue.qsize(),
+            'max_batch': self.max_batch,
+            'max_delay_ms': self.max_delay * 1000,
+            'running': self._thread is not None and self._thread.is_alive(),
+            **self._stats,
+        }
@@ -0,0 +1,1010 @@
+# migrations.py - Versioned schema migrations keyed on PRAGMA user_version
+#
+# Each migration runs exactly once per database file, in its own
+# BEGIN IMMEDIATE transaction, and bumps PRAGMA user_version to its number.
+# Once a database is current, startup costs a single PRAGMA read.
+#
+# To change the schema, append a new @migration(N, ...) with the next number;
+# never edit a migration that has already shipped.
+from typing import Callable, List, Tuple
+
+from order_status import CANCELLED, DELIVERED_CODES, status_code_sql
+from product_search import fold_sql
+
+MIGRATIONS: List[Tuple[int, str, Callable]] = []
+
+
+def migration(version: int, description: str):
+    """Register fn(cursor, database) as schema migration number `version`"""
+    def register(fn):
+        if any(existing == version for existing, _, _ in MIGRATIONS):
+            raise ValueError(f"Duplicate migration version {version}")
+        MIGRATIONS.append((version, description, fn))
+        MIGRATIONS.sort(key=lambda entry: entry[0])
+        return fn
+    return register
+
+
+def latest_version() -> int:
+    return MIGRATIONS[-1][0] if MIGRATIONS else 0
+
+
+def schema_version(conn) -> int:
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def apply_migrations(conn, database) -> List[int]:
+    """Apply every pending migration, returns the versions that ran.
+
+    The version is re-read after taking the write lock, so when the bot and
+    the dashboard start together only one of them runs each migration.
+    """
+    if schema_version(conn) >= latest_version():
+        return []
+
+    applied = []
+    for version, description, fn in MIGRATIONS:
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            if schema_version(conn) >= version:
+                continue
+            print(f"🔄 Applying schema migration {version}: {description}")
+            fn(conn.cursor(), database)
+            conn.execute(f'PRAGMA user_version = {int(version)}')
+        applied.append(version)
+    return applied
+
+
+def _column_names(cursor, table: str) -> List[str]:
+    cursor.execute(f'PRAGMA table_info({table})')
+    return [column[1] for column in cursor.fetchall()]
+
+
+@migration(1, 'Base schema: catalog, inventory, orders, users and activity logs')
+def _base_schema(cursor, database):
+    # Categories table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS categories (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT UNIQUE NOT NULL,
+            arabic_name TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # Products table with enhanced fields
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS products (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            category_id INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            arabic_name TEXT,
+            price REAL NOT NULL,
+            description TEXT,
+            arabic_description TEXT,
+            model_number TEXT UNIQUE,
+            barcode_data TEXT,
+            is_active BOOLEAN DEFAULT 1,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (category_id) REFERENCES categories (id)
+        )
+    ''')
+
+    # Product variants with inventory tracking
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS product_variants (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            product_id INTEGER NOT NULL,
+            color TEXT NOT NULL,
+            color_arabic TEXT,
+            size TEXT NOT NULL,
+            size_arabic TEXT,
+            quantity INTEGER DEFAULT 0,
+            min_stock_alert INTEGER DEFAULT 5,
+            image_path TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (product_id) REFERENCES products (id),
+            UNIQUE(product_id, color, size)
+        )
+    ''')
+
+    # Orders table with enhanced status tracking AND LOCATION FIELDS
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS orders (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            user_name TEXT NOT NULL,
+            user_phone TEXT NOT NULL,
+            user_address TEXT NOT NULL,
+            user_state TEXT,
+            user_region TEXT,
+            username TEXT,
+            total_amount REAL NOT NULL,
+            status TEXT DEFAULT 'pending',
+            order_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            status_update TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            notes TEXT,
+            shipping_method TEXT
+        )
+    ''')
+
+    # Databases created before the location fields existed
+    columns = _column_names(cursor, 'orders')
+    if 'user_state' not in columns:
+        print("🔄 Adding user_state column to orders table...")
+        cursor.execute('ALTER TABLE orders ADD COLUMN user_state TEXT')
+    if 'user_region' not in columns:
+        print("🔄 Adding user_region column to orders table...")
+        cursor.execute('ALTER TABLE orders ADD COLUMN user_region TEXT')
+
+    # Order items table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS order_items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            order_id INTEGER NOT NULL,
+            product_id INTEGER NOT NULL,
+            variant_id INTEGER,
+            product_name TEXT NOT NULL,
+            price REAL NOT NULL,
+            quantity INTEGER NOT NULL,
+            color TEXT,
+            size TEXT,
+            FOREIGN KEY (order_id) REFERENCES orders (id),
+            FOREIGN KEY (product_id) REFERENCES products (id),
+            FOREIGN KEY (variant_id) REFERENCES product_variants (id)
+        )
+    ''')
+
+    # Inventory history for tracking changes
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS inventory_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            product_id INTEGER NOT NULL,
+            variant_id INTEGER,
+            change_type TEXT NOT NULL, -- 'sale', 'restock', 'adjustment'
+            old_quantity INTEGER,
+            new_quantity INTEGER,
+            change_amount INTEGER,
+            reason TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (product_id) REFERENCES products (id),
+            FOREIGN KEY (variant_id) REFERENCES product_variants (id)
+        )
+    ''')
+
+    # Customers table for notifications (buyers)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS customers (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            telegram_id INTEGER UNIQUE NOT NULL,
+            username TEXT,
+            first_name TEXT,
+            last_name TEXT,
+            phone TEXT,
+            total_orders INTEGER DEFAULT 0,
+            total_spent REAL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_active TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # Bot users table for ALL users (including non-buyers)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS bot_users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            telegram_id INTEGER UNIQUE NOT NULL,
+            username TEXT,
+            first_name TEXT,
+            last_name TEXT,
+            phone TEXT,
+            total_interactions INTEGER DEFAULT 0,
+            has_placed_order BOOLEAN DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_active TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # Dashboard users table for admin/user access
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS dashboard_users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL,
+            role TEXT NOT NULL DEFAULT "user",
+            permissions TEXT,
+            is_active BOOLEAN DEFAULT 1,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_login TIMESTAMP,
+            full_name TEXT
+        )
+    ''')
+
+    # Predefined sizes and colors for consistency
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS size_options (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            size_code TEXT UNIQUE NOT NULL,
+            arabic_name TEXT,
+            display_order INTEGER DEFAULT 0
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS color_options (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            color_code TEXT UNIQUE NOT NULL,
+            arabic_name TEXT,
+            display_order INTEGER DEFAULT 0
+        )
+    ''')
+
+    # Staff activity logs (dashboard actions)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS staff_activity_logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            username TEXT,
+            full_name TEXT,
+            action_type TEXT NOT NULL,
+            action_description TEXT NOT NULL,
+            target_type TEXT,
+            target_id INTEGER,
+            target_name TEXT,
+            old_value TEXT,
+            new_value TEXT,
+            ip_address TEXT,
+            user_agent TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES dashboard_users (id)
+        )
+    ''')
+
+    # Client activity logs (bot user actions)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS client_activity_logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            telegram_id INTEGER NOT NULL,
+            username TEXT,
+            first_name TEXT,
+            last_name TEXT,
+            activity_type TEXT NOT NULL,
+            activity_description TEXT NOT NULL,
+            target_type TEXT,
+            target_id INTEGER,
+            target_name TEXT,
+            metadata TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (telegram_id) REFERENCES bot_users (telegram_id)
+        )
+    ''')
+
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_staff_logs_user_id ON staff_activity_logs(user_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_staff_logs_created_at ON staff_activity_logs(created_at)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_staff_logs_action_type ON staff_activity_logs(action_type)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_client_logs_telegram_id ON client_activity_logs(telegram_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_client_logs_created_at ON client_activity_logs(created_at)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_client_logs_activity_type ON client_activity_logs(activity_type)')
+
+    # Insert default sizes and colors
+    database._insert_default_options(cursor)
+
+    # Existing customers become bot users (one-off, was re-run on every start)
+    cursor.execute('''
+        INSERT OR IGNORE INTO bot_users (telegram_id, username, first_name, last_name, has_placed_order)
+        SELECT telegram_id, username, first_name, last_name, 1
+        FROM customers
+    ''')
+    if cursor.rowcount > 0:
+        print(f"✅ Migrated {cursor.rowcount} existing customers to bot_users")
+
+    # Default admin user if no dashboard users exist
+    cursor.execute('SELECT COUNT(*) FROM dashboard_users')
+    if cursor.fetchone()[0] == 0:
+        database._create_default_admin(cursor)
+
+
+@migration(2, 'Order list filter indexes (status, state/region, order date)')
+def _order_filter_indexes(cursor, database):
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_orders_status ON orders(status COLLATE NOCASE)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_orders_state_region ON orders(user_state COLLATE NOCASE, user_region COLLATE NOCASE)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_orders_order_date ON orders(order_date)')
+
+
+@migration(3, 'Missing-index pack for order, order item, variant and history lookups')
+def _missing_index_pack(cursor, database):
+    # show_my_orders / customer summaries: WHERE user_id = ? ORDER BY order_date
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_orders_user_date ON orders(user_id, order_date)')
+    # Every order load (items per order)
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_order_items_order_id ON order_items(order_id)')
+    # Sales per product; covering for the SUM(quantity) / SUM(quantity * price) subqueries
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_order_items_product_sales
+        ON order_items(product_id, order_id, quantity, price)
+    ''')
+    # Catalog and stock lookups only ever want in-stock variants.
+    # (product_id alone is already the prefix of UNIQUE(product_id, color, size).)
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_variants_in_stock
+        ON product_variants(product_id, color, size) WHERE quantity > 0
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_inventory_history_variant ON inventory_history(variant_id, created_at)')
+    cursor.execute('ANALYZE')
+
+
+@migration(4, 'Price change batches for bulk repricing undo')
+def _price_change_batches(cursor, database):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS price_change_batches (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            operation TEXT NOT NULL,
+            value REAL,
+            rounding TEXT,
+            product_count INTEGER DEFAULT 0,
+            created_by INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            reverted_at TIMESTAMP
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS price_change_items (
+            batch_id INTEGER NOT NULL,
+            product_id INTEGER NOT NULL,
+            old_price REAL NOT NULL,
+            new_price REAL NOT NULL,
+            PRIMARY KEY (batch_id, product_id),
+            FOREIGN KEY (batch_id) REFERENCES price_change_batches (id),
+            FOREIGN KEY (product_id) REFERENCES products (id)
+        )
+    ''')
+
+
+
+# Canonical status code of order alias {o}, from its status text with the
+# order_status mapping. Triggers classify with this rather than reading
+# orders.status_code, which trg_orders_status_code_* may not have refreshed
+# yet when they fire; whole-table rebuilds read the indexed column instead.
+def order_code_sql(o: str) -> str:
+    return status_code_sql(f'{o}.status')
+
+
+# Orders that count towards a customer's totals (everything but cancelled)
+def counted_order_sql(code: str) -> str:
+    return f'{code} != {CANCELLED}'
+
+
+# sales_daily bucket of a status code: delivered (DELIVERED_CODES, like the
+# accounting reports), cancelled, or open for everything still in progress
+def sales_bucket_sql(code: str) -> str:
+    delivered = ' '.join(f"WHEN {int(c)} THEN 'delivered'" for c in DELIVERED_CODES)
+    return f"CASE {code} {delivered} WHEN {CANCELLED} THEN 'cancelled' ELSE 'open' END"
+
+
+# Text matching used by migrations 5 and 6 as they shipped; migration 12
+# replaces their triggers with the canonical codes above
+_SHIPPED_COUNTED_ORDER_SQL = "LOWER(COALESCE({o}.status, '')) NOT IN ('cancelled', 'ملغي', 'ملغى')"
+_SHIPPED_SALES_BUCKET_SQL = """CASE
+        WHEN {o}.status LIKE '%تم التوصيل%' OR {o}.status LIKE '%delivered%'
+          OR {o}.status LIKE '%مكتمل%' OR {o}.status LIKE '%completed%' THEN 'delivered'
+        WHEN LOWER(COALESCE({o}.status, '')) IN ('cancelled', 'ملغي', 'ملغى') THEN 'cancelled'
+        ELSE 'open'
+    END"""
+
+# Recompute total_orders / total_spent / last_order_date for the customers
+# matched by {where}, counting the orders o for which {counted} holds; each
+# subquery is a range read on idx_orders_user_date
+REFRESH_CUSTOMERS_SQL = """
+    UPDATE customers SET
+        total_orders = (SELECT COUNT(*) FROM orders o
+                        WHERE o.user_id = customers.telegram_id AND {counted}),
+        total_spent = (SELECT COALESCE(SUM(o.total_amount), 0) FROM orders o
+                       WHERE o.user_id = customers.telegram_id AND {counted}),
+        last_order_date = (SELECT MAX(o.order_date) FROM orders o
+                           WHERE o.user_id = customers.telegram_id AND {counted})
+    WHERE {where}
+"""
+# Whole-table rebuild on the maintained status_code column
+REBUILD_CUSTOMERS_SQL = REFRESH_CUSTOMERS_SQL.format(where='1 = 1', counted=counted_order_sql('o.status_code'))
+
+
+def _customer_triggers(cursor, counted: Callable[[str], str]):
+    """Triggers keeping customers' order aggregates current; counted(o) -> SQL condition"""
+    # A new order only ever adds to its customer's totals. create_order inserts
+    # the order before the customer row, so the trigger creates it if needed.
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_orders_customer_insert
+        AFTER INSERT ON orders
+        WHEN NEW.user_id IS NOT NULL AND {counted('NEW')}
+        BEGIN
+            INSERT INTO customers (telegram_id, total_orders, total_spent, last_order_date)
+            VALUES (NEW.user_id, 1, COALESCE(NEW.total_amount, 0), NEW.order_date)
+            ON CONFLICT(telegram_id) DO UPDATE SET
+                total_orders = COALESCE(total_orders, 0) + 1,
+                total_spent = COALESCE(total_spent, 0) + excluded.total_spent,
+                last_order_date = NULLIF(MAX(COALESCE(last_order_date, ''), COALESCE(excluded.last_order_date, '')), '');
+        END
+    """)
+    # Deletes, cancellations and edits recompute the affected customers,
+    # since the last order date may move backwards
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_orders_customer_delete
+        AFTER DELETE ON orders
+        BEGIN
+            {REFRESH_CUSTOMERS_SQL.format(where='telegram_id = OLD.user_id', counted=counted('o'))};
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_orders_customer_update
+        AFTER UPDATE OF user_id, status, total_amount, order_date ON orders
+        WHEN OLD.user_id IS NOT NEW.user_id OR OLD.status IS NOT NEW.status
+          OR OLD.total_amount IS NOT NEW.total_amount OR OLD.order_date IS NOT NEW.order_date
+        BEGIN
+            {REFRESH_CUSTOMERS_SQL.format(where='telegram_id IN (OLD.user_id, NEW.user_id)', counted=counted('o'))};
+        END
+    """)
+
+
+@migration(5, 'Customer order aggregates maintained by triggers on orders')
+def _customer_aggregates(cursor, database):
+    if 'last_order_date' not in _column_names(cursor, 'customers'):
+        cursor.execute('ALTER TABLE customers ADD COLUMN last_order_date TIMESTAMP')
+    # Customers page: ORDER BY total_spent DESC, telegram_id DESC with a keyset cursor
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_customers_spent ON customers(total_spent, telegram_id)')
+
+    _customer_triggers(cursor, lambda o: _SHIPPED_COUNTED_ORDER_SQL.format(o=o))
+    # Backfill from the existing orders
+    cursor.execute(REFRESH_CUSTOMERS_SQL.format(where='1 = 1', counted=_SHIPPED_COUNTED_ORDER_SQL.format(o='o')))
+
+
+SALES_DAY_SQL = "COALESCE(date({o}.order_date), '')"
+
+# Adds a delta to sales_daily; {select} yields
+# (day, status_bucket, product_id, color, size, quantity, revenue, order_count)
+SALES_DELTA_SQL = """
+    INSERT INTO sales_daily (day, status_bucket, product_id, color, size, quantity, revenue, order_count)
+    {select}
+    ON CONFLICT(day, status_bucket, product_id, color, size) DO UPDATE SET
+        quantity = quantity + excluded.quantity,
+        revenue = revenue + excluded.revenue,
+        order_count = order_count + excluded.order_count
+"""
+
+
+def _order_total_delta(o: str, sign: str, bucket: Callable[[str], str]) -> str:
+    """Order-level row (product_id 0) for order alias `o`"""
+    return SALES_DELTA_SQL.format(select=f"""
+        SELECT {SALES_DAY_SQL.format(o=o)}, {bucket(o)}, 0, '', '',
+               0, {sign}COALESCE({o}.total_amount, 0), {sign}1
+        WHERE true""")
+
+
+def _order_items_delta(o: str, sign: str, bucket: Callable[[str], str]) -> str:
+    """Variant rows for every item of order `o`"""
+    return SALES_DELTA_SQL.format(select=f"""
+        SELECT {SALES_DAY_SQL.format(o=o)}, {bucket(o)},
+               oi.product_id, COALESCE(oi.color, ''), COALESCE(oi.size, ''),
+               {sign}SUM(oi.quantity), {sign}SUM(oi.quantity * oi.price), {sign}COUNT(*)
+        FROM order_items oi
+        WHERE oi.order_id = {o}.id
+        GROUP BY oi.product_id, COALESCE(oi.color, ''), COALESCE(oi.size, '')""")
+
+
+def _item_delta(item: str, sign: str, bucket: Callable[[str], str]) -> str:
+    """Variant row for one order_items row, bucketed by its order"""
+    return SALES_DELTA_SQL.format(select=f"""
+        SELECT {SALES_DAY_SQL.format(o='o')}, {bucket('o')},
+               {item}.product_id, COALESCE({item}.color, ''), COALESCE({item}.size, ''),
+               {sign}{item}.quantity, {sign}{item}.quantity * {item}.price, {sign}1
+        FROM orders o
+        WHERE o.id = {item}.order_id""")
+
+
+def sales_daily_rebuild_sql(bucket: str) -> List[str]:
+    """Statements recomputing sales_daily from orders and order_items, bucketing order o with `bucket`"""
+    return [
+        'DELETE FROM sales_daily',
+        f"""
+        INSERT INTO sales_daily (day, status_bucket, product_id, color, size, quantity, revenue, order_count)
+        SELECT {SALES_DAY_SQL.format(o='o')}, {bucket}, 0, '', '',
+               0, SUM(COALESCE(o.total_amount, 0)), COUNT(*)
+        FROM orders o
+        GROUP BY 1, 2
+        """,
+        f"""
+        INSERT INTO sales_daily (day, status_bucket, product_id, color, size, quantity, revenue, order_count)
+        SELECT {SALES_DAY_SQL.format(o='o')}, {bucket},
+               oi.product_id, COALESCE(oi.color, ''), COALESCE(oi.size, ''),
+               SUM(oi.quantity), SUM(oi.quantity * oi.price), COUNT(*)
+        FROM order_items oi
+        JOIN orders o ON o.id = oi.order_id
+        GROUP BY 1, 2, 3, 4, 5
+        """,
+    ]
+
+
+# Whole-table rebuild on the maintained status_code column
+SALES_DAILY_REBUILD_SQL = sales_daily_rebuild_sql(sales_bucket_sql('o.status_code'))
+
+
+def _sales_daily_triggers(cursor, bucket: Callable[[str], str]):
+    """Triggers keeping sales_daily current; bucket(o) -> SQL status_bucket of order alias o"""
+    # create_order inserts the order row first, then its items
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_sales_daily_order_insert
+        AFTER INSERT ON orders
+        BEGIN
+            {_order_total_delta('NEW', '', bucket)};
+        END
+    ''')
+    # Moving an order to another day or bucket moves its items with it
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_sales_daily_order_update
+        AFTER UPDATE OF status, order_date, total_amount ON orders
+        WHEN OLD.status IS NOT NEW.status OR OLD.order_date IS NOT NEW.order_date
+          OR OLD.total_amount IS NOT NEW.total_amount
+        BEGIN
+            {_order_total_delta('OLD', '-', bucket)};
+            {_order_total_delta('NEW', '', bucket)};
+            {_order_items_delta('OLD', '-', bucket)};
+            {_order_items_delta('NEW', '', bucket)};
+        END
+    ''')
+    # Items still present when their order is deleted are removed here;
+    # items deleted after their order no longer match an order below
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_sales_daily_order_delete
+        AFTER DELETE ON orders
+        BEGIN
+            {_order_total_delta('OLD', '-', bucket)};
+            {_order_items_delta('OLD', '-', bucket)};
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_sales_daily_item_insert
+        AFTER INSERT ON order_items
+        BEGIN
+            {_item_delta('NEW', '', bucket)};
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_sales_daily_item_update
+        AFTER UPDATE OF order_id, product_id, color, size, quantity, price ON order_items
+        BEGIN
+            {_item_delta('OLD', '-', bucket)};
+            {_item_delta('NEW', '', bucket)};
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_sales_daily_item_delete
+        AFTER DELETE ON order_items
+        BEGIN
+            {_item_delta('OLD', '-', bucket)};
+        END
+    ''')
+
+
+@migration(6, 'Daily sales rollup (sales_daily) maintained by triggers')
+def _sales_daily(cursor, database):
+    # One row per day x status bucket x variant. product_id 0 rows hold the
+    # order-level totals: revenue is orders.total_amount, order_count counts
+    # orders. On variant rows order_count counts order lines.
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sales_daily (
+            day TEXT NOT NULL,
+            status_bucket TEXT NOT NULL,
+            product_id INTEGER NOT NULL,
+            color TEXT NOT NULL DEFAULT '',
+            size TEXT NOT NULL DEFAULT '',
+            quantity INTEGER NOT NULL DEFAULT 0,
+            revenue REAL NOT NULL DEFAULT 0,
+            order_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, status_bucket, product_id, color, size)
+        ) WITHOUT ROWID
+    ''')
+
+    _sales_daily_triggers(cursor, lambda o: _SHIPPED_SALES_BUCKET_SQL.format(o=o))
+    # Backfill from order history
+    for sql in sales_daily_rebuild_sql(_SHIPPED_SALES_BUCKET_SQL.format(o='o')):
+        cursor.execute(sql)
+
+
+@migration(7, 'Canonical orders.status_code with (status_code, order_date) index')
+def _order_status_codes(cursor, database):
+    if 'status_code' not in _column_names(cursor, 'orders'):
+        cursor.execute('ALTER TABLE orders ADD COLUMN status_code INTEGER NOT NULL DEFAULT 0')
+    cursor.execute(f'UPDATE orders SET status_code = {status_code_sql("status")}')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_orders_status_code_date ON orders(status_code, order_date)')
+
+    # Every writer keeps setting the status text; the code follows it here
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_orders_status_code_insert
+        AFTER INSERT ON orders
+        BEGIN
+            UPDATE orders SET status_code = {status_code_sql('NEW.status')} WHERE id = NEW.id;
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_orders_status_code_update
+        AFTER UPDATE OF status ON orders
+        BEGIN
+            UPDATE orders SET status_code = {status_code_sql('NEW.status')} WHERE id = NEW.id;
+        END
+    ''')
+    cursor.execute('ANALYZE orders')
+
+
+# Per-variant sales of non-cancelled orders, recomputed from order_items for
+# the (product_id, color, size) rows yielded by {variants}. Migration 8's
+# triggers shipped this shape; its derived table is materialized over all of
+# order_items, which only pays off for a whole-history pass (REBUILD_PRODUCT_SALES_SQL)
+_SHIPPED_REFRESH_PRODUCT_SALES_SQL = f"""
+    INSERT INTO product_sales_summary (product_id, color, size, total_sold, total_revenue, first_sale, last_sale)
+    SELECT v.product_id, v.color, v.size,
+           COALESCE(SUM(s.quantity), 0), COALESCE(SUM(s.quantity * s.price), 0),
+           MIN(s.order_date), MAX(s.order_date)
+    FROM ({{variants}}) v
+    LEFT JOIN (
+        SELECT oi.product_id, COALESCE(oi.color, '') as color, COALESCE(oi.size, '') as size,
+               oi.quantity, oi.price, o.order_date
+        FROM order_items oi
+        JOIN orders o ON o.id = oi.order_id AND o.status_code != {CANCELLED}
+    ) s ON s.product_id = v.product_id AND s.color = v.color AND s.size = v.size
+    WHERE true
+    GROUP BY v.product_id, v.color, v.size
+    ON CONFLICT(product_id, color, size) DO UPDATE SET
+        total_sold = excluded.total_sold,
+        total_revenue = excluded.total_revenue,
+        first_sale = excluded.first_sale,
+        last_sale = excluded.last_sale
+"""
+
+# Same result for the few variants a trigger touches: order_items is searched
+# per variant through idx_order_items_product_sales and each order by rowid;
+# lines of cancelled orders join no o row and add nothing
+REFRESH_PRODUCT_SALES_SQL = f"""
+    INSERT INTO product_sales_summary (product_id, color, size, total_sold, total_revenue, first_sale, last_sale)
+    SELECT v.product_id, v.color, v.size,
+           COALESCE(SUM(CASE WHEN o.id IS NOT NULL THEN oi.quantity END), 0),
+           COALESCE(SUM(CASE WHEN o.id IS NOT NULL THEN oi.quantity * oi.price END), 0),
+           MIN(o.order_date), MAX(o.order_date)
+    FROM ({{variants}}) v
+    LEFT JOIN order_items oi ON oi.product_id = v.product_id
+        AND COALESCE(oi.color, '') = v.color AND COALESCE(oi.size, '') = v.size
+    LEFT JOIN orders o ON o.id = oi.order_id AND o.status_code != {CANCELLED}
+    WHERE true
+    GROUP BY v.product_id, v.color, v.size
+    ON CONFLICT(product_id, color, size) DO UPDATE SET
+        total_sold = excluded.total_sold,
+        total_revenue = excluded.total_revenue,
+        first_sale = excluded.first_sale,
+        last_sale = excluded.last_sale
+"""
+
+# Every variant that appears in order_items
+ALL_SOLD_VARIANTS_SQL = "SELECT DISTINCT product_id, COALESCE(color, '') as color, COALESCE(size, '') as size FROM order_items"
+
+# Every variant's sales in one pass over the order history
+REBUILD_PRODUCT_SALES_SQL = _SHIPPED_REFRESH_PRODUCT_SALES_SQL.format(variants=ALL_SOLD_VARIANTS_SQL)
+
+
+def _order_variants(o: str) -> str:
+    return (f"SELECT DISTINCT product_id, COALESCE(color, '') as color, COALESCE(size, '') as size "
+            f"FROM order_items WHERE order_id = {o}.id")
+
+
+def _item_variant(item: str) -> str:
+    return f"SELECT {item}.product_id as product_id, COALESCE({item}.color, '') as color, COALESCE({item}.size, '') as size"
+
+
+def _product_sales_triggers(cursor, refresh: str):
+    # Cancellations, deletions and edits recompute only the variants involved
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_product_sales_item_update
+        AFTER UPDATE OF order_id, product_id, color, size, quantity, price ON order_items
+        BEGIN
+            {refresh.format(variants=_item_variant('OLD') + ' UNION ' + _item_variant('NEW'))};
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_product_sales_item_delete
+        AFTER DELETE ON order_items
+        BEGIN
+            {refresh.format(variants=_item_variant('OLD'))};
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_product_sales_order_update
+        AFTER UPDATE OF status_code, order_date ON orders
+        WHEN OLD.status_code IS NOT NEW.status_code OR OLD.order_date IS NOT NEW.order_date
+        BEGIN
+            {refresh.format(variants=_order_variants('NEW'))};
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_product_sales_order_delete
+        AFTER DELETE ON orders
+        BEGIN
+            {refresh.format(variants=_order_variants('OLD'))};
+        END
+    ''')
+
+
+@migration(8, 'Per-variant product sales summary maintained by triggers')
+def _product_sales_summary(cursor, database):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS product_sales_summary (
+            product_id INTEGER NOT NULL,
+            color TEXT NOT NULL DEFAULT '',
+            size TEXT NOT NULL DEFAULT '',
+            total_sold INTEGER NOT NULL DEFAULT 0,
+            total_revenue REAL NOT NULL DEFAULT 0,
+            first_sale TIMESTAMP,
+            last_sale TIMESTAMP,
+            PRIMARY KEY (product_id, color, size)
+        ) WITHOUT ROWID
+    ''')
+
+    # Checkout path: add the new line without rereading the variant's history
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_product_sales_item_insert
+        AFTER INSERT ON order_items
+        BEGIN
+            INSERT INTO product_sales_summary (product_id, color, size, total_sold, total_revenue, first_sale, last_sale)
+            SELECT NEW.product_id, COALESCE(NEW.color, ''), COALESCE(NEW.size, ''),
+                   NEW.quantity, NEW.quantity * NEW.price, o.order_date, o.order_date
+            FROM orders o
+            WHERE o.id = NEW.order_id AND o.status_code != {CANCELLED}
+            ON CONFLICT(product_id, color, size) DO UPDATE SET
+                total_sold = total_sold + excluded.total_sold,
+                total_revenue = total_revenue + excluded.total_revenue,
+                first_sale = MIN(COALESCE(first_sale, excluded.first_sale), excluded.first_sale),
+                last_sale = MAX(COALESCE(last_sale, excluded.last_sale), excluded.last_sale);
+        END
+    ''')
+    _product_sales_triggers(cursor, _SHIPPED_REFRESH_PRODUCT_SALES_SQL)
+
+    # Backfill from order history
+    cursor.execute(REBUILD_PRODUCT_SALES_SQL)
+
+
+@migration(9, 'Per-day activity counts (activity_daily) for compacted log archives')
+def _activity_daily(cursor, database):
+    # Filled by db_archive.ActivityArchive.compact() from archive partitions
+    # past retention; the raw rows themselves are dropped
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS activity_daily (
+            log_table TEXT NOT NULL,
+            day TEXT NOT NULL,
+            activity_type TEXT NOT NULL,
+            events INTEGER NOT NULL DEFAULT 0,
+            users INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (log_table, day, activity_type)
+        ) WITHOUT ROWID
+    ''')
+
+
+def _metadata_field(field: str) -> str:
+    # json_extract raises on malformed JSON, which would fail the log insert
+    return f"CASE WHEN json_valid(metadata) THEN json_extract(metadata, '$.{field}') END"
+
+
+# (dimension, activity_type or None for every event, value expression) of the
+# per-client interest counters
+INTEREST_DIMENSIONS = (
+    ('category', 'view_category', 'target_name'),
+    ('product', 'view_product', 'target_name'),
+    ('cart_product', 'add_to_cart', 'target_name'),
+    ('color', 'add_to_cart', _metadata_field('color')),
+    ('size', 'add_to_cart', _metadata_field('size')),
+    ('hour', None, "CAST(strftime('%H', created_at) AS INTEGER)"),
+    ('weekday', None, "CAST(strftime('%w', created_at) AS INTEGER)"),
+)
+
+# Fold the client_activity_logs rows yielded by {events} into client_profiles
+# and client_interest_counts (added to the existing counters)
+CLIENT_PROFILE_SQL = [
+    f"""
+    INSERT INTO client_profiles (telegram_id, total_events, total_browses, total_cart_adds,
+                                 total_orders, total_order_value, first_activity, last_activity)
+    SELECT telegram_id, COUNT(*),
+           SUM(activity_type = 'browse_products'),
+           SUM(activity_type = 'add_to_cart'),
+           SUM(activity_type = 'order_placed'),
+           SUM(CASE WHEN activity_type = 'order_placed'
+                    THEN COALESCE(CAST({_metadata_field('total_amount')} AS REAL), 0) ELSE 0 END),
+           MIN(created_at), MAX(created_at)
+    FROM {{events}}
+    WHERE true
+    GROUP BY telegram_id
+    ON CONFLICT(telegram_id) DO UPDATE SET
+        total_events = total_events + excluded.total_events,
+        total_browses = total_browses + excluded.total_browses,
+        total_cart_adds = total_cart_adds + excluded.total_cart_adds,
+        total_orders = total_orders + excluded.total_orders,
+        total_order_value = total_order_value + excluded.total_order_value,
+        first_activity = MIN(COALESCE(first_activity, excluded.first_activity), excluded.first_activity),
+        last_activity = MAX(COALESCE(last_activity, excluded.last_activity), excluded.last_activity)
+    """,
+    f"""
+    INSERT INTO client_interest_counts (telegram_id, dimension, value, count)
+    SELECT telegram_id, dimension, value, COUNT(*)
+    FROM ({' UNION ALL '.join(
+        f"SELECT telegram_id, '{dimension}' as dimension, {value} as value FROM {{events}}"
+        + (f" WHERE activity_type = '{activity}'" if activity else '')
+        for dimension, activity, value in INTEREST_DIMENSIONS
+    )})
+    WHERE value IS NOT NULL AND value != ''
+    GROUP BY telegram_id, dimension, value
+    ON CONFLICT(telegram_id, dimension, value) DO UPDATE SET
+        count = count + excluded.count
+    """,
+]
+
+# The new row of client_activity_logs, shaped like a source of {events}
+_NEW_CLIENT_EVENT = ('(SELECT NEW.telegram_id as telegram_id, NEW.activity_type as activity_type, '
+                     'NEW.target_name as target_name, NEW.metadata as metadata, '
+                     'NEW.created_at as created_at)')
+
+
+@migration(10, 'Incremental client interest profiles maintained by a trigger on client_activity_logs')
+def _client_profiles(cursor, database):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS client_profiles (
+            telegram_id INTEGER PRIMARY KEY,
+            total_events INTEGER NOT NULL DEFAULT 0,
+            total_browses INTEGER NOT NULL DEFAULT 0,
+            total_cart_adds INTEGER NOT NULL DEFAULT 0,
+            total_orders INTEGER NOT NULL DEFAULT 0,
+            total_order_value REAL NOT NULL DEFAULT 0,
+            first_activity TIMESTAMP,
+            last_activity TIMESTAMP
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS client_interest_counts (
+            telegram_id INTEGER NOT NULL,
+            dimension TEXT NOT NULL,
+            value TEXT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (telegram_id, dimension, value)
+        ) WITHOUT ROWID
+    ''')
+    # Top interests across all clients
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_client_interest_dimension ON client_interest_counts(dimension, value, count)')
+
+    # Inserts only: archiving deletes log rows but the profile keeps them
+    body = ';\n'.join(sql.format(events=_NEW_CLIENT_EVENT) for sql in CLIENT_PROFILE_SQL)
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_client_profile_insert
+        AFTER INSERT ON client_activity_logs
+        BEGIN
+            {body};
+        END
+    ''')
+
+    # Backfill from the logs still in store.db
+    for sql in CLIENT_PROFILE_SQL:
+        cursor.execute(sql.format(events='client_activity_logs'))
+
+
+# Distinct variant colors (English and Arabic) of product p
+_PRODUCT_COLORS_SQL = """(SELECT group_concat(v.color_text, ' ') FROM (
+    SELECT DISTINCT color || ' ' || COALESCE(color_arabic, '') as color_text
+    FROM product_variants WHERE product_id = p.id) v)"""
+_PRODUCT_DESCRIPTION_SQL = "COALESCE(p.description, '') || ' ' || COALESCE(p.arabic_description, '')"
+_PRODUCT_CATEGORY_SQL = "COALESCE(c.name, '') || ' ' || COALESCE(c.arabic_name, '')"
+
+# Re-index the products whose ids are yielded by {ids} in products_fts
+PRODUCT_SEARCH_REFRESH_SQL = [
+    "DELETE FROM products_fts WHERE rowid IN ({ids})",
+    f"""
+    INSERT INTO products_fts (rowid, name, arabic_name, description, model_number, category, colors)
+    SELECT p.id,
+           {fold_sql('p.name')},
+           {fold_sql('p.arabic_name')},
+           {fold_sql(_PRODUCT_DESCRIPTION_SQL)},
+           COALESCE(p.model_number, ''),
+           {fold_sql(_PRODUCT_CATEGORY_SQL)},
+           {fold_sql(_PRODUCT_COLORS_SQL)}
+    FROM products p
+    LEFT JOIN categories c ON c.id = p.category_id
+    WHERE p.id IN ({{ids}})
+    """,
+]
+
+
+@migration(11, 'FTS5 product search index (products_fts) maintained by triggers')
+def _product_search_index(cursor, database):
+    # rowid is the product id; text is stored folded (product_search.fold)
+    cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+            name, arabic_name, description, model_number, category, colors,
+            tokenize = 'unicode61 remove_diacritics 2'
+        )
+    ''')
+
+    def refresh(ids: str) -> str:
+        return ';\n'.join(sql.format(ids=ids) for sql in PRODUCT_SEARCH_REFRESH_SQL)
+
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_products_fts_insert
+        AFTER INSERT ON products
+        BEGIN
+            {refresh('NEW.id')};
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_products_fts_update
+        AFTER UPDATE OF name, arabic_name, description, arabic_description, model_number, category_id ON products
+        BEGIN
+            {refresh('NEW.id')};
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_products_fts_delete
+        AFTER DELETE ON products
+        BEGIN
+            DELETE FROM products_fts WHERE rowid = OLD.id;
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_products_fts_variant_insert
+        AFTER INSERT ON product_variants
+        BEGIN
+            {refresh('NEW.product_id')};
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_products_fts_variant_update
+        AFTER UPDATE OF product_id, color, color_arabic ON product_variants
+        BEGIN
+            {refresh('OLD.product_id, NEW.product_id')};
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_products_fts_variant_delete
+        AFTER DELETE ON product_variants
+        BEGIN
+            {refresh('OLD.product_id')};
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_products_fts_category_update
+        AFTER UPDATE OF name, arabic_name ON categories
+        BEGIN
+            {refresh('SELECT id FROM products WHERE category_id = NEW.id')};
+        END
+    ''')
+
+    # Index the existing catalog
+    for sql in PRODUCT_SEARCH_REFRESH_SQL:
+        cursor.execute(sql.format(ids='SELECT id FROM products'))
+
+
+@migration(12, 'Customer and sales_daily triggers classify orders with the canonical status codes')
+def _canonical_order_triggers(cursor, database):
+    # Migrations 5 and 6 matched status text on their own, so e.g. 'canceled'
+    # still counted as a live order and an open sale while status_code said
+    # cancelled. Recreate their triggers on order_code_sql() and rebuild.
+    for trigger in ('trg_orders_customer_insert', 'trg_orders_customer_delete', 'trg_orders_customer_update',
+                    'trg_sales_daily_order_insert', 'trg_sales_daily_order_update', 'trg_sales_daily_order_delete',
+                    'trg_sales_daily_item_insert', 'trg_sales_daily_item_update', 'trg_sales_daily_item_delete'):
+        cursor.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+    _customer_triggers(cursor, lambda o: counted_order_sql(order_code_sql(o)))
+    _sales_daily_triggers(cursor, lambda o: sales_bucket_sql(order_code_sql(o)))
+
+    cursor.execute(REBUILD_CUSTOMERS_SQL)
+    for sql in SALES_DAILY_REBUILD_SQL:
+        cursor.execute(sql)
+
+
+@migration(13, 'Product sales refresh triggers search order_items per variant')
+def _product_sales_variant_triggers(cursor, database):
+    # Migration 8's refresh joined a derived table of every order line, so
+    # each status change, cancellation and deleted line scanned the whole
+    # sales history inside the write transaction
+    for trigger in ('trg_product_sales_item_update', 'trg_product_sales_item_delete',
+                    'trg_product_sales_order_update', 'trg_product_sales_order_delete'):
+        cursor.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+    _product_sales_triggers(cursor, REFRESH_PRODUCT_SALES_SQL)
@@ -0,0 +1,86 @@
+# order_status.py - Canonical order status codes for the free-text orders.status
+from typing import Dict, Tuple
+
+UNKNOWN = 0
+PENDING = 1
+CONFIRMED = 2
+SHIPPED = 3
+DELIVERED = 4
+COMPLETED = 5
+CANCELLED = 6
+
+# Display label per code
+STATUS_LABELS = {
+    UNKNOWN: 'غير معروف',
+    PENDING: 'معلق',
+    CONFIRMED: 'مؤكد',
+    SHIPPED: 'تم الشحن',
+    DELIVERED: 'تم التوصيل',
+    COMPLETED: 'مكتمل',
+    CANCELLED: 'ملغي',
+}
+
+# Exact spellings (lowercased, stripped) written by the bot and the dashboard
+STATUS_ALIASES = {
+    'pending': PENDING, 'معلق': PENDING,
+    'confirmed': CONFIRMED, 'مؤكد': CONFIRMED,
+    'shipped': SHIPPED, 'تم الشحن': SHIPPED, 'مشحون': SHIPPED,
+    'delivered': DELIVERED, 'تم التوصيل': DELIVERED,
+    'completed': COMPLETED, 'مكتمل': COMPLETED,
+    'cancelled': CANCELLED, 'canceled': CANCELLED, 'ملغي': CANCELLED, 'ملغى': CANCELLED,
+}
+
+# Decorated statuses (e.g. 'تم التوصيل ✅') are matched on these substrings,
+# in this order, like the old LIKE '%...%' filters
+STATUS_KEYWORDS = (
+    ('تم التوصيل', DELIVERED), ('delivered', DELIVERED),
+    ('مكتمل', COMPLETED), ('completed', COMPLETED),
+)
+
+# Revenue counts once the customer has the goods
+DELIVERED_CODES = (DELIVERED, COMPLETED)
+# "Completed" on the dashboard stat cards includes orders out for delivery
+FULFILLED_CODES = (SHIPPED, DELIVERED, COMPLETED)
+
+# Order list filter values -> codes
+STATUS_FILTERS: Dict[str, Tuple[int, ...]] = {
+    'pending': (PENDING,),
+    'confirmed': (CONFIRMED,),
+    'shipped': (SHIPPED,),
+    'delivered': DELIVERED_CODES,
+    'completed': DELIVERED_CODES,
+    'cancelled': (CANCELLED,),
+}
+
+
+def status_code(status) -> int:
+    """Canonical code of a status string; an empty status is the column default, pending"""
+    key = str(status or '').strip().lower()
+    if not key:
+        return PENDING
+    if key in STATUS_ALIASES:
+        return STATUS_ALIASES[key]
+    for keyword, code in STATUS_KEYWORDS:
+        if keyword in key:
+            return code
+    return UNKNOWN
+
+
+def status_label(code: int) -> str:
+    return STATUS_LABELS.get(code, STATUS_LABELS[UNKNOWN])
+
+
+def status_code_sql(column: str) -> str:
+    """SQL CASE mapping a status column to its code, same rules as status_code()"""
+    key = f"LOWER(TRIM(COALESCE({column}, '')))"
+    whens = [f"WHEN {key} = '' THEN {PENDING}"]
+    for alias, code in STATUS_ALIASES.items():
+        whens.append(f"WHEN {key} = '{alias}' THEN {code}")
+    for keyword, code in STATUS_KEYWORDS:
+        whens.append(f"WHEN {key} LIKE '%{keyword}%' THEN {code}")
+    return 'CASE ' + ' '.join(whens) + f' ELSE {UNKNOWN} END'
+
+
+def codes_sql(codes) -> str:
+    """Literal IN-list of status codes, e.g. '(4, 5)'"""
+    return '(' + ', '.join(str(int(code)) for code in codes) + ')'
@@ -0,0 +1,36 @@
+# pricing.py - SQL price expressions for Database bulk repricing
+from typing import List, Tuple
+
+# New price as a SQL expression over products.price; '?' takes the operation value
+PRICE_OPERATIONS = {
+    'percentage_increase': 'price * (1 + ? / 100.0)',
+    'percentage_decrease': 'price * (1 - ? / 100.0)',
+    'fixed_increase': 'price + ?',
+    'fixed_decrease': 'price - ?',
+    'set': '?',
+    'currency_conversion': 'price * ?',
+}
+
+# Rounding applied to the computed price ({expr} is the operation expression)
+PRICE_ROUNDING = {
+    'cents': 'ROUND({expr}, 2)',
+    'integer': 'ROUND({expr}, 0)',
+    'nearest_10': 'ROUND(({expr}) / 10.0, 0) * 10',
+    'nearest_50': 'ROUND(({expr}) / 50.0, 0) * 50',
+    'nearest_100': 'ROUND(({expr}) / 100.0, 0) * 100',
+}
+
+DEFAULT_ROUNDING = 'cents'
+
+
+def price_expression(operation: str, value: float = 0, currency_rate: float = 1,
+                     rounding: str = DEFAULT_ROUNDING) -> Tuple[str, List]:
+    """(sql, params) computing the new price of a products row; never below zero"""
+    if operation not in PRICE_OPERATIONS:
+        raise ValueError(f'Unknown price operation: {operation}')
+    if rounding not in PRICE_ROUNDING:
+        raise ValueError(f'Unknown rounding rule: {rounding}')
+
+    operand = currency_rate if operation == 'currency_conversion' else value
+    expr = PRICE_ROUNDING[rounding].format(expr=PRICE_OPERATIONS[operation])
+    return f'MAX({expr}, 0)', [float(operand)]
@@ -0,0 +1,48 @@
+# product_search.py - Arabic-aware text folding for the products_fts search index
+import re
+from typing import Optional
+
+# Letter variants indexed and searched as one letter
+ARABIC_FOLDS = {
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ة': 'ه',
+    'ى': 'ي', 'ئ': 'ي',
+    'ؤ': 'و',
+}
+
+# Harakat, tanween, shadda, sukun, superscript alef and tatweel are dropped
+ARABIC_MARKS = tuple(chr(code) for code in range(0x064B, 0x0653)) + ('\u0670', '\u0640')
+
+# bm25 weights per products_fts column (name, arabic_name, description,
+# model_number, category, colors): name and model matches rank first
+SEARCH_WEIGHTS = (10.0, 10.0, 1.0, 8.0, 3.0, 2.0)
+
+_TOKEN = re.compile(r'\w+')
+
+
+def fold(text) -> str:
+    """Text as it is stored in products_fts"""
+    text = str(text or '')
+    for mark in ARABIC_MARKS:
+        text = text.replace(mark, '')
+    for letter, folded in ARABIC_FOLDS.items():
+        text = text.replace(letter, folded)
+    return text
+
+
+def fold_sql(expr: str) -> str:
+    """SQL applying fold() to expr, so triggers need no custom functions"""
+    sql = f"COALESCE({expr}, '')"
+    for mark in ARABIC_MARKS:
+        sql = f"REPLACE({sql}, '{mark}', '')"
+    for letter, folded in ARABIC_FOLDS.items():
+        sql = f"REPLACE({sql}, '{letter}', '{folded}')"
+    return sql
+
+
+def match_query(text) -> Optional[str]:
+    """FTS5 MATCH expression: every word of text as a prefix, or None if empty"""
+    tokens = _TOKEN.findall(fold(text))
+    if not tokens:
+        return None
+    return ' '.join(f'"{token}"*' for token in tokens)
@@ -1,12 +1,14 @@
 # store.py - COMPLETE FIXED CODE WITH ENHANCED NOTIFICATIONS & UPDATED ORDER FLOW
 from telegram import Update, ReplyKeyboardMarkup, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.ext import Application, CommandHandler, MessageHandler, ContextTypes, filters, CallbackQueryHandler, ConversationHandler
+from telegram.helpers import escape_markdown
 import os
 import json
 from datetime import datetime
 import re
 import asyncio
 from database import db
+from db_async import adb
 from config import (
     TELEGRAM_BOT_TOKEN, COMPANY_NAME, SUPPORT_EMAIL, SUPPORT_PHONE, 
     BUSINESS_HOURS, CURRENCY, ARABIC_TEXTS, SEND_NEW_PRODUCT_NOTIFICATIONS,
@@ -19,6 +21,9 @@ NAME, PHONE, SELECT_STATE, SELECT_REGION, ADDRESS, CONFIRM_ORDER = range(6)
 # ✅ ADDED: Product selection conversation states
 SELECT_SIZE, SELECT_COLOR, SELECT_QUANTITY = range(3)
 
+# Products shown for a text search
+BOT_SEARCH_LIMIT = 10
+
 # Arabic text constants with company info
 BOT_TEXTS = {
     "welcome": f"""
@@ -218,7 +223,7 @@ def send_order_status_notification_sync(order_id, old_status, new_status):
 def load_products():
     """Load products from database"""
     try:
-        products_data = db.get_all_products()
+        products_data = db.get_all_products(compact=True)
         categories = db.get_categories()
         category_names = [cat['name'] for cat in categories]
         
@@ -338,13 +343,13 @@ def get_user_cart(user_id):
         print(f"🛒 Created new cart for user {user_id}")
     return user_carts[user_id]
 
-def add_to_cart(user_id, product, category, size=None, color=None, quantity=1):
+async def add_to_cart(user_id, product, category, size=None, color=None, quantity=1):
     """Add product to user's cart with size and color - WITH INVENTORY VALIDATION"""
     cart = get_user_cart(user_id)
     
     # ✅ Check inventory before adding to cart
     if color and size:
-        inventory_check = db.check_inventory(product['id'], color, size, quantity)
+        inventory_check = await adb.check_inventory(product['id'], color, size, quantity)
         if not inventory_check['available']:
             return {
                 'success': False,
@@ -366,7 +371,7 @@ def add_to_cart(user_id, product, category, size=None, color=None, quantity=1):
             # ✅ Check if updated quantity is available
             new_quantity = item['quantity'] + quantity
             if color and size:
-                inventory_check = db.check_inventory(product['id'], color, size, new_quantity)
+                inventory_check = await adb.check_inventory(product['id'], color, size, new_quantity)
                 if not inventory_check['available']:
                     return {
                         'success': False,
@@ -392,13 +397,13 @@ def add_to_cart(user_id, product, category, size=None, color=None, quantity=1):
         'size': size,
         'color': color,
         'quantity': quantity,
-        'images': get_variant_images(product['id'], category, color) if color else []
+        'images': await adb.run(get_variant_images, product['id'], category, color) if color else []
     }
     cart.append(cart_item)
     print(f"🛒 Added {product['name']} to cart (Size: {size}, Color: {color}, Qty: {quantity})")
     
     # ✅ NEW: Log client activity
-    db.log_client_activity(
+    await adb.log_client_activity(
         telegram_id=user_id,
         activity_type='add_to_cart',
         activity_description=f'إضافة منتج إلى السلة: {product["name"]}',
@@ -714,7 +719,7 @@ async def send_product_notification(context: ContextTypes.DEFAULT_TYPE, product,
     
     try:
         # ✅ Get ALL users (not just buyers)
-        users = db.get_all_notification_users()
+        users = await adb.get_all_notification_users()
         if not users:
             print("❌ [NOTIFICATION] No users found for notifications")
             return
@@ -747,7 +752,7 @@ async def send_product_notification(context: ContextTypes.DEFAULT_TYPE, product,
         first_image = None
         for variant in product.get('variants', []):
             if variant.get('quantity', 0) > 0 and variant.get('image_path'):
-                images = get_variant_images(product['id'], category, variant['color'])
+                images = await adb.run(get_variant_images, product['id'], category, variant['color'])
                 if images and os.path.exists(images[0]):
                     first_image = images[0]
                     break
@@ -797,7 +802,7 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     print(f"🚀 Start command from user {user_id}")
     
     # ✅ ENHANCED: Register user in bot_users table (ALL users)
-    db.add_bot_user(
+    await adb.add_bot_user(
         telegram_id=user_id,
         username=update.message.from_user.username,
         first_name=update.message.from_user.first_name,
@@ -805,7 +810,7 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
     
     # ✅ KEEP EXISTING: Also register in customers table for backward compatibility
-    db.add_customer(
+    await adb.add_customer(
         telegram_id=user_id,
         username=update.message.from_user.username,
         first_name=update.message.from_user.first_name,
@@ -813,7 +818,7 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
     
     # ✅ NEW: Log client activity
-    db.log_client_activity(
+    await adb.log_client_activity(
         telegram_id=user_id,
         activity_type='bot_start',
         activity_description='بدء استخدام البوت',
@@ -824,7 +829,7 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
     
     global PRODUCT_CATALOG, CATEGORIES, CATEGORY_KEYBOARD_MARKUP
-    PRODUCT_CATALOG, CATEGORIES = load_products()
+    PRODUCT_CATALOG, CATEGORIES = await adb.run(load_products)
     CATEGORY_KEYBOARD = create_category_keyboard(CATEGORIES)
     CATEGORY_KEYBOARD_MARKUP = ReplyKeyboardMarkup(CATEGORY_KEYBOARD, resize_keyboard=True)
     
@@ -838,7 +843,7 @@ async def browse_products(update: Update, context: ContextTypes.DEFAULT_TYPE):
     print(f"🛍️ Browse products from user {user_id}")
     
     # ✅ NEW: Log client activity
-    db.log_client_activity(
+    await adb.log_client_activity(
         telegram_id=user_id,
         activity_type='browse_products',
         activity_description='تصفح المنتجات'
@@ -853,7 +858,7 @@ async def view_cart(update: Update, context: ContextTypes.DEFAULT_TYPE):
     print(f"🛒 Displaying cart for user {user_id} with {len(cart)} items")
     
     # ✅ NEW: Log client activity
-    db.log_client_activity(
+    await adb.log_client_activity(
         telegram_id=user_id,
         activity_type='view_cart',
         activity_description=f'عرض السلة ({len(cart)} عنصر)',
@@ -1049,7 +1054,7 @@ async def confirm_order_final(update: Update, context: ContextTypes.DEFAULT_TYPE
             print(f"🔍 Cart items: {len(cart)} items, Total: {sum(item['price'] * item['quantity'] for item in cart)}")
             
             # ✅ Create the order with inventory validation AND LOCATION DATA
-            order_result = db.create_order(
+            order_result = await adb.create_order(
                 user_id=user_id,
                 user_name=context.user_data['name'],
                 user_phone=context.user_data['phone'],
@@ -1063,7 +1068,7 @@ async def confirm_order_final(update: Update, context: ContextTypes.DEFAULT_TYPE
             
             if order_result['success'] and order_result['order_id']:
                 # ✅ NEW: Log client activity
-                db.log_client_activity(
+                await adb.log_client_activity(
                     telegram_id=user_id,
                     activity_type='order_placed',
                     activity_description=f'إنشاء طلب جديد #{order_result["order_id"]}',
@@ -1174,7 +1179,7 @@ async def show_products(update: Update, category_input: str):
         )
         
         # ✅ NEW: Log category browsing
-        db.log_client_activity(
+        await adb.log_client_activity(
             telegram_id=user_id,
             activity_type='view_category',
             activity_description=f'عرض فئة: {arabic_category_name}',
@@ -1191,7 +1196,7 @@ async def show_products(update: Update, category_input: str):
                 first_image = None
                 for variant in product.get('variants', []):
                     if variant.get('image_path') and variant.get('quantity', 0) > 0:
-                        images = get_variant_images(product['id'], category_en, variant['color'])
+                        images = await adb.run(get_variant_images, product['id'], category_en, variant['color'])
                         if images:
                             first_image = images[0]
                             break
@@ -1290,7 +1295,7 @@ async def show_all_products(update: Update, context: ContextTypes.DEFAULT_TYPE):
             first_image = None
             for variant in product.get('variants', []):
                 if variant.get('image_path') and variant.get('quantity', 0) > 0:
-                    images = get_variant_images(product['id'], product['category'], variant['color'])
+                    images = await adb.run(get_variant_images, product['id'], product['category'], variant['color'])
                     if images:
                         first_image = images[0]
                         break
@@ -1333,6 +1338,95 @@ async def show_all_products(update: Update, context: ContextTypes.DEFAULT_TYPE):
             print(f"❌ Error showing product {product['name']}: {e}")
             continue
 
+# ✅ NEW: Free-text product search (products_fts index)
+async def show_search_results(update: Update, search_text: str) -> bool:
+    """Show available products matching search_text; False when nothing matched"""
+    user_id = update.message.from_user.id
+    matches = await adb.search_products(search_text, limit=BOT_SEARCH_LIMIT)
+    
+    # Only products still in the catalog (active, with available variants)
+    results = []
+    for match in matches:
+        for product in PRODUCT_CATALOG.get(match['category'], []):
+            if product['id'] == match['id']:
+                results.append((match['category'], product))
+                break
+    
+    print(f"🔍 Search '{search_text}' from user {user_id}: {len(results)} result(s)")
+    
+    await adb.log_client_activity(
+        telegram_id=user_id,
+        activity_type='search',
+        activity_description=f'بحث عن: {search_text}',
+        metadata=json.dumps({'query': search_text, 'results_count': len(results)})
+    )
+    
+    if not results:
+        return False
+    
+    # ✅ The query is free text: escape it so * _ ` [ cannot break the Markdown header
+    await update.message.reply_text(
+        f"🔍 **نتائج البحث عن '{escape_markdown(search_text)}'**\n\n"
+        f"وجدنا {len(results)} منتج(منتجات):",
+        reply_markup=MAIN_KEYBOARD,
+        parse_mode='Markdown'
+    )
+    
+    for category_en, product in results:
+        try:
+            first_image = None
+            for variant in product.get('variants', []):
+                if variant.get('image_path') and variant.get('quantity', 0) > 0:
+                    images = await adb.run(get_variant_images, product['id'], category_en, variant['color'])
+                    if images:
+                        first_image = images[0]
+                        break
+            
+            category_arabic = get_arabic_category_name(category_en)
+            caption = f"**{product['name']}**\n📂 الفئة: {category_arabic}\n\n"
+            caption += generate_product_caption_with_colors(product)
+            
+            keyboard = [
+                [InlineKeyboardButton("🛒 أضف إلى السلة", callback_data=f"select_{category_en}_{product['id']}")],
+                [InlineKeyboardButton("🎨 عرض الألوان", callback_data=f"view_colors_{category_en}_{product['id']}")]
+            ]
+            reply_markup = InlineKeyboardMarkup(keyboard)
+            
+            if first_image and os.path.exists(first_image):
+                with open(first_image, 'rb') as photo:
+                    await update.message.reply_photo(
+                        photo=photo,
+                        caption=caption,
+                        reply_markup=reply_markup,
+                        parse_mode='Markdown'
+                    )
+            else:
+                await update.message.reply_text(
+                    caption,
+                    reply_markup=reply_markup,
+                    parse_mode='Markdown'
+                )
+        except Exception as e:
+            print(f"❌ Error showing search result {product['name']}: {e}")
+    
+    return True
+
+async def search_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/search <words>: search products by name, model, category or color"""
+    search_text = ' '.join(context.args or []).strip()
+    if not search_text:
+        await update.message.reply_text(
+            "🔍 اكتب ما تبحث عنه بعد الأمر، مثال:\n/search قميص أزرق",
+            reply_markup=MAIN_KEYBOARD
+        )
+        return
+    
+    if not await show_search_results(update, search_text):
+        await update.message.reply_text(
+            f"❌ لم يتم العثور على منتجات متاحة تطابق '{search_text}'",
+            reply_markup=MAIN_KEYBOARD
+        )
+
 # FIXED: Color images display - ONLY AVAILABLE VARIANTS
 async def show_color_images(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
@@ -1363,7 +1457,7 @@ async def show_color_images(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     
     # ✅ NEW: Log product view
-    db.log_client_activity(
+    await adb.log_client_activity(
         telegram_id=user_id,
         activity_type='view_product',
         activity_description=f'عرض تفاصيل المنتج: {product["name"]}',
@@ -1382,7 +1476,7 @@ async def show_color_images(update: Update, context: ContextTypes.DEFAULT_TYPE):
         
         # ✅ ONLY SHOW IMAGES FOR AVAILABLE VARIANTS
         if color and variant.get('quantity', 0) > 0:
-            images = get_variant_images(product_id, category, color)
+            images = await adb.run(get_variant_images, product_id, category, color)
             if images:
                 color_images[color] = images[0]
     
@@ -1596,7 +1690,7 @@ async def select_quantity(update: Update, context: ContextTypes.DEFAULT_TYPE):
         color = selection.get('color')
         
         # ✅ Add to cart with inventory validation
-        result = add_to_cart(user_id, product, category, size, color, quantity)
+        result = await add_to_cart(user_id, product, category, size, color, quantity)
         
         if result['success']:
             cart = result['cart']
@@ -1634,9 +1728,8 @@ async def show_my_orders(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.message.from_user.id
     
     try:
-        # Get orders from database
-        orders = db.get_orders()
-        user_orders = [order for order in orders if order.get('user_id') == user_id]
+        # Get this user's orders from database
+        user_orders = await adb.get_orders(user_id=user_id)
         
         if not user_orders:
             await update.message.reply_text(
@@ -1731,6 +1824,10 @@ async def show_help(update: Update, context: ContextTypes.DEFAULT_TYPE):
 • '📞 الدعم الفني': للتواصل مع فريق الدعم
 • '🏠 الرئيسية': للعودة للقائمة الرئيسية
 
+**البحث:**
+• اكتب اسم المنتج أو رقم الموديل أو اللون للبحث مباشرة
+• أو استخدم الأمر /search متبوعاً بكلمات البحث
+
 **نصائح سريعة:**
 • يمكنك استخدام الأزرار أو كتابة الأوامر مباشرة
 • تأكد من اختيار المقاس واللون المناسبين
@@ -1783,6 +1880,10 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await show_products(update, arabic_name)
             return
     
+    # ✅ NEW: Any other text is treated as a product search
+    if await show_search_results(update, user_message):
+        return
+    
     # If no match found
     await update.message.reply_text(
         "🤔 **لم أفهم طلبك**\n\n"
@@ -1791,7 +1892,8 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "• تصفح المنتجات 🛍️\n"
         "• عرض جميع المنتجات 📋\n"
         "• عرض السلة 🛒\n"
-        "• وضع طلب 📦\n\n"
+        "• وضع طلب 📦\n"
+        "• كتابة اسم المنتج أو لونه للبحث 🔍\n\n"
         "اختر أحد الخيارات:",
         reply_markup=MAIN_KEYBOARD,
         parse_mode='Markdown'
@@ -1875,7 +1977,7 @@ async def send_telegram_notification(product_id):
         print(f"📢 [NOTIFICATION] Starting notification process for product {product_id}")
         
         # Load products to find the product
-        products_data, _ = load_products()
+        products_data, _ = await adb.run(load_products)
         product = None
         category = None
         
@@ -1896,7 +1998,7 @@ async def send_telegram_notification(product_id):
         print(f"✅ [NOTIFICATION] Found product: {product['name']} in category: {category}")
         
         # Get ALL users for notification
-        users = db.get_all_notification_users()
+        users = await adb.get_all_notification_users()
         if not users:
             print("❌ [NOTIFICATION] No users found for notifications")
             return
@@ -1929,7 +2031,7 @@ async def send_telegram_notification(product_id):
         first_image = None
         for variant in product.get('variants', []):
             if variant.get('quantity', 0) > 0 and variant.get('image_path'):
-                images = get_variant_images(product['id'], category, variant['color'])
+                images = await adb.run(get_variant_images, product['id'], category, variant['color'])
                 if images and os.path.exists(images[0]):
                     first_image = images[0]
                     break
@@ -2036,6 +2138,7 @@ def main():
     app.add_handler(CommandHandler('support', show_support))
     app.add_handler(CommandHandler('help', show_help))
     app.add_handler(CommandHandler('all_products', show_all_products))
+    app.add_handler(CommandHandler('search', search_command))
     app.add_handler(CommandHandler('notify_product', send_product_notification_command))
     
     # Add conversation handlers
@@ -2060,15 +2163,18 @@ def main():
     else:
         print('❌ لم يتم تحميل أي فئات أو منتجات')
     
-    orders = db.get_orders()
-    customers = db.get_all_customers()
-    print(f'📦 إجمالي الطلبات في النظام: {len(orders)}')
-    print(f'👥 إجمالي العملاء المسجلين: {len(customers)}')
+    # ✅ Counts only: get_all_customers() reads the report snapshot, which would
+    # copy the whole database before polling starts
+    print(f'📦 إجمالي الطلبات في النظام: {db.get_order_stats()["total_orders"]}')
+    print(f'👥 إجمالي العملاء المسجلين: {db.get_customers_count()}')
     print(f'🔔 نظام الإشعارات: {"مفعل" if SEND_NEW_PRODUCT_NOTIFICATIONS else "معطل"}')
     print('🤖 البوت يعمل...')
     print('=' * 60)
     
     app.run_polling(poll_interval=3)
+    
+    # Let queued database calls finish before exiting
+    adb.shutdown()
 
 
 if __name__ == '__main__':